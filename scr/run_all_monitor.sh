@@ -10,9 +10,28 @@ START="${START_MONITOR:-2025070200}"
 END="${END_MONITOR:-2025073121}"
 FCINT="${FCINT_MONITOR:-12}"
 EXP_COLORS_STR="${EXP_COLORS_MONITOR:-#1f77b4 #d62728}"
+# 1=render PNGs, 0=only export JSON series for the webapp's client-side charts
+RENDER_PNG="${RENDER_PNG:-1}"
+# Optional directory for the C++ engine's cache of parsed vfld/vobs files (empty=disabled)
+PARSE_CACHE_DIR="${PARSE_CACHE_DIR:-}"
+# Optional directory for per valid time checkpoints of the C++ engine (empty=disabled); reruns
+# only compute valid times whose input files changed
+STATE_DIR="${STATE_DIR:-}"
+# 1=stream vobs files through the C++ engine (memory bounded by the forecast length, not the period)
+STREAM_VOBS="${STREAM_VOBS:-0}"
+# 1=also write per-station metrics (station_metrics.parquet), lead=per station and lead time
+STATION_STATS="${STATION_STATS:-0}"
+# Optional file of station ids the C++ engine skips entirely (empty=none)
+STATION_BLACKLIST="${STATION_BLACKLIST:-}"
+# 1=run the C++ engine in-process through src/python/engine.py (make -C src/cpp python): metrics
+# and plot cubes are written from memory, without the CSV round trip
+IN_PROCESS_ENGINE="${IN_PROCESS_ENGINE:-0}"
+# Trailing windows in days (e.g. "7 30") to build cubes and scorecards for from daily partitions
+# of the metrics (empty=none); each update only adds and subtracts the days that moved
+read -r -a ROLLING_WINDOWS <<< "${ROLLING_WINDOWS:-}"
 
 # NEW: Common key restriction controls
-RESTRICT_COMMON_KEYS="${RESTRICT_COMMON_KEYS:-1}"   # 1=enable, 0=disable
+RESTRICT_COMMON_KEYS="${RESTRICT_COMMON_KEYS:-0}"   # 1=verify only samples every experiment has, 0=common valid times only
 ROUND_DEC="${ROUND_DEC:-2}"
 
 # Define paths
@@ -24,6 +43,10 @@ VFLD_ROOT="$RBASE/data/monitor/vfld"
 VOBS_ROOT="$RBASE/data/monitor/vobs"
 METRICS_FILE="${WORKDIR}/surface_metrics.parquet"
 TEMP_METRICS_FILE="${WORKDIR}/temp_metrics.parquet"
+CONTINGENCY_FILE="${WORKDIR}/precip_contingency.parquet"
+STATION_METRICS_FILE="${WORKDIR}/station_metrics.parquet"
+CUBE_FILE="${WORKDIR}/surface_cube.parquet"
+TEMP_CUBE_FILE="${WORKDIR}/temp_cube.parquet"
 
 # --- Setup ---
 echo "Running Monitor Verification"
@@ -36,45 +59,104 @@ mkdir -p "$WORKDIR" "$PLOTS"
 # --- Run C++ Verification ---
 echo "Running C++ verification..."
 # The C++ executable is expected to be at src/cpp/verify_cpp_parallel
-if [ ! -f "src/cpp/verify_cpp_parallel" ]; then
+if [[ "$IN_PROCESS_ENGINE" == "1" ]]; then
+  if ! ls src/cpp/obsver_engine*.so >/dev/null 2>&1; then
+    echo "C++ engine module not found in src/cpp."
+    echo "Please build it first, e.g., with:"
+    echo "make -C src/cpp python"
+    exit 1
+  fi
+elif [ ! -f "src/cpp/verify_cpp_parallel" ]; then
     echo "C++ executable not found at src/cpp/verify_cpp_parallel."
     echo "Please compile it first, e.g., with:"
-    echo "g++ -std=c++17 -O3 -fopenmp src/cpp/verify_cpp_parallel.cpp -o src/cpp/verify_cpp_parallel"
+    echo "make -C src/cpp"
     exit 1
 fi
-cp src/cpp/verify_cpp_parallel "$WORKDIR/"
-
-cd "$WORKDIR"
-chmod +x verify_cpp_parallel
+CPP_OPTS=(--outdir "$WORKDIR")
+if [[ -n "$PARSE_CACHE_DIR" ]]; then
+  mkdir -p "$PARSE_CACHE_DIR"
+  CPP_OPTS+=(--cache-dir "$(readlink -f "$PARSE_CACHE_DIR")")
+fi
+if [[ -n "$STATE_DIR" ]]; then
+  mkdir -p "$STATE_DIR"
+  CPP_OPTS+=(--state-dir "$(readlink -f "$STATE_DIR")")
+fi
+if [[ "$STREAM_VOBS" == "1" ]]; then
+  CPP_OPTS+=(--stream)
+fi
+# Verify only station/level samples that every experiment has
+if [[ "$RESTRICT_COMMON_KEYS" == "1" ]]; then
+  CPP_OPTS+=(--common-stations)
+fi
+if [[ "$STATION_STATS" == "1" ]]; then
+  CPP_OPTS+=(--station-stats)
+elif [[ "$STATION_STATS" == "lead" ]]; then
+  CPP_OPTS+=(--station-stats-by-lead)
+fi
+if [[ -n "$STATION_BLACKLIST" ]]; then
+  CPP_OPTS+=(--station-blacklist "$(readlink -f "$STATION_BLACKLIST")")
+fi
 
 CPP_ARGS=()
 for EXP in "${EXPS[@]}"; do
   CPP_ARGS+=("$(readlink -f "${VFLD_ROOT}/${EXP}")")
 done
 
-time ./verify_cpp_parallel "$START" "$END" "$FCINT" \
-  "$(readlink -f "${VOBS_ROOT}/vobs_meps")" \
-  "${CPP_ARGS[@]}"
-
+if [[ "$IN_PROCESS_ENGINE" == "1" ]]; then
+  # Variable lists and thresholds are passed as arguments in-process
+  ENGINE_OPTS=(--cube "$CUBE_FILE" --temp-cube "$TEMP_CUBE_FILE")
+  if [[ -n "${SURFPAR_MONITOR:-}" ]]; then
+    ENGINE_OPTS+=(--surfpar $SURFPAR_MONITOR)
+  fi
+  if [[ -n "${TEMPPAR_MONITOR:-}" ]]; then
+    ENGINE_OPTS+=(--temppar $TEMPPAR_MONITOR)
+  fi
+  if [[ -n "${PRECIP_THRESHOLDS_MONITOR:-}" ]]; then
+    ENGINE_OPTS+=(--thresholds $PRECIP_THRESHOLDS_MONITOR)
+  fi
+  time python3 -m src.python.engine "${CPP_OPTS[@]}" "${ENGINE_OPTS[@]}" -- "$START" "$END" "$FCINT" \
+    "$(readlink -f "${VOBS_ROOT}/vobs_meps")" \
+    "${CPP_ARGS[@]}"
+else
+  # Writes surface/temp metrics and precipitation contingency tables into $WORKDIR: Parquet when built with PARQUET=1, else CSV
+  time src/cpp/verify_cpp_parallel "${CPP_OPTS[@]}" "$START" "$END" "$FCINT" \
+    "$(readlink -f "${VOBS_ROOT}/vobs_meps")" \
+    "${CPP_ARGS[@]}"
+fi
 
-cd "$RBASE"
-# Convert CSV output to Parquet
-if [[ -f "${WORKDIR}/surface_metrics.csv" ]]; then
+# Convert CSV output to Parquet (only for builds without native Parquet output)
+if [[ ! -f "$METRICS_FILE" && -f "${WORKDIR}/surface_metrics.csv" ]]; then
     echo "Converting surface CSV metrics to Parquet..."
-    python3 -c "import polars as pl; pl.read_csv('${WORKDIR}/surface_metrics.csv').write_parquet('${METRICS_FILE}')"
-else
-    echo "WARNING: C++ verification did not produce surface_metrics.csv"
+    python3 -c "from src.python.engine import read_csv_table; read_csv_table('${WORKDIR}/surface_metrics.csv').write_parquet('${METRICS_FILE}')"
+fi
+if [[ ! -f "$METRICS_FILE" ]]; then
+    echo "WARNING: C++ verification did not produce surface metrics"
 fi
-if [[ -f "${WORKDIR}/temp_metrics.csv" ]]; then
+if [[ ! -f "$TEMP_METRICS_FILE" && -f "${WORKDIR}/temp_metrics.csv" ]]; then
     echo "Converting temp CSV metrics to Parquet..."
-    python3 -c "import polars as pl; pl.read_csv('${WORKDIR}/temp_metrics.csv').write_parquet('${TEMP_METRICS_FILE}')"
-else
-    echo "WARNING: C++ verification did not produce temp_metrics.csv"
+    python3 -c "from src.python.engine import read_csv_table; read_csv_table('${WORKDIR}/temp_metrics.csv').write_parquet('${TEMP_METRICS_FILE}')"
+fi
+if [[ ! -f "$TEMP_METRICS_FILE" ]]; then
+    echo "WARNING: C++ verification did not produce temp metrics"
+fi
+if [[ ! -f "$CONTINGENCY_FILE" && -f "${WORKDIR}/precip_contingency.csv" ]]; then
+    python3 -c "from src.python.engine import read_csv_table; read_csv_table('${WORKDIR}/precip_contingency.csv').write_parquet('${CONTINGENCY_FILE}')"
+fi
+if [[ ! -f "$STATION_METRICS_FILE" && -f "${WORKDIR}/station_metrics.csv" ]]; then
+    python3 -c "from src.python.engine import read_csv_table; read_csv_table('${WORKDIR}/station_metrics.csv').write_parquet('${STATION_METRICS_FILE}')"
+fi
+
+# Aggregate once for all scorecards and plots (the in-process engine has built the cubes already)
+if [[ -f "$METRICS_FILE" && "$IN_PROCESS_ENGINE" != "1" ]]; then
+    python3 -m src.python.plot_cube --metrics "$METRICS_FILE" --out "$CUBE_FILE"
+fi
+if [[ -f "$TEMP_METRICS_FILE" && "$IN_PROCESS_ENGINE" != "1" ]]; then
+    python3 -m src.python.plot_cube --metrics "$TEMP_METRICS_FILE" --out "$TEMP_CUBE_FILE"
 fi
 
 
 # --- Run Scorecards ---
-if [[ -f "$METRICS_FILE" && ${#EXPS[@]} -gt 1 ]]; then
+if [[ -f "$CUBE_FILE" && ${#EXPS[@]} -gt 1 ]]; then
   echo "Building scorecards for monitor surface metrics..."
   for i in $(seq 0 $((${#EXPS[@]} - 2))); do
     for j in $(seq $(($i + 1)) $((${#EXPS[@]} - 1))); do
@@ -83,7 +165,7 @@ if [[ -f "$METRICS_FILE" && ${#EXPS[@]} -gt 1 ]]; then
         --exp-b "${EXPS[$j]}" \
         --exp-a-name "${EXP_NAMES[$i]}" \
         --exp-b-name "${EXP_NAMES[$j]}" \
-        --metrics "$METRICS_FILE" \
+        --cube "$CUBE_FILE" \
         --outdir "$PLOTS" \
         --fcint "$FCINT" \
         --title "${PROJECTNAME}_surface_${EXP_NAMES[$i]}_vs_${EXP_NAMES[$j]}"
@@ -94,7 +176,7 @@ else
 fi
 
 
-if [[ -f "$TEMP_METRICS_FILE" && ${#EXPS[@]} -gt 1 ]]; then
+if [[ -f "$TEMP_CUBE_FILE" && ${#EXPS[@]} -gt 1 ]]; then
   echo "Building scorecards for monitor temp profiles..."
   for i in $(seq 0 $((${#EXPS[@]} - 2))); do
     for j in $(seq $(($i + 1)) $((${#EXPS[@]} - 1))); do
@@ -103,7 +185,7 @@ if [[ -f "$TEMP_METRICS_FILE" && ${#EXPS[@]} -gt 1 ]]; then
         --exp-b "${EXPS[$j]}" \
         --exp-a-name "${EXP_NAMES[$i]}" \
         --exp-b-name "${EXP_NAMES[$j]}" \
-        --metrics "$TEMP_METRICS_FILE" \
+        --cube "$TEMP_CUBE_FILE" \
         --outdir "$PLOTS" \
         --fcint "$FCINT" \
         --title "${PROJECTNAME}_temp_${EXP_NAMES[$i]}_vs_${EXP_NAMES[$j]}"
@@ -114,10 +196,41 @@ else
   echo "WARNING: Not enough experiments for temp scorecard or temp metrics file not found."
 fi
 
+# --- Trailing-window cubes and scorecards ---
+if [[ ${#ROLLING_WINDOWS[@]} -gt 0 ]]; then
+  for DOMAIN in surface temp; do
+    if [[ "$DOMAIN" == "surface" ]]; then SRC="$METRICS_FILE"; else SRC="$TEMP_METRICS_FILE"; fi
+    [[ -f "$SRC" ]] || continue
+    WINDOW_ARGS=()
+    for DAYS in "${ROLLING_WINDOWS[@]}"; do
+      WINDOW_ARGS+=(--window "${DAYS}=${WORKDIR}/rolling/${DOMAIN}_cube_${DAYS}d.parquet")
+    done
+    python3 -m src.python.rolling --partitions "${WORKDIR}/rolling/${DOMAIN}_days" --metrics "$SRC" "${WINDOW_ARGS[@]}"
+    if [[ ${#EXPS[@]} -lt 2 ]]; then
+      continue
+    fi
+    for DAYS in "${ROLLING_WINDOWS[@]}"; do
+      for i in $(seq 0 $((${#EXPS[@]} - 2))); do
+        for j in $(seq $(($i + 1)) $((${#EXPS[@]} - 1))); do
+          python3 -m src.python.scorecard \
+            --exp-a "${EXPS[$i]}" \
+            --exp-b "${EXPS[$j]}" \
+            --exp-a-name "${EXP_NAMES[$i]}" \
+            --exp-b-name "${EXP_NAMES[$j]}" \
+            --cube "${WORKDIR}/rolling/${DOMAIN}_cube_${DAYS}d.parquet" \
+            --outdir "$PLOTS" \
+            --fcint "$FCINT" \
+            --title "${PROJECTNAME}_${DOMAIN}_${EXP_NAMES[$i]}_vs_${EXP_NAMES[$j]}_${DAYS}d"
+        done
+      done
+    done
+  done
+fi
+
 
 
 # --- Run Plotting for Surface Metrics ---
-if [[ -f "$METRICS_FILE" ]]; then
+if [[ -f "$CUBE_FILE" ]]; then
   echo "Building timeseries and lead time plots for monitor surface metrics..."
   read -r -a EXP_COLORS <<< "$EXP_COLORS_STR"
 
@@ -130,19 +243,29 @@ if [[ -f "$METRICS_FILE" ]]; then
     NAME_ARGS+=(--exp-name "${EXPS[$i]}"="${EXP_NAMES[$i]}")
   done
 
-  python3 -m src.python.monitor_plotting \
-    --metrics "$METRICS_FILE" \
+  python3 -m src.python.series_export \
+    --cube "$CUBE_FILE" \
     --outdir "$PLOTS" \
-    --title-prefix "${PROJECTNAME}_surface" \
+    --domain surface \
     --fcint "$FCINT" \
     "${COLOR_ARGS[@]}" \
-    "${NAME_ARGS[@]}" 
+    "${NAME_ARGS[@]}"
+
+  if [[ "${RENDER_PNG}" -eq 1 ]]; then
+    python3 -m src.python.monitor_plotting \
+      --cube "$CUBE_FILE" \
+      --outdir "$PLOTS" \
+      --title-prefix "${PROJECTNAME}_surface" \
+      --fcint "$FCINT" \
+      "${COLOR_ARGS[@]}" \
+      "${NAME_ARGS[@]}"
+  fi
 else
-  echo "WARNING: ${METRICS_FILE} not found. Skipping surface metric plots."
+  echo "WARNING: ${CUBE_FILE} not found. Skipping surface metric plots."
 fi
 
 # --- Run Plotting for Temp Profiles ---
-if [[ -f "$TEMP_METRICS_FILE" ]]; then
+if [[ -f "$TEMP_CUBE_FILE" ]]; then
   echo "Building temp profile plots for monitor..."
   read -r -a EXP_COLORS <<< "$EXP_COLORS_STR"
 
@@ -160,15 +283,26 @@ if [[ -f "$TEMP_METRICS_FILE" ]]; then
     TEMP_CYCLES_ARG+=(--monitor-temp-cycles "${MONITOR_TEMP_CYCLES}")
   fi
 
-  python3 -m src.python.monitor_profile_plotting \
-    --metrics "$TEMP_METRICS_FILE" \
+  python3 -m src.python.series_export \
+    --cube "$TEMP_CUBE_FILE" \
     --outdir "$PLOTS" \
+    --domain temp \
     --fcint "$FCINT" \
     "${TEMP_CYCLES_ARG[@]}" \
     "${COLOR_ARGS[@]}" \
-    "${NAME_ARGS[@]}" 
+    "${NAME_ARGS[@]}"
+
+  if [[ "${RENDER_PNG}" -eq 1 ]]; then
+    python3 -m src.python.monitor_profile_plotting \
+      --cube "$TEMP_CUBE_FILE" \
+      --outdir "$PLOTS" \
+      --fcint "$FCINT" \
+      "${TEMP_CYCLES_ARG[@]}" \
+      "${COLOR_ARGS[@]}" \
+      "${NAME_ARGS[@]}"
+  fi
 else
-  echo "WARNING: ${TEMP_METRICS_FILE} not found. Skipping temp profile plots."
+  echo "WARNING: ${TEMP_CUBE_FILE} not found. Skipping temp profile plots."
 fi
 
 wait
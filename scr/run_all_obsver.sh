@@ -25,7 +25,20 @@ ROUND_DEC="${ROUND_DEC:-2}"
 EXP_COLORS_STR="${EXP_COLORS_OBSVER:-#1f77b4 #d62728}"
 # No eval needed here, can be read directly into an array
 read -r -a EXP_COLORS <<< "$EXP_COLORS_STR"
-GENERATE_LEADTIME_PLOTS="${GENERATE_LEADTIME_PLOTS:-1}"
+# Per-lead-time PNGs are rendered on demand when the webapp has a render service (VERIF_RENDER_URL)
+if [[ -n "${VERIF_RENDER_URL:-}" ]]; then
+  GENERATE_LEADTIME_PLOTS="${GENERATE_LEADTIME_PLOTS:-0}"
+else
+  GENERATE_LEADTIME_PLOTS="${GENERATE_LEADTIME_PLOTS:-1}"
+fi
+# 1=render PNGs, 0=only export JSON series for the webapp's client-side charts
+RENDER_PNG="${RENDER_PNG:-1}"
+# Optional cache directory of per-file metrics and keys for verify.py and build_common_keys.py
+# (empty=disabled); reruns only query new or changed OFCTABLE files
+VERIFY_CACHE_DIR="${VERIFY_CACHE_DIR:-}"
+# Trailing windows in days (e.g. "7 30") to build cubes and scorecards for from daily partitions
+# of the metrics (empty=none)
+read -r -a ROLLING_WINDOWS <<< "${ROLLING_WINDOWS:-}"
 
 # --- Paths ---
 OUTDIR="${OBSVER_OUTPUT:-out/obsver_run/obsver}"
@@ -55,6 +68,9 @@ for OV in "${OBSVARS[@]}"; do
     for i in "${!EXPS[@]}"; do
       BUILD_ARGS+=(--exp "${EXPS[$i]}" "${EXPPATHS[$i]}")
     done
+    if [[ -n "${VERIFY_CACHE_DIR}" ]]; then
+      BUILD_ARGS+=(--cache-dir "${VERIFY_CACHE_DIR}")
+    fi
 
     python3 -m src.python.build_common_keys \
       --obstypevar "${OBSTYPEVAR}" \
@@ -94,10 +110,27 @@ for OV in "${OBSVARS[@]}"; do
     if [[ -n "${KEYFILE}" ]]; then
       CMD+=(--key-filter "${KEYFILE}")
     fi
+    if [[ -n "${VERIFY_CACHE_DIR}" ]]; then
+      CMD+=(--cache-dir "${VERIFY_CACHE_DIR}")
+    fi
     "${CMD[@]}"
   done
 done
 
+# --- Plot cube: aggregate all variables once for plots and scorecards ---
+CUBE_FILE="${OUTDIR}/plot_cube.parquet"
+rm -f "${CUBE_FILE}"
+CUBE_INPUTS=()
+for OV in "${OBSVARS[@]}"; do
+  for EXP in "${EXPS[@]}"; do
+    f="${OUTDIR}/${EXP}_${OV}_metrics.parquet"
+    [[ -f "$f" ]] && CUBE_INPUTS+=("$f")
+  done
+done
+if [[ ${#CUBE_INPUTS[@]} -gt 0 ]]; then
+  python3 -m src.python.plot_cube --metrics "${CUBE_INPUTS[@]}" --out "${CUBE_FILE}"
+fi
+
 # --- Plotting (keeps EXPS order) ---
 ALL_LEAD_TIMES_PER_VAR=()
 for OV in "${OBSVARS[@]}"; do
@@ -144,8 +177,13 @@ PY
     HOURS_ARG+=(--hours ${OBSVER_HOURS[@]})
   fi
 
+  if [[ "${RENDER_PNG}" -ne 1 ]]; then
+    continue
+  fi
+
   python3 -m src.python.joint_plotting \
-    --metrics "${METRICS_FILES[@]}" \
+    --cube "${CUBE_FILE}" \
+    --obstypevar "${OBSTYPEVAR}" \
     --outdir "${OV_PLOT_DIR}" \
     --title-prefix "${OBSTYPEVAR}" \
     --start-date "$START" \
@@ -160,7 +198,8 @@ PY
     if [[ -n "${LTS}" ]]; then
       for LT in ${LTS}; do
         python3 -m src.python.joint_plotting \
-          --metrics "${METRICS_FILES[@]}" \
+          --cube "${CUBE_FILE}" \
+          --obstypevar "${OBSTYPEVAR}" \
           --outdir "${OV_PLOT_DIR}" \
           --title-prefix "${OBSTYPEVAR}" \
           --lead-time "${LT}" \
@@ -179,18 +218,35 @@ done
 
 wait
 
-# --- Scorecard (explicit order for title/legend) ---
-# Collect only metric files corresponding to variables in OBSVARS (and that actually exist)
-METRICS_FILES=()
-for OV in "${OBSVARS[@]}"; do
-  for EXP in "${EXPS[@]}"; do
-    f="${OUTDIR}/${EXP}_${OV}_metrics.parquet"
-    [[ -f "$f" ]] && METRICS_FILES+=("$f")
+# --- Series export for the webapp's client-side charts (per-lead variants included) ---
+if [[ -f "${CUBE_FILE}" ]]; then
+  COLOR_ARGS=()
+  NAME_ARGS=()
+  for i in "${!EXPS[@]}"; do
+    if [[ -n "${EXP_COLORS[$i]:-}" ]]; then
+      COLOR_ARGS+=(--exp-color "${EXPS[$i]}"="${EXP_COLORS[$i]}")
+    fi
+    NAME_ARGS+=(--exp-name "${EXPS[$i]}"="${EXP_NAMES[$i]}")
   done
-done
+  HOURS_ARG=()
+  if [[ ${#OBSVER_HOURS[@]} -gt 0 ]]; then
+    HOURS_ARG+=(--hours ${OBSVER_HOURS[@]})
+  fi
+  python3 -m src.python.series_export \
+    --cube "${CUBE_FILE}" \
+    --outdir "${PLOTS}" \
+    --domain obsver \
+    --start-date "$START" \
+    --end-date "$END" \
+    "${COLOR_ARGS[@]}" \
+    "${NAME_ARGS[@]}" \
+    "${HOURS_ARG[@]}"
+fi
 
-if [[ ${#METRICS_FILES[@]} -gt 0 && ${#EXPS[@]} -gt 1 ]]; then
-  echo "Building scorecards from ${#METRICS_FILES[@]} metric files (vars: ${OBSVARS[*]})"
+# --- Scorecard (explicit order for title/legend) ---
+# The plot cube holds only metric files of variables in OBSVARS (and that actually exist)
+if [[ -f "${CUBE_FILE}" && ${#EXPS[@]} -gt 1 ]]; then
+  echo "Building scorecards from ${#CUBE_INPUTS[@]} metric files (vars: ${OBSVARS[*]})"
   for i in $(seq 0 $((${#EXPS[@]} - 2))); do
     for j in $(seq $(($i + 1)) $((${#EXPS[@]} - 1))); do
       python3 -m src.python.scorecard_obsver \
@@ -198,7 +254,7 @@ if [[ ${#METRICS_FILES[@]} -gt 0 && ${#EXPS[@]} -gt 1 ]]; then
         --exp-b "${EXPS[$j]}" \
         --exp-a-name "${EXP_NAMES[$i]}" \
         --exp-b-name "${EXP_NAMES[$j]}" \
-        --metrics "${METRICS_FILES[@]}" \
+        --cube "${CUBE_FILE}" \
         --fcint "${FCINT}" \
         --outdir "${PLOTS}" \
         --title "Scorecard_${EXP_NAMES[$i]}_vs_${EXP_NAMES[$j]}"
@@ -207,3 +263,29 @@ if [[ ${#METRICS_FILES[@]} -gt 0 && ${#EXPS[@]} -gt 1 ]]; then
 else
   echo "No metric files found or not enough experiments for scorecard; skipping scorecard."
 fi
+
+# --- Trailing-window cubes and scorecards ---
+if [[ ${#ROLLING_WINDOWS[@]} -gt 0 && ${#CUBE_INPUTS[@]} -gt 0 ]]; then
+  WINDOW_ARGS=()
+  for DAYS in "${ROLLING_WINDOWS[@]}"; do
+    WINDOW_ARGS+=(--window "${DAYS}=${OUTDIR}/rolling/obsver_cube_${DAYS}d.parquet")
+  done
+  python3 -m src.python.rolling --partitions "${OUTDIR}/rolling/obsver_days" --metrics "${CUBE_INPUTS[@]}" "${WINDOW_ARGS[@]}"
+  if [[ ${#EXPS[@]} -gt 1 ]]; then
+    for DAYS in "${ROLLING_WINDOWS[@]}"; do
+      for i in $(seq 0 $((${#EXPS[@]} - 2))); do
+        for j in $(seq $(($i + 1)) $((${#EXPS[@]} - 1))); do
+          python3 -m src.python.scorecard \
+            --exp-a "${EXPS[$i]}" \
+            --exp-b "${EXPS[$j]}" \
+            --exp-a-name "${EXP_NAMES[$i]}" \
+            --exp-b-name "${EXP_NAMES[$j]}" \
+            --cube "${OUTDIR}/rolling/obsver_cube_${DAYS}d.parquet" \
+            --fcint "${FCINT}" \
+            --outdir "${PLOTS}" \
+            --title "Scorecard_${EXP_NAMES[$i]}_vs_${EXP_NAMES[$j]}_${DAYS}d"
+        done
+      done
+    done
+  fi
+fi
@@ -0,0 +1,139 @@
+// ArrowExport.cpp
+#include "ArrowExport.hpp"
+#include <string>
+#include <vector>
+
+namespace {
+
+// Stands in for the data buffer of an empty column, which must not be null
+alignas(8) const int64_t kEmptyBuffer[1] = {0};
+
+const void* data_of(const void* data) { return data ? data : kEmptyBuffer; }
+
+const char* format_of(MetricColumn::Type type) {
+    switch (type) {
+    case MetricColumn::Type::Int64: return "l";
+    case MetricColumn::Type::Float64: return "g";
+    case MetricColumn::Type::Utf8: return "u";
+    }
+    return "n";
+}
+
+int64_t length_of(const MetricTable& table) {
+    if (table.empty()) return 0;
+    const MetricColumn& c = table.front();
+    switch (c.type) {
+    case MetricColumn::Type::Int64: return static_cast<int64_t>(c.ints.size());
+    case MetricColumn::Type::Float64: return static_cast<int64_t>(c.doubles.size());
+    case MetricColumn::Type::Utf8: return static_cast<int64_t>(c.offsets.size()) - 1;
+    }
+    return 0;
+}
+
+// Every exported struct owns its private data, so a consumer may move and release children
+// independently of their parent
+struct SchemaData {
+    std::string name;
+    std::vector<ArrowSchema> children;
+    std::vector<ArrowSchema*> child_pointers;
+};
+
+void release_schema(ArrowSchema* schema) {
+    auto* data = static_cast<SchemaData*>(schema->private_data);
+    for (ArrowSchema* child : data->child_pointers) {
+        if (child->release) child->release(child);
+    }
+    delete data;
+    schema->release = nullptr;
+}
+
+void make_schema(ArrowSchema* out, const char* format, const std::string& name, size_t n_children) {
+    auto* data = new SchemaData{name, std::vector<ArrowSchema>(n_children), {}};
+    for (auto& child : data->children) data->child_pointers.push_back(&child);
+    *out = ArrowSchema{format, data->name.c_str(), nullptr, 0, static_cast<int64_t>(n_children),
+                       data->child_pointers.data(), nullptr, release_schema, data};
+}
+
+void export_schema(const MetricTable& table, ArrowSchema* out) {
+    make_schema(out, "+s", "", table.size());
+    auto& children = static_cast<SchemaData*>(out->private_data)->children;
+    for (size_t i = 0; i < table.size(); ++i) make_schema(&children[i], format_of(table[i].type), table[i].name, 0);
+}
+
+struct ArrayData {
+    std::shared_ptr<const MetricTable> table;  // owner of the buffers
+    std::vector<const void*> buffers;
+    std::vector<ArrowArray> children;
+    std::vector<ArrowArray*> child_pointers;
+};
+
+void release_array(ArrowArray* array) {
+    auto* data = static_cast<ArrayData*>(array->private_data);
+    for (ArrowArray* child : data->child_pointers) {
+        if (child->release) child->release(child);
+    }
+    delete data;
+    array->release = nullptr;
+}
+
+ArrayData* make_array(ArrowArray* out, const std::shared_ptr<const MetricTable>& table, int64_t length,
+                      std::vector<const void*> buffers, size_t n_children) {
+    auto* data = new ArrayData{table, std::move(buffers), std::vector<ArrowArray>(n_children), {}};
+    for (auto& child : data->children) data->child_pointers.push_back(&child);
+    *out = ArrowArray{length, 0, 0, static_cast<int64_t>(data->buffers.size()), static_cast<int64_t>(n_children),
+                      data->buffers.data(), data->child_pointers.data(), nullptr, release_array, data};
+    return data;
+}
+
+void export_array(const std::shared_ptr<const MetricTable>& table, ArrowArray* out) {
+    const int64_t length = length_of(*table);
+    ArrayData* data = make_array(out, table, length, {nullptr}, table->size());
+    for (size_t i = 0; i < table->size(); ++i) {
+        const MetricColumn& c = (*table)[i];
+        std::vector<const void*> buffers = {nullptr};  // no validity bitmap: there are no nulls
+        switch (c.type) {
+        case MetricColumn::Type::Int64: buffers.push_back(data_of(c.ints.data())); break;
+        case MetricColumn::Type::Float64: buffers.push_back(data_of(c.doubles.data())); break;
+        case MetricColumn::Type::Utf8:
+            buffers.push_back(c.offsets.data());
+            buffers.push_back(data_of(c.chars.data()));
+            break;
+        }
+        make_array(&data->children[i], table, length, std::move(buffers), 0);
+    }
+}
+
+struct StreamData {
+    std::shared_ptr<const MetricTable> table;
+    bool exhausted = false;
+};
+
+int stream_get_schema(ArrowArrayStream* stream, ArrowSchema* out) {
+    export_schema(*static_cast<StreamData*>(stream->private_data)->table, out);
+    return 0;
+}
+
+int stream_get_next(ArrowArrayStream* stream, ArrowArray* out) {
+    auto* data = static_cast<StreamData*>(stream->private_data);
+    if (data->exhausted) {
+        out->release = nullptr;  // end of stream
+        return 0;
+    }
+    export_array(data->table, out);
+    data->exhausted = true;
+    return 0;
+}
+
+const char* stream_get_last_error(ArrowArrayStream*) { return nullptr; }
+
+void stream_release(ArrowArrayStream* stream) {
+    delete static_cast<StreamData*>(stream->private_data);
+    stream->release = nullptr;
+}
+
+} // namespace
+
+void export_table(std::shared_ptr<const MetricTable> table, ArrowArrayStream* out) {
+    *out = ArrowArrayStream{stream_get_schema, stream_get_next, stream_get_last_error, stream_release,
+                            new StreamData{std::move(table)}};
+}
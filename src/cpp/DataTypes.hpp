@@ -1,6 +1,8 @@
 // DataTypes.hpp
 #pragma once
 
+#include <cmath>
+#include <cstdint>
 #include <string>
 #include <vector>
 #include <unordered_map>
@@ -34,6 +36,32 @@ struct TempLevel {
 struct VobsData {
     std::unordered_map<int, SurfaceStation> stations;
     std::vector<TempLevel> temp_levels;
+    // (station_id, pressure) key -> position in temp_levels, sorted by key (build_temp_index)
+    std::vector<std::pair<long long, size_t>> temp_index;
+};
+
+// One parsed vfld file, kept in memory while its forecast run is verified.
+// pe_totals holds the cumulative precipitation per station (PE > -98).
+struct VfldData {
+    std::vector<SurfaceStation> stations;
+    std::vector<TempLevel> temp_levels;
+    std::unordered_map<int, double> pe_totals;
+};
+
+// Variables available per surface station and per upper-air (station, pressure) key, as bitsets
+// over variable ids. Used by the common-sample mode to keep only samples all experiments have.
+struct CommonSamples {
+    std::unordered_map<int, uint64_t> surface;
+    std::unordered_map<long long, uint64_t> temp;
+
+    bool has_surface(int station_id, int var) const {
+        auto it = surface.find(station_id);
+        return it != surface.end() && (it->second >> var & 1);
+    }
+    bool has_temp(long long level_key, int var) const {
+        auto it = temp.find(level_key);
+        return it != temp.end() && (it->second >> var & 1);
+    }
 };
 
 struct FileInfo {
@@ -42,37 +70,92 @@ struct FileInfo {
     int lead_time = -1;
 };
 
-struct ResultKey {
-    std::string experiment;
-    int lead_time;
-    std::string variable;
-    long long vt_hour;
+struct AggregatedStats {
+    double sum_of_errors = 0.0, sum_of_squared_errors = 0.0;
+    long count = 0;
+    double sum_of_abs_errors = 0.0;
+    // Forecast/observation moments for means, standard deviations and correlation
+    double sum_fcst = 0.0, sum_obs = 0.0;
+    double sum_fcst_sq = 0.0, sum_obs_sq = 0.0, sum_fcst_obs = 0.0;
+
+    void add(double fcst, double obs, double error) {
+        sum_of_errors += error;
+        sum_of_squared_errors += error * error;
+        count++;
+        sum_of_abs_errors += std::fabs(error);
+        sum_fcst += fcst;
+        sum_obs += obs;
+        sum_fcst_sq += fcst * fcst;
+        sum_obs_sq += obs * obs;
+        sum_fcst_obs += fcst * obs;
+    }
+    void merge(const AggregatedStats& other) {
+        sum_of_errors += other.sum_of_errors;
+        sum_of_squared_errors += other.sum_of_squared_errors;
+        count += other.count;
+        sum_of_abs_errors += other.sum_of_abs_errors;
+        sum_fcst += other.sum_fcst;
+        sum_obs += other.sum_obs;
+        sum_fcst_sq += other.sum_fcst_sq;
+        sum_obs_sq += other.sum_obs_sq;
+        sum_fcst_obs += other.sum_fcst_obs;
+    }
+};
+
+// 2x2 contingency table of one precipitation window and threshold (event: value >= threshold)
+struct ContingencyCounts {
+    long hits = 0, false_alarms = 0, misses = 0, correct_negatives = 0;
 
-    bool operator<(const ResultKey& other) const {
-        if (experiment != other.experiment) return experiment < other.experiment;
-        if (lead_time != other.lead_time) return lead_time < other.lead_time;
-        if (vt_hour != other.vt_hour) return vt_hour < other.vt_hour;
-        return variable < other.variable;
+    void add(double fcst, double obs, double threshold) {
+        const bool f = fcst >= threshold, o = obs >= threshold;
+        if (f && o) hits++;
+        else if (f) false_alarms++;
+        else if (o) misses++;
+        else correct_negatives++;
     }
+    void merge(const ContingencyCounts& other) {
+        hits += other.hits;
+        false_alarms += other.false_alarms;
+        misses += other.misses;
+        correct_negatives += other.correct_negatives;
+    }
+    long total() const { return hits + false_alarms + misses + correct_negatives; }
 };
 
-struct TempResultKey {
-    std::string experiment;
+// Aggregated metrics of one (experiment, lead_time, vt_hour[, pressure_level]) cell and variable.
+// Experiments and variables are interned ids into the name tables of the run.
+struct SurfaceResult {
+    int experiment;
     int lead_time;
-    std::string variable;
-    double pressure_level;
     long long vt_hour;
+    int variable;
+    AggregatedStats stats;
+};
 
-    bool operator<(const TempResultKey& other) const {
-        if (experiment != other.experiment) return experiment < other.experiment;
-        if (lead_time != other.lead_time) return lead_time < other.lead_time;
-        if (vt_hour != other.vt_hour) return vt_hour < other.vt_hour;
-        if (pressure_level != other.pressure_level) return pressure_level < other.pressure_level;
-        return variable < other.variable;
-    }
+struct TempResult {
+    int experiment;
+    int lead_time;
+    long long vt_hour;
+    double pressure_level;
+    int variable;
+    AggregatedStats stats;
 };
 
-struct AggregatedStats {
-    double sum_of_errors = 0.0, sum_of_squared_errors = 0.0;
-    long count = 0;
+struct ContingencyResult {
+    int experiment;
+    int lead_time;
+    long long vt_hour;
+    int variable;
+    double threshold;
+    ContingencyCounts counts;
+};
+
+// Aggregated metrics of one station (coordinates and height from its observations)
+struct StationResult {
+    int experiment;
+    int station_id;
+    double lat, lon, hgt;
+    int lead_time;  // -1 unless grouped by lead time
+    int variable;
+    AggregatedStats stats;
 };
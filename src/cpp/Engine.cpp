@@ -0,0 +1,813 @@
+// Engine.cpp
+#include "Engine.hpp"
+#include "FileDiscovery.hpp"
+#include "FileUtils.hpp"
+#include "ParseCache.hpp"
+#include "StateStore.hpp"
+#include "VerificationUtils.hpp"
+
+#include <algorithm>
+#include <chrono>
+#include <cmath>
+#include <filesystem>
+#include <future>
+#include <iostream>
+#include <map>
+#include <omp.h>
+#include <set>
+#include <sstream>
+#include <stdexcept>
+#include <tuple>
+#include <unordered_map>
+#include <unordered_set>
+
+namespace fs = std::filesystem;
+
+namespace {
+
+// Shard (0-based) of a valid time: FNV-1a of its YYYYMMDDHH digits, so every run agrees on it
+int shard_of_valid_time(long long valid_time, int shard_count) {
+    uint64_t h = 1469598103934665603ULL;
+    for (char c : std::to_string(valid_time)) {
+        h ^= static_cast<unsigned char>(c);
+        h *= 1099511628211ULL;
+    }
+    return static_cast<int>(h % static_cast<uint64_t>(shard_count));
+}
+
+} // namespace
+
+bool parse_shard(const std::string& text, int& index, int& count) {
+    const size_t slash = text.find('/');
+    if (slash == std::string::npos) return false;
+    try {
+        size_t used_index, used_count;
+        index = std::stoi(text.substr(0, slash), &used_index);
+        count = std::stoi(text.substr(slash + 1), &used_count);
+        if (used_index != slash || used_count != text.size() - slash - 1) return false;
+    } catch (const std::exception&) {
+        return false;
+    }
+    return count >= 1 && index >= 1 && index <= count;
+}
+
+void run_verification(const EngineOptions& options, std::ostream& log, MetricNames& names, MetricResults& results) {
+    const long long start_dt = options.start, end_dt = options.end;
+    const int fcint = options.fcint;
+    const bool stream = options.stream, common_samples = options.common_samples;
+    const bool station_stats = options.station_stats || options.station_stats_by_lead;
+    const bool station_stats_by_lead = options.station_stats_by_lead;
+    const size_t prefetch_batches = options.prefetch_batches;
+    const std::string& state_dir = options.state_dir;
+    const fs::path vobs_path = options.vobs_dir;
+    const std::vector<fs::path> experiment_paths(options.experiment_dirs.begin(), options.experiment_dirs.end());
+    if (fcint <= 0) throw std::runtime_error("fcint must be a positive number of hours.");
+    if (experiment_paths.empty()) throw std::runtime_error("No experiment directories given.");
+    if (!state_dir.empty() && station_stats) {
+        throw std::runtime_error("--state-dir keeps per valid time aggregates and cannot be combined with --station-stats.");
+    }
+    if (options.shard_count < 1 || options.shard_index < 1 || options.shard_index > options.shard_count) {
+        throw std::runtime_error("Invalid shard " + std::to_string(options.shard_index) + "/" + std::to_string(options.shard_count) + ".");
+    }
+    if (options.shard_count > 1 && station_stats) {
+        throw std::runtime_error("--shard splits the run by valid time and cannot be combined with --station-stats.");
+    }
+    ParseCache parse_cache(options.cache_dir);
+    std::unordered_set<int> station_blacklist;
+    if (!options.station_blacklist.empty()) {
+        if (!read_station_list(options.station_blacklist, station_blacklist)) {
+            throw std::runtime_error("Could not read the station blacklist " + options.station_blacklist);
+        }
+        log << "Station blacklist: " << station_blacklist.size() << " stations are skipped." << std::endl;
+    }
+
+    std::vector<FileInfo> vfld_files;
+    std::vector<FileInfo> vobs_files;
+    log << "Discovering and parsing filenames..." << std::endl;
+    auto discovery_start_time = std::chrono::high_resolution_clock::now();
+    if (!discover_files(experiment_paths, vobs_path, {start_dt, end_dt, fcint}, parse_cache, vfld_files, vobs_files)) {
+        throw std::runtime_error("File discovery failed.");
+    }
+    // Track valid_time availability per experiment and for observations
+    std::unordered_map<std::string, std::unordered_set<long long>> exp_valid_times;
+    std::unordered_set<long long> vobs_valid_times;
+    for (const auto& info : vfld_files) exp_valid_times[info.experiment].insert(info.valid_time);
+    for (const auto& info : vobs_files) vobs_valid_times.insert(info.valid_time);
+    if (parse_cache.enabled()) {
+        log << "Listing cache: " << parse_cache.listing_hits() << " directories reused" << std::endl;
+    }
+    log << "Found " << vobs_files.size() << " vobs files and " << vfld_files.size() << " vfld files (pre-filter)." << std::endl;
+    log << "--- Time for file discovery: " << std::chrono::duration<double>(std::chrono::high_resolution_clock::now() - discovery_start_time).count() << " seconds ---" << std::endl;
+
+    // Compute intersection of valid_time across all experiments, then intersect with available vobs times
+    std::unordered_set<long long> common_valid_times;
+    bool first_exp = true;
+    for (const auto& kv : exp_valid_times) {
+        const auto& times = kv.second;
+        if (first_exp) {
+            common_valid_times = times;
+            first_exp = false;
+        } else {
+            std::unordered_set<long long> tmp;
+            for (auto t : common_valid_times) if (times.find(t) != times.end()) tmp.insert(t);
+            common_valid_times.swap(tmp);
+        }
+    }
+    if (!first_exp) { // if we had at least one experiment, also require vobs availability
+        std::unordered_set<long long> tmp;
+        for (auto t : common_valid_times) if (vobs_valid_times.find(t) != vobs_valid_times.end()) tmp.insert(t);
+        common_valid_times.swap(tmp);
+    }
+
+    log << "Experiments: " << exp_valid_times.size() << ", common valid times with vobs: " << common_valid_times.size() << std::endl;
+    if (common_valid_times.empty()) {
+        throw std::runtime_error("No common valid times across experiments (and vobs) within given range.");
+    }
+    // A shard verifies its part of the common valid times; every output row belongs to one valid
+    // time, so the shards' rows together are the rows of the whole run
+    if (options.shard_count > 1) {
+        std::vector<long long> times(common_valid_times.begin(), common_valid_times.end());
+        std::sort(times.begin(), times.end());
+        std::unordered_set<long long> selected;
+        for (size_t k = 0; k < times.size(); ++k) {
+            const int shard = options.shard_by_time ? static_cast<int>(k * options.shard_count / times.size())
+                                                    : shard_of_valid_time(times[k], options.shard_count);
+            if (shard == options.shard_index - 1) selected.insert(times[k]);
+        }
+        log << "Shard " << options.shard_index << "/" << options.shard_count << " (by "
+            << (options.shard_by_time ? "time" : "hash") << "): " << selected.size() << " of " << times.size()
+            << " valid times" << std::endl;
+        common_valid_times.swap(selected);
+    }
+    if (vfld_files.empty() || vobs_files.empty()) throw std::runtime_error("No data files found.");
+
+    // Surface variables to verify (order defines output emphasis)
+    std::vector<std::string> supported_variables = options.surface_variables;
+    if (supported_variables.empty()) {
+        // Requested SURFPAR order
+        supported_variables = {"PS","SPS","FF","GX","DD","TT","TTHA","TN","TX","TD","TDD","RH","QQ","NN","LC","CH","VI"};
+    }
+    // Temp variables order (upper-air)
+    std::vector<std::string> temp_supported_variables = options.temp_variables;
+    if (temp_supported_variables.empty()) temp_supported_variables = {"TT","TD","FF","DD","FI","RH","QQ"};
+    // Precipitation windows selected in the surface list; all of them when no list is given
+    std::vector<std::pair<std::string,int>> precip_windows = {
+        {"PE1",1},{"PE3",3},{"PE6",6},{"PE12",12},{"PE24",24}
+    };
+    if (!options.surface_variables.empty()) {
+        const std::unordered_set<std::string> selected(supported_variables.begin(), supported_variables.end());
+        precip_windows.erase(std::remove_if(precip_windows.begin(), precip_windows.end(),
+                                            [&](const auto& pw) { return !selected.count(pw.first); }),
+                             precip_windows.end());
+    }
+    // Precipitation thresholds (mm) for the PE* contingency tables; an event is value >= threshold
+    std::vector<double> precip_thresholds = options.precip_thresholds;
+    if (precip_thresholds.empty()) precip_thresholds = {0.1, 1.0, 5.0, 10.0};
+    std::sort(precip_thresholds.begin(), precip_thresholds.end());
+    precip_thresholds.erase(std::unique(precip_thresholds.begin(), precip_thresholds.end()), precip_thresholds.end());
+
+    // Intern experiments (ids follow name order, which is the output order) and variables, and
+    // resolve each variable to the struct member it reads once, instead of per observation.
+    std::vector<std::string> experiment_names;
+    for (const auto& kv : exp_valid_times) experiment_names.push_back(kv.first);
+    std::sort(experiment_names.begin(), experiment_names.end());
+    std::vector<int> file_experiment(vfld_files.size());
+    for (size_t i = 0; i < vfld_files.size(); ++i) {
+        file_experiment[i] = static_cast<int>(std::lower_bound(experiment_names.begin(), experiment_names.end(),
+                                                               vfld_files[i].experiment) - experiment_names.begin());
+    }
+    auto intern = [](std::vector<std::string>& names, const std::string& name) {
+        auto it = std::find(names.begin(), names.end(), name);
+        if (it != names.end()) return static_cast<int>(it - names.begin());
+        names.push_back(name);
+        return static_cast<int>(names.size() - 1);
+    };
+
+    enum class SurfaceKind { Plain, Direction, DewPointDepression };
+    struct SurfaceVarSpec { int id; double SurfaceStation::* field; SurfaceKind kind; };
+    struct PrecipVarSpec { int id; int window; double SurfaceStation::* obs_field; };
+    struct TempVarSpec { int id; double TempLevel::* field; bool direction; };
+    // Surface variables the engine verifies directly (station pressure is read from pss as SPS)
+    const std::unordered_set<std::string> verifiable_surface = {
+        "PS","SPS","FF","GX","DD","TT","TTHA","TN","TX","TD","RH","QQ","NN","LC","CH","VI"
+    };
+    std::vector<std::string> surface_var_names, temp_var_names;
+    std::vector<SurfaceVarSpec> surface_specs;
+    std::vector<PrecipVarSpec> precip_specs;
+    std::vector<TempVarSpec> temp_specs;
+    for (const auto& var : supported_variables) {
+        if (var == "TDD") {
+            surface_specs.push_back({intern(surface_var_names, var), nullptr, SurfaceKind::DewPointDepression});
+        } else if (verifiable_surface.count(var)) {
+            surface_specs.push_back({intern(surface_var_names, var), surface_field(var),
+                                     var == "DD" ? SurfaceKind::Direction : SurfaceKind::Plain});
+        }
+    }
+    for (const auto& pw : precip_windows) {
+        precip_specs.push_back({intern(surface_var_names, pw.first), pw.second, surface_field(pw.first)});
+    }
+    for (const auto& var : temp_supported_variables) {
+        if (auto field = temp_field(var)) temp_specs.push_back({intern(temp_var_names, var), field, var == "DD"});
+    }
+    const size_t n_surface_vars = surface_var_names.size();
+    const size_t n_temp_vars = temp_var_names.size();
+    const size_t n_thresholds = precip_thresholds.size();
+    // Contingency slot of each surface variable id (-1: not a precipitation window)
+    std::vector<int> precip_slot(n_surface_vars, -1);
+    for (size_t i = 0; i < precip_specs.size(); ++i) precip_slot[precip_specs[i].id] = static_cast<int>(i);
+
+    // Everything besides the input files that the aggregates depend on; a state made under
+    // another configuration is recomputed
+    std::string state_config;
+    {
+        std::ostringstream config;
+        config.precision(17);
+        auto list = [&](const char* key, const auto& values) {
+            config << key << "=";
+            for (const auto& v : values) config << v << " ";
+            config << "\n";
+        };
+        std::vector<int> blacklist_ids(station_blacklist.begin(), station_blacklist.end());
+        std::sort(blacklist_ids.begin(), blacklist_ids.end());
+        list("experiments", experiment_names);
+        list("surface", surface_var_names);
+        list("temp", temp_var_names);
+        list("thresholds", precip_thresholds);
+        list("blacklist", blacklist_ids);
+        config << "common=" << common_samples << "\n";
+        state_config = config.str();
+    }
+    StateStore state_store(state_dir, state_config);
+    if (common_samples) {
+        if (n_surface_vars > 64 || n_temp_vars > 64) {
+            throw std::runtime_error("--common-stations supports at most 64 surface and 64 temp variables.");
+        }
+        log << "Common-sample mode: only station/level samples present in all " << experiment_names.size()
+                  << " experiments are verified." << std::endl;
+    }
+
+    // vobs files per valid time (several files may share one valid time)
+    std::map<long long, std::vector<size_t>> vobs_files_by_time;
+    for (size_t i = 0; i < vobs_files.size(); ++i) vobs_files_by_time[vobs_files[i].valid_time].push_back(i);
+
+    // Reads the vobs files of the given valid times and indexes their upper-air levels once;
+    // all vfld files of a valid time share that index
+    auto load_vobs = [&](const std::vector<long long>& times, bool parallel) {
+        std::vector<size_t> files;
+        std::vector<long long> file_times;
+        std::vector<size_t> time_begin;  // files of file_times[m] are files[time_begin[m] .. time_begin[m + 1])
+        for (long long t : times) {
+            auto it = vobs_files_by_time.find(t);
+            if (it == vobs_files_by_time.end()) continue;
+            file_times.push_back(t);
+            time_begin.push_back(files.size());
+            files.insert(files.end(), it->second.begin(), it->second.end());
+        }
+        time_begin.push_back(files.size());
+
+        // Read the largest files first
+        std::vector<uint64_t> cost(files.size(), 0);
+        for (size_t i = 0; i < files.size(); ++i) {
+            int64_t mtime_ns;
+            stat_file(vobs_files[files[i]].path, mtime_ns, cost[i]);
+        }
+        const std::vector<size_t> order = order_by_cost(cost);
+        struct VobsFile { std::vector<SurfaceStation> stations; std::vector<TempLevel> temp_levels; };
+        std::vector<VobsFile> read(files.size());
+        #pragma omp parallel for schedule(dynamic) if(parallel)
+        for (size_t n = 0; n < order.size(); ++n) {
+            auto& data = read[order[n]];
+            int version;
+            parse_cache.read(vobs_files[files[order[n]]].path, false, version, data.stations, data.temp_levels);
+            remove_stations(station_blacklist, data.stations, data.temp_levels);
+        }
+
+        // One merge task per valid time; its files are merged in path order, so a later file's
+        // station replaces an earlier one
+        std::unordered_map<long long, VobsData> loaded;
+        std::vector<VobsData*> merged;
+        for (long long t : file_times) merged.push_back(&loaded[t]);
+        #pragma omp parallel for schedule(dynamic) if(parallel)
+        for (size_t m = 0; m < file_times.size(); ++m) {
+            VobsData& vobs = *merged[m];
+            for (size_t i = time_begin[m]; i < time_begin[m + 1]; ++i) {
+                for (const auto& station : read[i].stations) vobs.stations[station.id] = station;
+                vobs.temp_levels.insert(vobs.temp_levels.end(), read[i].temp_levels.begin(), read[i].temp_levels.end());
+                read[i] = VobsFile();
+            }
+            build_temp_index(vobs);
+        }
+        return loaded;
+    };
+
+    // Group vfld files per forecast run (experiment|base_time). Each file is parsed exactly once:
+    // runs are processed in batches, and the cumulative PE of a run is kept next to its parsed
+    // stations so every lead time of the run can form its precipitation windows from memory.
+    std::map<std::pair<long long, std::string>, std::vector<size_t>> runs_by_key;
+    for (size_t i = 0; i < vfld_files.size(); ++i) {
+        runs_by_key[{vfld_files[i].base_time, vfld_files[i].experiment}].push_back(i);
+    }
+    // Files verified directly (common valid time), plus the earlier leads their PE windows need
+    std::vector<char> verify_file(vfld_files.size(), 0);
+    for (size_t i = 0; i < vfld_files.size(); ++i) {
+        const auto& fi = vfld_files[i];
+        verify_file[i] = common_valid_times.count(fi.valid_time) && vobs_valid_times.count(fi.valid_time);
+    }
+    // Checkpointed valid times: a state whose inputs (the verified vfld files, their PE window
+    // partners and the vobs files) are unchanged is restored, and its files are not read at all
+    ValidTimeState restored;
+    std::map<long long, std::vector<StateInput>> state_inputs;  // valid times to compute and save
+    if (state_store.enabled()) {
+        std::map<long long, std::vector<std::string>> input_paths;
+        for (const auto& kv : runs_by_key) {
+            std::unordered_map<int, size_t> by_lead;
+            for (size_t i : kv.second) by_lead[vfld_files[i].lead_time] = i;
+            for (size_t i : kv.second) {
+                if (!verify_file[i]) continue;
+                auto& paths = input_paths[vfld_files[i].valid_time];
+                paths.push_back(vfld_files[i].path);
+                for (const auto& pw : precip_windows) {
+                    auto it = by_lead.find(vfld_files[i].lead_time - pw.second);
+                    if (it != by_lead.end()) paths.push_back(vfld_files[it->second].path);
+                }
+            }
+        }
+        std::unordered_set<long long> restored_times;
+        for (auto& kv : input_paths) {
+            auto& paths = kv.second;
+            for (size_t i : vobs_files_by_time[kv.first]) paths.push_back(vobs_files[i].path);
+            std::sort(paths.begin(), paths.end());
+            paths.erase(std::unique(paths.begin(), paths.end()), paths.end());
+            std::vector<StateInput> inputs;
+            if (!StateStore::describe(paths, inputs)) continue;  // computed, but not checkpointed
+            if (state_store.load(kv.first, inputs, restored)) restored_times.insert(kv.first);
+            else state_inputs[kv.first] = std::move(inputs);
+        }
+        for (size_t i = 0; i < vfld_files.size(); ++i) {
+            if (restored_times.count(vfld_files[i].valid_time)) verify_file[i] = 0;
+        }
+        log << "State: " << restored_times.size() << " of " << input_paths.size() << " valid times restored from "
+                  << state_dir << ", " << state_inputs.size() << " to compute" << std::endl;
+    }
+    std::vector<std::vector<size_t>> runs;  // in base_time order
+    for (auto& kv : runs_by_key) {
+        std::unordered_set<int> verified_leads;
+        for (size_t i : kv.second) if (verify_file[i]) verified_leads.insert(vfld_files[i].lead_time);
+        if (verified_leads.empty()) continue;
+        std::vector<size_t> files;
+        for (size_t i : kv.second) {
+            bool needed = verify_file[i];
+            for (const auto& pw : precip_windows) {
+                if (needed) break;
+                needed = verified_leads.count(vfld_files[i].lead_time + pw.second) > 0;
+            }
+            if (needed) files.push_back(i);
+        }
+        runs.push_back(std::move(files));
+    }
+    if (precip_windows.empty()) {
+        log << "Skipping precipitation accumulation (no PE windows selected)." << std::endl;
+    }
+
+    // Estimated cost of verifying a file: its size (upper-air profiles make files both larger and
+    // slower). Every parallel loop over a batch starts with the most expensive files.
+    std::vector<uint64_t> file_cost(vfld_files.size(), 0);
+    #pragma omp parallel for schedule(dynamic, 64)
+    for (size_t r = 0; r < runs.size(); ++r) {
+        for (size_t i : runs[r]) {
+            int64_t mtime_ns;
+            stat_file(vfld_files[i].path, mtime_ns, file_cost[i]);
+        }
+    }
+
+    // Batches of whole runs with enough files to keep all threads busy, plus the vobs valid times
+    // each batch verifies against
+    struct VerifyBatch {
+        std::vector<size_t> files;                               // vfld indices
+        std::vector<size_t> by_cost;                             // batch positions, most expensive first
+        std::vector<size_t> file_run;                            // run (within batch) of each entry
+        std::vector<std::unordered_map<int, size_t>> run_leads;  // lead -> batch position
+        std::vector<long long> valid_times;
+    };
+    const size_t batch_target = 4 * static_cast<size_t>(omp_get_max_threads());
+    std::vector<VerifyBatch> batches;
+    for (size_t run_begin = 0; run_begin < runs.size(); ) {
+        VerifyBatch vb;
+        std::set<long long> times;
+        size_t run_end = run_begin;
+        // Runs of the same base time (one per experiment) always share a batch
+        auto same_base = [&](size_t r) { return vfld_files[runs[r][0]].base_time == vfld_files[runs[r - 1][0]].base_time; };
+        while (run_end < runs.size() && (run_end == run_begin || vb.files.size() < batch_target || same_base(run_end))) {
+            std::unordered_map<int, size_t> leads;
+            for (size_t i : runs[run_end]) {
+                leads[vfld_files[i].lead_time] = vb.files.size();
+                vb.files.push_back(i);
+                vb.file_run.push_back(vb.run_leads.size());
+                if (verify_file[i]) times.insert(vfld_files[i].valid_time);
+            }
+            vb.run_leads.push_back(std::move(leads));
+            ++run_end;
+        }
+        vb.valid_times.assign(times.begin(), times.end());
+        std::vector<uint64_t> cost;
+        for (size_t i : vb.files) cost.push_back(verify_file[i] ? file_cost[i] : 0);
+        vb.by_cost = order_by_cost(cost);
+        batches.push_back(std::move(vb));
+        run_begin = run_end;
+    }
+
+    std::unordered_map<long long, VobsData> vobs_data_map;
+    // Number of batches still needing each valid time: at zero the valid time is complete, its
+    // rows are reduced (and checkpointed) and, when streaming, its vobs data is dropped
+    std::unordered_map<long long, size_t> pending_batches;
+    std::unordered_set<long long> requested_times;
+    std::future<std::unordered_map<long long, VobsData>> prefetch;
+    size_t peak_vobs_times = 0;
+    auto request_times = [&](size_t first_batch, size_t last_batch) {
+        std::vector<long long> times;
+        for (size_t k = first_batch; k < last_batch && k < batches.size(); ++k) {
+            for (long long t : batches[k].valid_times) {
+                if (requested_times.insert(t).second) times.push_back(t);
+            }
+        }
+        return times;
+    };
+
+    for (const auto& vb : batches) for (long long t : vb.valid_times) ++pending_batches[t];
+    auto vobs_read_start_time = std::chrono::high_resolution_clock::now();
+    if (stream) {
+        log << "Streaming vobs files by forecast run (" << batches.size() << " batches, prefetching "
+                  << prefetch_batches << " ahead)..." << std::endl;
+    } else {
+        log << "Reading all vobs files into memory (in parallel)..." << std::endl;
+        vobs_data_map = load_vobs(request_times(0, batches.size()), true);
+        auto vobs_read_end_time = std::chrono::high_resolution_clock::now();
+        log << "--- Time to read all vobs files: " << std::chrono::duration<double>(vobs_read_end_time - vobs_read_start_time).count() << " seconds ---" << std::endl;
+    }
+
+    auto verification_start_time = std::chrono::high_resolution_clock::now();
+    log << "Starting verification loop (in parallel) over " << runs.size() << " forecast runs..." << std::endl;
+
+    // Every vfld file is one (experiment, lead_time, vt_hour) cell: its statistics accumulate into a
+    // dense per-file array indexed by variable id (temp: by level slot and variable id), so threads
+    // never share an accumulator. Files are reduced into output rows once their valid time is complete.
+    std::vector<AggregatedStats> file_surface_stats(vfld_files.size() * n_surface_vars);
+    // Precipitation contingency counts per file, indexed by [precip slot][threshold]
+    std::vector<ContingencyCounts> file_contingency(vfld_files.size() * precip_specs.size() * n_thresholds);
+    std::vector<std::vector<double>> file_levels(vfld_files.size());
+    std::vector<std::vector<AggregatedStats>> file_temp_stats(vfld_files.size());
+    // Station statistics: each batch entry fills its own station slots, which are merged into
+    // (experiment, station, [lead_time]) accumulators after the batch
+    struct StationSlots { std::vector<int> ids; std::vector<AggregatedStats> stats; };
+    struct StationAccumulator { double lat, lon, hgt; std::vector<AggregatedStats> stats; };
+    // Accumulators are sharded by station id so that shards merge in parallel
+    std::vector<std::map<std::tuple<int, int, int>, StationAccumulator>> station_shards(station_stats ? 64 : 0);
+
+    // Reduces the per-file arrays of one complete valid time into rows ordered by experiment,
+    // lead_time (temp: pressure_level) and variable name, and checkpoints them
+    std::map<long long, std::vector<size_t>> verified_by_time;
+    auto cell_of = [&](size_t i) { return std::make_tuple(file_experiment[i], vfld_files[i].lead_time, vfld_files[i].valid_time); };
+    for (size_t i = 0; i < vfld_files.size(); ++i) if (verify_file[i]) verified_by_time[vfld_files[i].valid_time].push_back(i);
+    for (auto& kv : verified_by_time) {
+        std::stable_sort(kv.second.begin(), kv.second.end(), [&](size_t x, size_t y) { return cell_of(x) < cell_of(y); });
+    }
+    auto name_order = [](const std::vector<std::string>& names) {
+        std::vector<int> order(names.size());
+        for (size_t i = 0; i < order.size(); ++i) order[i] = static_cast<int>(i);
+        std::sort(order.begin(), order.end(), [&](int x, int y) { return names[x] < names[y]; });
+        return order;
+    };
+    const std::vector<int> surface_var_order = name_order(surface_var_names);
+    const std::vector<int> temp_var_order = name_order(temp_var_names);
+
+    results = MetricResults();
+    results.with_station_stats = station_stats;
+    results.stations_by_lead = station_stats_by_lead;
+    auto& surface_results = results.surface;
+    auto& temp_results = results.temp;
+    auto& contingency_results = results.contingency;
+    auto reduce_time = [&](long long valid_time) {
+        const size_t surface_begin = surface_results.size(), temp_begin = temp_results.size();
+        const size_t contingency_begin = contingency_results.size();
+        const auto& verified_files = verified_by_time[valid_time];
+        for (size_t k = 0; k < verified_files.size(); ) {
+            size_t cell_end = k + 1;
+            while (cell_end < verified_files.size() && cell_of(verified_files[cell_end]) == cell_of(verified_files[k])) ++cell_end;
+            const auto& info = vfld_files[verified_files[k]];
+            const int exp_id = file_experiment[verified_files[k]];
+            for (int v : surface_var_order) {
+                AggregatedStats stats;
+                for (size_t j = k; j < cell_end; ++j) stats.merge(file_surface_stats[verified_files[j] * n_surface_vars + v]);
+                if (stats.count > 0) surface_results.push_back({exp_id, info.lead_time, info.valid_time, v, stats});
+                if (precip_slot[v] < 0 || stats.count == 0) continue;
+                for (size_t t = 0; t < n_thresholds; ++t) {
+                    ContingencyCounts counts;
+                    for (size_t j = k; j < cell_end; ++j) {
+                        counts.merge(file_contingency[(verified_files[j] * precip_specs.size() + precip_slot[v]) * n_thresholds + t]);
+                    }
+                    contingency_results.push_back({exp_id, info.lead_time, info.valid_time, v, precip_thresholds[t], counts});
+                }
+            }
+            std::vector<double> cell_levels;
+            for (size_t j = k; j < cell_end; ++j) {
+                const auto& lv = file_levels[verified_files[j]];
+                cell_levels.insert(cell_levels.end(), lv.begin(), lv.end());
+            }
+            std::sort(cell_levels.begin(), cell_levels.end());
+            cell_levels.erase(std::unique(cell_levels.begin(), cell_levels.end()), cell_levels.end());
+            for (double pressure : cell_levels) {
+                for (int v : temp_var_order) {
+                    AggregatedStats stats;
+                    for (size_t j = k; j < cell_end; ++j) {
+                        const auto& lv = file_levels[verified_files[j]];
+                        auto it = std::find(lv.begin(), lv.end(), pressure);
+                        if (it != lv.end()) stats.merge(file_temp_stats[verified_files[j]][(it - lv.begin()) * n_temp_vars + v]);
+                    }
+                    if (stats.count > 0) temp_results.push_back({exp_id, info.lead_time, info.valid_time, pressure, v, stats});
+                }
+            }
+            k = cell_end;
+        }
+        // The temp slots of these files are no longer needed
+        for (size_t i : verified_files) {
+            std::vector<double>().swap(file_levels[i]);
+            std::vector<AggregatedStats>().swap(file_temp_stats[i]);
+        }
+        auto it_inputs = state_inputs.find(valid_time);
+        if (it_inputs == state_inputs.end()) return;
+        ValidTimeState state;
+        state.surface.assign(surface_results.begin() + surface_begin, surface_results.end());
+        state.temp.assign(temp_results.begin() + temp_begin, temp_results.end());
+        state.contingency.assign(contingency_results.begin() + contingency_begin, contingency_results.end());
+        if (!state_store.save(valid_time, it_inputs->second, state)) {
+            std::cerr << "Warning: Could not write the state of valid time " << valid_time << " to " << state_dir << std::endl;
+        }
+    };
+
+    for (size_t k = 0; k < batches.size(); ++k) {
+        if (stream) {
+            // Take over what the prefetch thread loaded, read what is still missing for this batch,
+            // then start reading ahead for the next batches
+            if (prefetch.valid()) {
+                for (auto& kv : prefetch.get()) vobs_data_map.emplace(kv.first, std::move(kv.second));
+            }
+            auto missing = request_times(k, k + 1);
+            if (!missing.empty()) {
+                for (auto& kv : load_vobs(missing, true)) vobs_data_map.emplace(kv.first, std::move(kv.second));
+            }
+            auto ahead = request_times(k + 1, k + 1 + prefetch_batches);
+            peak_vobs_times = std::max(peak_vobs_times, vobs_data_map.size() + ahead.size());
+            if (!ahead.empty()) {
+                prefetch = std::async(std::launch::async, load_vobs, std::move(ahead), false);
+            }
+        }
+        const auto& batch = batches[k].files;
+        const auto& batch_run = batches[k].file_run;
+        const auto& run_leads = batches[k].run_leads;
+        const auto& by_cost = batches[k].by_cost;
+
+        // Parse each vfld file of the batch once and collect its cumulative PE per station
+        std::vector<VfldData> parsed(batch.size());
+        #pragma omp parallel for schedule(dynamic)
+        for (size_t n = 0; n < batch.size(); ++n) {
+            const size_t b = by_cost[n];
+            int version;
+            auto& data = parsed[b];
+            parse_cache.read(vfld_files[batch[b]].path, true, version, data.stations, data.temp_levels);
+            remove_stations(station_blacklist, data.stations, data.temp_levels);
+            if (!precip_windows.empty()) {
+                data.pe_totals.reserve(data.stations.size());
+                for (const auto& s : data.stations) {
+                    if (s.pe > -98.0) data.pe_totals[s.id] = s.pe; // cumulative since start
+                }
+            }
+        }
+
+        // Calls on_surface(station_id, var_id, fcst, obs, error) and
+        // on_temp(station_id, pressure, var_id, fcst, obs, error)
+        // for every valid forecast/observation pair of batch entry b
+        auto visit_samples = [&](size_t b, const VobsData& vobs, auto&& on_surface, auto&& on_temp) {
+            const auto& vfld_info = vfld_files[batch[b]];
+            const auto& lead_map = run_leads[batch_run[b]];
+            for (const auto& station_vfld : parsed[b].stations) {
+                auto it_station_vobs = vobs.stations.find(station_vfld.id);
+                if (it_station_vobs == vobs.stations.end()) continue;
+                const auto& station_vobs = it_station_vobs->second;
+                for (const auto& spec : surface_specs) {
+                    double f, o;
+                    if (spec.kind == SurfaceKind::DewPointDepression) {
+                        f = (station_vfld.tt>-98.0 && station_vfld.td>-98.0)? (station_vfld.tt - station_vfld.td) : -999.0;
+                        o = (station_vobs.tt>-98.0 && station_vobs.td>-98.0)? (station_vobs.tt - station_vobs.td) : -999.0;
+                    } else {
+                        f = station_vfld.*spec.field;
+                        o = station_vobs.*spec.field;
+                    }
+                    if (f > -98.0 && o > -98.0) {
+                        double error = (spec.kind == SurfaceKind::Direction) ? directional_diff(f, o) : (f - o);
+                        if (is_missing(error)) continue;
+                        on_surface(station_vfld.id, spec.id, f, o, error);
+                    }
+                }
+
+                // Precipitation windows (derive increments from cumulative PE of the same run)
+                for (const auto& pspec : precip_specs) {
+                    const int win = pspec.window;
+                    if (vfld_info.lead_time < win) continue; // cannot form window
+                    auto it_curr = lead_map.find(vfld_info.lead_time);
+                    auto it_prev = lead_map.find(vfld_info.lead_time - win);
+                    if (it_curr == lead_map.end() || it_prev == lead_map.end()) continue;
+                    const auto& curr_pe = parsed[it_curr->second].pe_totals;
+                    const auto& prev_pe = parsed[it_prev->second].pe_totals;
+                    auto it_curr_st = curr_pe.find(station_vfld.id);
+                    auto it_prev_st = prev_pe.find(station_vfld.id);
+                    if (it_curr_st == curr_pe.end() || it_prev_st == prev_pe.end()) continue;
+                    double inc = it_curr_st->second - it_prev_st->second;
+                    if (inc < -98.0) continue;
+                    double obs_val = station_vobs.*pspec.obs_field;
+                    if (inc > -98.0 && obs_val > -98.0) {
+                        double error = inc - obs_val;
+                        if (!is_missing(error)) on_surface(station_vfld.id, pspec.id, inc, obs_val, error);
+                    }
+                }
+            }
+
+            if (vobs.temp_levels.empty() || n_temp_vars == 0) return;
+            for (const auto& tl_vfld : parsed[b].temp_levels) {
+                const TempLevel* match = find_temp_level(vobs, tl_vfld.station_id, tl_vfld.pressure);
+                if (!match) continue;
+                for (const auto& spec : temp_specs) {
+                    double fval = tl_vfld.*spec.field;
+                    double oval = match->*spec.field;
+                    if (fval > -98.0 && oval > -98.0) {
+                        double error = spec.direction ? directional_diff(fval, oval) : (fval - oval);
+                        if (is_missing(error)) continue;
+                        on_temp(tl_vfld.station_id, tl_vfld.pressure, spec.id, fval, oval, error);
+                    }
+                }
+            }
+        };
+
+        // Common-sample mode: per (base_time, lead_time) the files of all experiments are in this
+        // batch. Each file records which variables are available per station (and per pressure level)
+        // as bitsets, and only samples available in every experiment are accumulated.
+        std::vector<int> common_group(batch.size(), -1);
+        std::vector<CommonSamples> common;
+        if (common_samples) {
+            std::map<std::pair<long long, int>, std::vector<size_t>> group_members;
+            for (size_t b = 0; b < batch.size(); ++b) {
+                const auto& fi = vfld_files[batch[b]];
+                if (verify_file[batch[b]]) group_members[{fi.base_time, fi.lead_time}].push_back(b);
+            }
+            std::vector<std::vector<size_t>> groups;
+            for (auto& g : group_members) {
+                for (size_t b : g.second) common_group[b] = static_cast<int>(groups.size());
+                groups.push_back(std::move(g.second));
+            }
+            std::vector<CommonSamples> available(batch.size());
+            #pragma omp parallel for schedule(dynamic)
+            for (size_t n = 0; n < batch.size(); ++n) {
+                const size_t b = by_cost[n];
+                if (!verify_file[batch[b]]) continue;
+                auto it_vobs = vobs_data_map.find(vfld_files[batch[b]].valid_time);
+                if (it_vobs == vobs_data_map.end()) continue;
+                auto& avail = available[b];
+                visit_samples(b, it_vobs->second,
+                    [&](int sid, int var, double, double, double) { avail.surface[sid] |= uint64_t(1) << var; },
+                    [&](int sid, double p, int var, double, double, double) {
+                        avail.temp[temp_level_key(sid, p)] |= uint64_t(1) << var;
+                    });
+            }
+            common.resize(groups.size());
+            #pragma omp parallel for schedule(dynamic)
+            for (size_t g = 0; g < groups.size(); ++g) {
+                const auto& members = groups[g];
+                std::set<int> exps;
+                for (size_t b : members) exps.insert(file_experiment[batch[b]]);
+                if (exps.size() < experiment_names.size()) continue;
+                CommonSamples& shared = common[g];
+                shared = std::move(available[members[0]]);
+                for (size_t m = 1; m < members.size(); ++m) intersect_samples(shared, available[members[m]]);
+            }
+        }
+
+        std::vector<StationSlots> batch_station_slots(station_stats ? batch.size() : 0);
+        #pragma omp parallel for schedule(dynamic)
+        for (size_t n = 0; n < batch.size(); ++n) {
+            const size_t b = by_cost[n];
+            const size_t file_index = batch[b];
+            const auto& vfld_info = vfld_files[file_index];
+            // Enforce common valid_time across all experiments and vobs
+            if (!verify_file[file_index]) { continue; }
+            auto it_vobs = vobs_data_map.find(vfld_info.valid_time);
+            if (it_vobs == vobs_data_map.end()) { continue; }
+            AggregatedStats* surface_stats = &file_surface_stats[file_index * n_surface_vars];
+            ContingencyCounts* contingency = &file_contingency[file_index * precip_specs.size() * n_thresholds];
+            StationSlots* station_slots = station_stats ? &batch_station_slots[b] : nullptr;
+            auto add_surface = [&](int sid, int var, double f, double o, double error) {
+                surface_stats[var].add(f, o, error);
+                if (station_slots) {
+                    // Samples arrive station by station, so a new id opens the next slot
+                    auto& ids = station_slots->ids;
+                    if (ids.empty() || ids.back() != sid) {
+                        ids.push_back(sid);
+                        station_slots->stats.resize(ids.size() * n_surface_vars);
+                    }
+                    station_slots->stats[(ids.size() - 1) * n_surface_vars + var].add(f, o, error);
+                }
+                if (precip_slot[var] < 0) return;
+                ContingencyCounts* counts = &contingency[precip_slot[var] * n_thresholds];
+                for (size_t t = 0; t < n_thresholds; ++t) counts[t].add(f, o, precip_thresholds[t]);
+            };
+
+            // Level slots of this file; stations repeat the same level sequence, so try the next slot first
+            auto& levels = file_levels[file_index];
+            auto& temp_stats = file_temp_stats[file_index];
+            size_t last_slot = 0;
+            auto level_stats = [&](double pressure) {
+                size_t slot = levels.size();
+                if (last_slot + 1 < levels.size() && levels[last_slot + 1] == pressure) slot = last_slot + 1;
+                else if (last_slot < levels.size() && levels[last_slot] == pressure) slot = last_slot;
+                else slot = std::find(levels.begin(), levels.end(), pressure) - levels.begin();
+                if (slot == levels.size()) {
+                    levels.push_back(pressure);
+                    temp_stats.resize(levels.size() * n_temp_vars);
+                }
+                last_slot = slot;
+                return &temp_stats[slot * n_temp_vars];
+            };
+
+            if (!common_samples) {
+                visit_samples(b, it_vobs->second,
+                    [&](int sid, int var, double f, double o, double error) { add_surface(sid, var, f, o, error); },
+                    [&](int, double p, int var, double f, double o, double error) { level_stats(p)[var].add(f, o, error); });
+            } else {
+                const CommonSamples& shared = common[common_group[b]];
+                visit_samples(b, it_vobs->second,
+                    [&](int sid, int var, double f, double o, double error) {
+                        if (shared.has_surface(sid, var)) add_surface(sid, var, f, o, error);
+                    },
+                    [&](int sid, double p, int var, double f, double o, double error) {
+                        if (shared.has_temp(temp_level_key(sid, p), var)) level_stats(p)[var].add(f, o, error);
+                    });
+            }
+        }
+        // Every shard walks the batch in order, so each station's sums are formed in the same order
+        // as in a serial merge
+        #pragma omp parallel for schedule(dynamic)
+        for (size_t shard = 0; shard < station_shards.size(); ++shard) {
+            for (size_t b = 0; b < batch_station_slots.size(); ++b) {
+                const auto& slots = batch_station_slots[b];
+                if (slots.ids.empty()) continue;
+                const auto& info = vfld_files[batch[b]];
+                const auto& vobs_stations = vobs_data_map.at(info.valid_time).stations;
+                for (size_t s = 0; s < slots.ids.size(); ++s) {
+                    if (static_cast<unsigned>(slots.ids[s]) % station_shards.size() != shard) continue;
+                    auto& acc = station_shards[shard][{file_experiment[batch[b]], slots.ids[s],
+                                                       station_stats_by_lead ? info.lead_time : -1}];
+                    if (acc.stats.empty()) {
+                        const auto& st = vobs_stations.at(slots.ids[s]);
+                        acc.lat = st.lat; acc.lon = st.lon; acc.hgt = st.hgt;
+                        acc.stats.resize(n_surface_vars);
+                    }
+                    for (size_t v = 0; v < n_surface_vars; ++v) acc.stats[v].merge(slots.stats[s * n_surface_vars + v]);
+                }
+            }
+        }
+        for (long long t : batches[k].valid_times) {
+            if (--pending_batches[t] > 0) continue;
+            reduce_time(t);
+            if (stream) vobs_data_map.erase(t);
+        }
+    }
+    if (stream) {
+        log << "Streamed vobs: at most " << peak_vobs_times << " of " << requested_times.size()
+                  << " valid times held in memory (including prefetch)" << std::endl;
+    }
+
+    // Restored valid times join the computed ones in output order
+    surface_results.insert(surface_results.end(), restored.surface.begin(), restored.surface.end());
+    temp_results.insert(temp_results.end(), restored.temp.begin(), restored.temp.end());
+    contingency_results.insert(contingency_results.end(), restored.contingency.begin(), restored.contingency.end());
+    auto by_cell = [](const auto& x, const auto& y) {
+        return std::tie(x.experiment, x.lead_time, x.vt_hour) < std::tie(y.experiment, y.lead_time, y.vt_hour);
+    };
+    std::stable_sort(surface_results.begin(), surface_results.end(), by_cell);
+    std::stable_sort(temp_results.begin(), temp_results.end(), by_cell);
+    std::stable_sort(contingency_results.begin(), contingency_results.end(), by_cell);
+    std::map<std::tuple<int, int, int>, StationAccumulator> station_accumulators;
+    for (auto& shard : station_shards) station_accumulators.merge(shard);
+    for (const auto& kv : station_accumulators) {
+        const auto& [exp_id, station_id, lead_time] = kv.first;
+        const auto& acc = kv.second;
+        for (int v : surface_var_order) {
+            if (acc.stats[v].count == 0) continue;
+            results.stations.push_back({exp_id, station_id, acc.lat, acc.lon, acc.hgt, lead_time, v, acc.stats[v]});
+        }
+    }
+    auto verification_end_time = std::chrono::high_resolution_clock::now();
+    log << "--- Time for verification processing: " << std::chrono::duration<double>(verification_end_time - verification_start_time).count() << " seconds ---" << std::endl;
+    if (parse_cache.enabled()) {
+        log << "Parse cache: " << parse_cache.hits() << " hits, " << parse_cache.misses() << " files parsed and cached" << std::endl;
+    }
+    names = MetricNames{experiment_names, surface_var_names, temp_var_names};
+}
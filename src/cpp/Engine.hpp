@@ -0,0 +1,39 @@
+// Engine.hpp
+#pragma once
+
+#include "MetricsWriter.hpp"
+#include <cstddef>
+#include <ostream>
+#include <string>
+#include <vector>
+
+// Parameters of one verification run: the command line of verify_cpp_parallel, with the variable
+// lists and thresholds it reads from SURFPAR_MONITOR, TEMPPAR_MONITOR and PRECIP_THRESHOLDS_MONITOR
+struct EngineOptions {
+    long long start = 0, end = 0;  // YYYYMMDDHH
+    int fcint = 0;
+    std::string vobs_dir;
+    std::vector<std::string> experiment_dirs;
+    // Empty lists select the defaults; without a surface list all PE windows are verified
+    std::vector<std::string> surface_variables, temp_variables;
+    std::vector<double> precip_thresholds;
+    std::string cache_dir;
+    std::string station_blacklist;  // file of station ids to skip
+    std::string state_dir;
+    bool stream = false;
+    size_t prefetch_batches = 1;
+    bool common_samples = false;
+    bool station_stats = false, station_stats_by_lead = false;
+    // Shard shard_index (1-based) of shard_count: only the valid times assigned to it are verified,
+    // by a hash of the valid time or, with shard_by_time, as one of shard_count contiguous ranges
+    int shard_index = 1, shard_count = 1;
+    bool shard_by_time = false;
+};
+
+// Parses a --shard value "i/N" (1 <= i <= N); false when it is malformed
+bool parse_shard(const std::string& text, int& index, int& count);
+
+// Discovers, reads and verifies the files selected by options, and fills the result rows and the
+// name tables their ids refer to. Progress goes to log. Throws std::runtime_error when the run
+// cannot be done (no data, unreadable blacklist, invalid options).
+void run_verification(const EngineOptions& options, std::ostream& log, MetricNames& names, MetricResults& results);
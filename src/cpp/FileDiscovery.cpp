@@ -0,0 +1,90 @@
+// FileDiscovery.cpp
+#include "FileDiscovery.hpp"
+#include "DateTimeUtils.hpp"
+#include "FileUtils.hpp"
+#include <algorithm>
+#include <iostream>
+#include <string>
+
+namespace fs = std::filesystem;
+
+namespace {
+
+// One directory to scan: an experiment directory, or a directory of the vobs tree
+struct ScanTask {
+    fs::path dir;
+    std::string experiment;  // empty for vobs directories
+};
+
+std::string experiment_name_of(const fs::path& exp_path) {
+    std::string name = exp_path.filename().string();
+    if (name.empty() || name == ".") name = exp_path.parent_path().filename().string();
+    return name;
+}
+
+} // namespace
+
+bool discover_files(const std::vector<fs::path>& experiment_paths, const fs::path& vobs_path,
+                    const DiscoveryFilter& filter, ParseCache& cache,
+                    std::vector<FileInfo>& vfld_files, std::vector<FileInfo>& vobs_files) {
+    std::vector<ScanTask> tasks;
+    for (const auto& exp_path : experiment_paths) tasks.push_back({exp_path, experiment_name_of(exp_path)});
+    tasks.push_back({vobs_path, ""});
+
+    bool ok = true;
+    // Breadth-first over the vobs tree: each round scans its directories in parallel and
+    // yields the subdirectories for the next round
+    while (!tasks.empty()) {
+        std::vector<std::vector<FileInfo>> found(tasks.size());
+        std::vector<std::vector<std::string>> found_subdirs(tasks.size());
+        #pragma omp parallel for schedule(dynamic)
+        for (size_t t = 0; t < tasks.size(); ++t) {
+            const ScanTask& task = tasks[t];
+            const bool is_vobs = task.experiment.empty();
+            std::vector<std::string> names;
+            try {
+                cache.list_directory(task.dir.string(), names, found_subdirs[t]);
+            } catch (const fs::filesystem_error& e) {
+                #pragma omp critical
+                {
+                    std::cerr << "Error: Could not list " << task.dir << ": " << e.what() << std::endl;
+                    ok = false;
+                }
+                continue;
+            }
+            if (!is_vobs) found_subdirs[t].clear();
+            for (const auto& name : names) {
+                FileInfo info;
+                if (is_vobs) {
+                    if (!parse_vobs_name(name, info.valid_time)) continue;
+                    if (info.valid_time < filter.start || info.valid_time > filter.end) continue;
+                    info.type = "vobs";
+                    info.base_time = info.valid_time;
+                    info.experiment = "observation";
+                } else {
+                    if (!parse_vfld_name(name, info.base_time, info.lead_time)) continue;
+                    if (info.base_time < filter.start || info.base_time > filter.end
+                            || (info.base_time % 100) % filter.fcint != 0) continue;
+                    info.type = "vfld";
+                    info.valid_time = add_hours_to_yyyymmddhh(info.base_time, info.lead_time);
+                    info.experiment = task.experiment;
+                }
+                info.path = (task.dir / name).string();
+                found[t].push_back(std::move(info));
+            }
+        }
+        std::vector<ScanTask> next;
+        for (size_t t = 0; t < tasks.size(); ++t) {
+            auto& out = tasks[t].experiment.empty() ? vobs_files : vfld_files;
+            out.insert(out.end(), std::make_move_iterator(found[t].begin()), std::make_move_iterator(found[t].end()));
+            for (const auto& sub : found_subdirs[t]) next.push_back({tasks[t].dir / sub, ""});
+        }
+        tasks = std::move(next);
+    }
+    if (!ok) return false;
+
+    auto by_path = [](const FileInfo& a, const FileInfo& b) { return a.path < b.path; };
+    std::sort(vfld_files.begin(), vfld_files.end(), by_path);
+    std::sort(vobs_files.begin(), vobs_files.end(), by_path);
+    return true;
+}
@@ -0,0 +1,22 @@
+// FileDiscovery.hpp
+#pragma once
+
+#include "DataTypes.hpp"
+#include "ParseCache.hpp"
+#include <filesystem>
+#include <vector>
+
+// Window applied while scanning: vfld base times (on the fcint cycle) and vobs valid times
+// within [start, end]
+struct DiscoveryFilter {
+    long long start, end;
+    int fcint;
+};
+
+// Lists the vfld files of every experiment directory (not recursive) and the vobs files of the
+// vobs tree (recursive) in parallel, one task per directory, through cache.list_directory.
+// Files outside the filter are dropped before a FileInfo is built. Both lists are sorted by
+// path. Returns false after printing the reason when a directory cannot be read.
+bool discover_files(const std::vector<std::filesystem::path>& experiment_paths,
+                    const std::filesystem::path& vobs_path, const DiscoveryFilter& filter, ParseCache& cache,
+                    std::vector<FileInfo>& vfld_files, std::vector<FileInfo>& vobs_files);
@@ -4,143 +4,331 @@
 #include <filesystem>
 #include <fstream>
 #include <sstream>
-#include <regex>
 #include <iostream>
 #include <unordered_map>
+#include <charconv>
+#include <cstring>
+#include <iterator>
+#include <stdexcept>
+#include <string_view>
+#include <thread>
+#include <fcntl.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include <unistd.h>
 
 namespace fs = std::filesystem;
 
+namespace {
+
+// The n digits at the end of name, which must start with the century "20" (as in YYYYMMDDHH...)
+bool trailing_timestamp(std::string_view name, size_t prefix_len, size_t n, long long& value) {
+    if (name.size() < prefix_len + n) return false;
+    const std::string_view digits = name.substr(name.size() - n);
+    if (digits[0] != '2' || digits[1] != '0') return false;
+    value = 0;
+    for (char c : digits) {
+        if (c < '0' || c > '9') return false;
+        value = value * 10 + (c - '0');
+    }
+    return true;
+}
+
+int64_t mtime_ns_of(const struct stat& st) {
+    return static_cast<int64_t>(st.st_mtim.tv_sec) * 1000000000LL + st.st_mtim.tv_nsec;
+}
+
+} // namespace
+
+bool stat_file(const std::string& path, int64_t& mtime_ns, uint64_t& size) {
+    struct stat st;
+    if (::stat(path.c_str(), &st) != 0 || !S_ISREG(st.st_mode)) return false;
+    mtime_ns = mtime_ns_of(st);
+    size = static_cast<uint64_t>(st.st_size);
+    return true;
+}
+
+bool stat_directory(const std::string& path, int64_t& mtime_ns) {
+    struct stat st;
+    if (::stat(path.c_str(), &st) != 0 || !S_ISDIR(st.st_mode)) return false;
+    mtime_ns = mtime_ns_of(st);
+    return true;
+}
+
+bool write_file_atomic(const std::string& path, const std::string& data) {
+    const std::string tmp_path = path + "." + std::to_string(::getpid()) + "."
+        + std::to_string(std::hash<std::thread::id>{}(std::this_thread::get_id())) + ".tmp";
+    std::ofstream out(tmp_path, std::ios::binary | std::ios::trunc);
+    out.write(data.data(), static_cast<std::streamsize>(data.size()));
+    out.close();
+    std::error_code ec;
+    if (out) fs::rename(tmp_path, path, ec);
+    if (!out || ec) {
+        fs::remove(tmp_path, ec);
+        return false;
+    }
+    return true;
+}
+
+bool parse_vfld_name(std::string_view name, long long& base_time, int& lead_time) {
+    long long stamp;
+    if (name.substr(0, 4) != "vfld" || !trailing_timestamp(name, 4, 12, stamp)) return false;
+    base_time = stamp / 100;
+    lead_time = static_cast<int>(stamp % 100);
+    return true;
+}
+
+bool parse_vobs_name(std::string_view name, long long& valid_time) {
+    return name.substr(0, 4) == "vobs" && trailing_timestamp(name, 4, 10, valid_time);
+}
+
 FileInfo parse_filename(const std::string& path) {
     std::string basename = fs::path(path).filename().string();
     FileInfo info;
     info.path = path;
-    
-    if (basename.rfind("vfld", 0) == 0) {
-        std::smatch m;
-        std::regex re("(20\\d{6})(\\d{2})(\\d{2})$");
-        if (std::regex_search(basename, m, re)) {
-            info.type = "vfld";
-            info.base_time = std::stoll(m[1].str() + m[2].str());
-            info.lead_time = std::stoi(m[3].str());
-            info.valid_time = add_hours_to_yyyymmddhh(info.base_time, info.lead_time);
-        }
-    } else if (basename.rfind("vobs", 0) == 0) {
-        std::smatch m;
-        std::regex re("(20\\d{6})(\\d{2})$");
-        if (std::regex_search(basename, m, re)) {
-            info.type = "vobs";
-            info.base_time = std::stoll(m[1].str() + m[2].str());
-            info.valid_time = info.base_time;
-            info.experiment = "observation";
-        }
+
+    long long base_time;
+    int lead_time;
+    if (parse_vfld_name(basename, base_time, lead_time)) {
+        info.type = "vfld";
+        info.base_time = base_time;
+        info.lead_time = lead_time;
+        info.valid_time = add_hours_to_yyyymmddhh(info.base_time, info.lead_time);
+    } else if (parse_vobs_name(basename, base_time)) {
+        info.type = "vobs";
+        info.base_time = base_time;
+        info.valid_time = info.base_time;
+        info.experiment = "observation";
     }
     return info;
 }
 
+MappedFile::MappedFile(const std::string& path) {
+    int fd = ::open(path.c_str(), O_RDONLY);
+    if (fd < 0) return;
+    struct stat st;
+    if (::fstat(fd, &st) == 0 && S_ISREG(st.st_mode)) {
+        size_ = static_cast<size_t>(st.st_size);
+        ok_ = true;
+        if (size_ > 0) {
+            void* p = ::mmap(nullptr, size_, PROT_READ, MAP_PRIVATE, fd, 0);
+            if (p != MAP_FAILED) {
+                ::madvise(p, size_, MADV_SEQUENTIAL);
+                map_ = p;
+                data_ = static_cast<const char*>(p);
+            }
+        }
+    }
+    ::close(fd);
+    if (ok_ && size_ > 0 && !map_) {
+        std::ifstream in(path, std::ios::binary);
+        buffer_.assign(std::istreambuf_iterator<char>(in), std::istreambuf_iterator<char>());
+        size_ = buffer_.size();
+        data_ = buffer_.data();
+    }
+}
+
+MappedFile::~MappedFile() {
+    if (map_) ::munmap(map_, size_);
+}
+
+namespace {
+
+// Splits a buffer into lines like std::getline (the last line may lack a newline)
+class LineReader {
+public:
+    LineReader(const char* begin, const char* end) : p_(begin), end_(end) {}
+    bool next(std::string_view& line) {
+        if (p_ >= end_) return false;
+        const char* nl = static_cast<const char*>(std::memchr(p_, '\n', end_ - p_));
+        const char* stop = nl ? nl : end_;
+        line = std::string_view(p_, stop - p_);
+        p_ = nl ? nl + 1 : end_;
+        return true;
+    }
+private:
+    const char* p_;
+    const char* end_;
+};
+
+inline bool is_space(char c) { return c == ' ' || c == '\t' || c == '\r' || c == '\v' || c == '\f'; }
+
+// Whitespace tokenizer over one line; numeric reads stop at the first bad token like operator>>
+class Tokens {
+public:
+    explicit Tokens(std::string_view line) : p_(line.data()), end_(line.data() + line.size()) {}
+    template <typename T>
+    bool next(T& out) {
+        if (failed_) return false;
+        skip_space();
+        if (p_ < end_ && *p_ == '+') ++p_;
+        auto res = std::from_chars(p_, end_, out);
+        if (res.ec != std::errc()) { failed_ = true; return false; }
+        p_ = res.ptr;
+        return true;
+    }
+    std::string_view word() {
+        skip_space();
+        const char* start = p_;
+        while (p_ < end_ && !is_space(*p_)) ++p_;
+        return std::string_view(start, p_ - start);
+    }
+private:
+    void skip_space() { while (p_ < end_ && is_space(*p_)) ++p_; }
+    const char* p_;
+    const char* end_;
+    bool failed_ = false;
+};
+
+// Integer on a line of its own (std::stoi semantics, throws on a non-numeric line)
+int parse_count(std::string_view line) {
+    Tokens tok(line);
+    int n;
+    if (!tok.next(n)) throw std::invalid_argument("expected an integer, got '" + std::string(line) + "'");
+    return n;
+}
+
+// Column name -> struct member, with an optional fallback column used when the first is absent
+template <typename Record>
+struct FieldSpec {
+    const char* name;
+    double Record::* member;
+    const char* fallback;
+};
+
+template <typename Record>
+struct FieldBinding {
+    double Record::* member;
+    int col, fallback_col;
+};
+
+const FieldSpec<SurfaceStation> kSurfaceFields[] = {
+    {"NN", &SurfaceStation::nn, nullptr}, {"DD", &SurfaceStation::dd, nullptr},
+    {"FF", &SurfaceStation::ff, nullptr}, {"TT", &SurfaceStation::tt, nullptr},
+    {"RH", &SurfaceStation::rh, nullptr}, {"PS", &SurfaceStation::ps, nullptr},
+    // Station pressure may be provided as SPS or PSS in files; accept both
+    {"SPS", &SurfaceStation::pss, "PSS"},
+    {"PE", &SurfaceStation::pe, nullptr}, {"PE1", &SurfaceStation::pe1, nullptr},
+    {"PE3", &SurfaceStation::pe3, nullptr}, {"PE6", &SurfaceStation::pe6, nullptr},
+    {"PE12", &SurfaceStation::pe12, nullptr}, {"PE24", &SurfaceStation::pe24, nullptr},
+    {"QQ", &SurfaceStation::qq, nullptr}, {"VI", &SurfaceStation::vi, nullptr},
+    {"TD", &SurfaceStation::td, nullptr}, {"TX", &SurfaceStation::tx, nullptr},
+    {"TN", &SurfaceStation::tn, nullptr}, {"GG", &SurfaceStation::gg, nullptr},
+    {"GX", &SurfaceStation::gx, nullptr}, {"FX", &SurfaceStation::fx, nullptr},
+    {"TTHA", &SurfaceStation::ttha, nullptr}, {"CH", &SurfaceStation::ch, nullptr},
+    {"LC", &SurfaceStation::lc, nullptr},
+};
+// vfld files carry the model height as FI (or hgt) instead of a fixed column
+const FieldSpec<SurfaceStation> kVfldHeightField = {"FI", &SurfaceStation::hgt, "hgt"};
+
+const FieldSpec<TempLevel> kTempFields[] = {
+    {"PP", &TempLevel::pressure, nullptr}, {"TT", &TempLevel::temp, nullptr},
+    {"FI", &TempLevel::fi, nullptr}, {"TD", &TempLevel::td, nullptr},
+    {"RH", &TempLevel::rh, nullptr}, {"QQ", &TempLevel::qq, nullptr},
+    {"DD", &TempLevel::dd, nullptr}, {"FF", &TempLevel::ff, nullptr},
+};
+
+// Last column with this name, as a name->index map built in column order would give
+int column_of(const std::vector<std::string>& columns, const char* name) {
+    if (!name) return -1;
+    for (size_t i = columns.size(); i-- > 0;) {
+        if (columns[i] == name) return static_cast<int>(i);
+    }
+    return -1;
+}
+
+template <typename Record>
+void bind_field(const FieldSpec<Record>& spec, const std::vector<std::string>& columns,
+                std::vector<FieldBinding<Record>>& out) {
+    int col = column_of(columns, spec.name), fallback_col = column_of(columns, spec.fallback);
+    if (col >= 0 || fallback_col >= 0) out.push_back({spec.member, col, fallback_col});
+}
+
+template <typename Record>
+void apply_fields(const std::vector<FieldBinding<Record>>& bindings, const std::vector<double>& values, Record& r) {
+    const int n = static_cast<int>(values.size());
+    for (const auto& b : bindings) {
+        if (b.col >= 0 && b.col < n) r.*(b.member) = values[b.col];
+        else if (b.fallback_col >= 0 && b.fallback_col < n) r.*(b.member) = values[b.fallback_col];
+    }
+}
+
+} // namespace
+
 void read_data_file(const std::string& filepath, bool is_vfld, int& version_flag,
                     std::vector<SurfaceStation>& stations, std::vector<TempLevel>& temp_levels) {
-    std::ifstream file(filepath);
-    if (!file.is_open()) { return; }
+    MappedFile file(filepath);
+    if (!file.ok()) { return; }
     stations.clear(); temp_levels.clear();
     try {
-        std::string line;
-        int num_stat, num_temp;
-        if(!std::getline(file, line)) return;
-        std::stringstream(line) >> num_stat >> num_temp >> version_flag;
+        LineReader lines(file.data(), file.data() + file.size());
+        std::string_view line;
+        int num_stat = 0, num_temp = 0;
+        if (!lines.next(line)) return;
+        {
+            Tokens tok(line);
+            tok.next(num_stat) && tok.next(num_temp) && tok.next(version_flag);
+        }
 
         std::vector<std::string> surface_variables;
         if (version_flag <= 3) {
-            if(!std::getline(file, line)) return;
+            if (!lines.next(line)) return;
             surface_variables = {"NN","DD","FF","TT","RH","PS","PE","QQ","VI","TD","TX","TN","GG","GX","FX"};
         } else if (version_flag == 4 || version_flag == 5) {
-            if(!std::getline(file, line)) return;
-            int ninvar = std::stoi(line);
-            for (int i=0; i<ninvar; ++i) { if(!std::getline(file, line)) break; std::stringstream ss(line); std::string vn; ss >> vn; surface_variables.push_back(vn); }
+            if (!lines.next(line)) return;
+            int ninvar = parse_count(line);
+            for (int i=0; i<ninvar; ++i) { if (!lines.next(line)) break; surface_variables.emplace_back(Tokens(line).word()); }
         }
-        std::unordered_map<std::string, int> surface_col_map;
-        for (size_t i=0; i<surface_variables.size(); ++i) surface_col_map[surface_variables[i]] = i;
-        
-        stations.reserve(num_stat);
+        // Resolve the column -> member table once per file
+        std::vector<FieldBinding<SurfaceStation>> surface_bindings;
+        if (is_vfld) bind_field(kVfldHeightField, surface_variables, surface_bindings);
+        for (const auto& spec : kSurfaceFields) bind_field(spec, surface_variables, surface_bindings);
+
+        std::vector<double> values;
+        values.reserve(surface_variables.size() + 4);
+        stations.reserve(num_stat > 0 ? num_stat : 0);
         for (int i=0; i<num_stat; ++i) {
-            if (!std::getline(file, line) || line.empty()) break;
-            std::stringstream line_stream(line);
-            SurfaceStation s={};
-            line_stream >> s.id >> s.lat >> s.lon;
-            if (!is_vfld) { line_stream >> s.hgt; }
-            
-            std::vector<double> data_values;
+            if (!lines.next(line) || line.empty()) break;
+            Tokens tok(line);
+            SurfaceStation& s = stations.emplace_back();
+            tok.next(s.id) && tok.next(s.lat) && tok.next(s.lon);
+            if (!is_vfld) { tok.next(s.hgt); }
+
+            values.clear();
             double val;
-            while(line_stream >> val) data_values.push_back(val);
-            
-            if (is_vfld) {
-                if (surface_col_map.count("FI") && static_cast<size_t>(surface_col_map.at("FI")) < data_values.size()) s.hgt=data_values[surface_col_map.at("FI")];
-                else if (surface_col_map.count("hgt") && static_cast<size_t>(surface_col_map.at("hgt")) < data_values.size()) s.hgt=data_values[surface_col_map.at("hgt")];
-            }
-            if (surface_col_map.count("NN") && static_cast<size_t>(surface_col_map.at("NN")) < data_values.size()) s.nn=data_values[surface_col_map.at("NN")];
-            if (surface_col_map.count("DD") && static_cast<size_t>(surface_col_map.at("DD")) < data_values.size()) s.dd=data_values[surface_col_map.at("DD")];
-            if (surface_col_map.count("FF") && static_cast<size_t>(surface_col_map.at("FF")) < data_values.size()) s.ff=data_values[surface_col_map.at("FF")];
-            if (surface_col_map.count("TT") && static_cast<size_t>(surface_col_map.at("TT")) < data_values.size()) s.tt=data_values[surface_col_map.at("TT")];
-            if (surface_col_map.count("RH") && static_cast<size_t>(surface_col_map.at("RH")) < data_values.size()) s.rh=data_values[surface_col_map.at("RH")];
-            if (surface_col_map.count("PS") && static_cast<size_t>(surface_col_map.at("PS")) < data_values.size()) s.ps=data_values[surface_col_map.at("PS")];
-            // Station pressure may be provided as SPS or PSS in files; accept both
-            if (surface_col_map.count("SPS") && (size_t)surface_col_map.at("SPS") < data_values.size()) s.pss = data_values[surface_col_map.at("SPS")];
-            else if (surface_col_map.count("PSS") && (size_t)surface_col_map.at("PSS") < data_values.size()) s.pss = data_values[surface_col_map.at("PSS")];
-            if (surface_col_map.count("PE")  && static_cast<size_t>(surface_col_map.at("PE"))  < data_values.size()) s.pe = data_values[surface_col_map.at("PE")];
-            if (surface_col_map.count("PE1") && static_cast<size_t>(surface_col_map.at("PE1")) < data_values.size()) s.pe1 = data_values[surface_col_map.at("PE1")];
-            if (surface_col_map.count("PE3") && static_cast<size_t>(surface_col_map.at("PE3")) < data_values.size()) s.pe3 = data_values[surface_col_map.at("PE3")];
-            if (surface_col_map.count("PE6") && static_cast<size_t>(surface_col_map.at("PE6")) < data_values.size()) s.pe6 = data_values[surface_col_map.at("PE6")];
-            if (surface_col_map.count("PE12")&& static_cast<size_t>(surface_col_map.at("PE12"))< data_values.size()) s.pe12= data_values[surface_col_map.at("PE12")];
-            if (surface_col_map.count("PE24")&& static_cast<size_t>(surface_col_map.at("PE24"))< data_values.size()) s.pe24= data_values[surface_col_map.at("PE24")];
-            if (surface_col_map.count("QQ") && static_cast<size_t>(surface_col_map.at("QQ")) < data_values.size()) s.qq=data_values[surface_col_map.at("QQ")];
-            if (surface_col_map.count("VI") && static_cast<size_t>(surface_col_map.at("VI")) < data_values.size()) s.vi=data_values[surface_col_map.at("VI")];
-            if (surface_col_map.count("TD") && static_cast<size_t>(surface_col_map.at("TD")) < data_values.size()) s.td=data_values[surface_col_map.at("TD")];
-            if (surface_col_map.count("TX") && static_cast<size_t>(surface_col_map.at("TX")) < data_values.size()) s.tx=data_values[surface_col_map.at("TX")];
-            if (surface_col_map.count("TN") && static_cast<size_t>(surface_col_map.at("TN")) < data_values.size()) s.tn=data_values[surface_col_map.at("TN")];
-            if (surface_col_map.count("GG") && static_cast<size_t>(surface_col_map.at("GG")) < data_values.size()) s.gg=data_values[surface_col_map.at("GG")];
-            if (surface_col_map.count("GX") && static_cast<size_t>(surface_col_map.at("GX")) < data_values.size()) s.gx=data_values[surface_col_map.at("GX")];
-            if (surface_col_map.count("FX") && static_cast<size_t>(surface_col_map.at("FX")) < data_values.size()) s.fx=data_values[surface_col_map.at("FX")];
-            if (surface_col_map.count("TTHA") && static_cast<size_t>(surface_col_map.at("TTHA")) < data_values.size()) s.ttha=data_values[surface_col_map.at("TTHA")];
-            if (surface_col_map.count("CH") && static_cast<size_t>(surface_col_map.at("CH")) < data_values.size()) s.ch=data_values[surface_col_map.at("CH")];
-            if (surface_col_map.count("LC") && static_cast<size_t>(surface_col_map.at("LC")) < data_values.size()) s.lc=data_values[surface_col_map.at("LC")];
-            stations.push_back(s);
+            while (tok.next(val)) values.push_back(val);
+            apply_fields(surface_bindings, values, s);
         }
 
         if (num_temp > 0) {
-            if(!std::getline(file, line) || line.empty()) return;
-            int num_temp_lev = std::stoi(line);
-            
-            if(!std::getline(file, line) || line.empty()) return;
-            int ninvar_temp = std::stoi(line);
-            
+            if (!lines.next(line) || line.empty()) return;
+            int num_temp_lev = parse_count(line);
+
+            if (!lines.next(line) || line.empty()) return;
+            int ninvar_temp = parse_count(line);
+
             std::vector<std::string> temp_variables;
-            for(int i=0; i<ninvar_temp; ++i) { if(!std::getline(file, line)) break; std::stringstream ss(line); std::string vn; ss >> vn; temp_variables.push_back(vn); }
-            
-            std::unordered_map<std::string, int> temp_col_map;
-            for(size_t i=0; i<temp_variables.size(); ++i) temp_col_map[temp_variables[i]] = i;
-            
-            temp_levels.reserve(num_temp * num_temp_lev);
-            for(int i=0; i<num_temp; ++i) {
-                if (!std::getline(file, line) || line.empty()) break;
-                std::stringstream header_ss(line); int station_id; header_ss >> station_id;
-                for(int j=0; j<num_temp_lev; ++j) {
-                    if (!std::getline(file, line)) break;
-                    std::stringstream level_ss(line);
-                    std::vector<double> values;
+            for (int i=0; i<ninvar_temp; ++i) { if (!lines.next(line)) break; temp_variables.emplace_back(Tokens(line).word()); }
+
+            std::vector<FieldBinding<TempLevel>> temp_bindings;
+            for (const auto& spec : kTempFields) bind_field(spec, temp_variables, temp_bindings);
+
+            if (num_temp_lev > 0) temp_levels.reserve(static_cast<size_t>(num_temp) * num_temp_lev);
+            for (int i=0; i<num_temp; ++i) {
+                if (!lines.next(line) || line.empty()) break;
+                int station_id = -1;
+                Tokens(line).next(station_id);
+                for (int j=0; j<num_temp_lev; ++j) {
+                    if (!lines.next(line)) break;
+                    Tokens tok(line);
+                    values.clear();
                     double val;
-                    while(level_ss >> val) values.push_back(val);
+                    while (tok.next(val)) values.push_back(val);
                     if (values.empty()) continue;
-                    
-                    TempLevel tl;
+
+                    TempLevel& tl = temp_levels.emplace_back();
                     tl.station_id = station_id;
-                    if (temp_col_map.count("PP") && static_cast<size_t>(temp_col_map.at("PP")) < values.size()) tl.pressure=values[temp_col_map.at("PP")];
-                    if (temp_col_map.count("TT") && static_cast<size_t>(temp_col_map.at("TT")) < values.size()) tl.temp=values[temp_col_map.at("TT")];
-                    if (temp_col_map.count("FI") && static_cast<size_t>(temp_col_map.at("FI")) < values.size()) tl.fi=values[temp_col_map.at("FI")];
-                    if (temp_col_map.count("TD") && static_cast<size_t>(temp_col_map.at("TD")) < values.size()) tl.td=values[temp_col_map.at("TD")];
-                    if (temp_col_map.count("RH") && static_cast<size_t>(temp_col_map.at("RH")) < values.size()) tl.rh=values[temp_col_map.at("RH")];
-                    if (temp_col_map.count("QQ") && static_cast<size_t>(temp_col_map.at("QQ")) < values.size()) tl.qq=values[temp_col_map.at("QQ")];
-                    if (temp_col_map.count("DD") && static_cast<size_t>(temp_col_map.at("DD")) < values.size()) tl.dd=values[temp_col_map.at("DD")];
-                    if (temp_col_map.count("FF") && static_cast<size_t>(temp_col_map.at("FF")) < values.size()) tl.ff=values[temp_col_map.at("FF")];
-                    temp_levels.push_back(tl);
+                    apply_fields(temp_bindings, values, tl);
                 }
             }
         }
@@ -149,3 +337,26 @@ void read_data_file(const std::string& filepath, bool is_vfld, int& version_flag
         std::cerr << "Warning: Exception caught while reading " << filepath << ": " << e.what() << ". Skipping file." << std::endl;
     }
 }
+
+bool read_station_list(const std::string& path, std::unordered_set<int>& ids) {
+    std::ifstream in(path);
+    if (!in) {
+        std::cerr << "Error: Could not open station list " << path << std::endl;
+        return false;
+    }
+    std::string line;
+    while (std::getline(in, line)) {
+        std::istringstream iss(line.substr(0, line.find('#')));
+        std::string tok;
+        while (iss >> tok) {
+            int id;
+            auto res = std::from_chars(tok.data(), tok.data() + tok.size(), id);
+            if (res.ec != std::errc() || res.ptr != tok.data() + tok.size()) {
+                std::cerr << "Error: Invalid station id '" << tok << "' in " << path << std::endl;
+                return false;
+            }
+            ids.insert(id);
+        }
+    }
+    return true;
+}
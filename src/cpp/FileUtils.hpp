@@ -2,10 +2,48 @@
 #pragma once
 
 #include "DataTypes.hpp"
+#include <cstdint>
 #include <string>
+#include <string_view>
+#include <unordered_set>
 #include <vector>
 
+// Read-only view of a whole file: memory-mapped, or read into a buffer when mmap is not possible
+class MappedFile {
+public:
+    explicit MappedFile(const std::string& path);
+    ~MappedFile();
+    MappedFile(const MappedFile&) = delete;
+    MappedFile& operator=(const MappedFile&) = delete;
+
+    bool ok() const { return ok_; }
+    const char* data() const { return data_; }
+    size_t size() const { return size_; }
+
+private:
+    void* map_ = nullptr;
+    const char* data_ = nullptr;
+    size_t size_ = 0;
+    bool ok_ = false;
+    std::string buffer_;
+};
+
+// mtime (ns) and size of a regular file / mtime of a directory; false if path is not one
+bool stat_file(const std::string& path, int64_t& mtime_ns, uint64_t& size);
+bool stat_directory(const std::string& path, int64_t& mtime_ns);
+
+// Writes data to a private temporary file next to path and renames it over path, so readers
+// never see a partial file. False (and no file left behind) on failure.
+bool write_file_atomic(const std::string& path, const std::string& data);
+
+// Fixed-format names vfld<exp>YYYYMMDDHHLL and vobsYYYYMMDDHH; false for any other name
+bool parse_vfld_name(std::string_view name, long long& base_time, int& lead_time);
+bool parse_vobs_name(std::string_view name, long long& valid_time);
 FileInfo parse_filename(const std::string& path);
 
 void read_data_file(const std::string& filepath, bool is_vfld, int& version_flag,
-                    std::vector<SurfaceStation>& stations, std::vector<TempLevel>& temp_levels);
\ No newline at end of file
+                    std::vector<SurfaceStation>& stations, std::vector<TempLevel>& temp_levels);
+
+// Reads station ids (whitespace separated, '#' starts a comment) into ids; false if the file
+// cannot be read or holds a token that is not an integer
+bool read_station_list(const std::string& path, std::unordered_set<int>& ids);
@@ -0,0 +1,285 @@
+// MetricsWriter.cpp
+#include "MetricsWriter.hpp"
+#include <algorithm>
+#include <cmath>
+#include <filesystem>
+#include <fstream>
+#include <iomanip>
+#include <iostream>
+#include <limits>
+#include <type_traits>
+
+#ifdef VERIFY_WITH_PARQUET
+#include <arrow/api.h>
+#include <arrow/io/file.h>
+#include <parquet/arrow/writer.h>
+#endif
+
+namespace fs = std::filesystem;
+
+namespace {
+
+double mean(double sum, long n) { return sum / n; }
+// Population standard deviation from a sum and a sum of squares; rounding can push the variance below 0
+double stddev(double sum, double sum_sq, long n) { return std::sqrt(std::max(0.0, sum_sq / n - mean(sum, n) * mean(sum, n))); }
+
+double bias_of(const AggregatedStats& s) { return mean(s.sum_of_errors, s.count); }
+double rmse_of(const AggregatedStats& s) { return std::sqrt(s.sum_of_squared_errors / s.count); }
+double mae_of(const AggregatedStats& s) { return mean(s.sum_of_abs_errors, s.count); }
+double error_sd_of(const AggregatedStats& s) { return stddev(s.sum_of_errors, s.sum_of_squared_errors, s.count); }
+double fcst_mean_of(const AggregatedStats& s) { return mean(s.sum_fcst, s.count); }
+double obs_mean_of(const AggregatedStats& s) { return mean(s.sum_obs, s.count); }
+double fcst_sd_of(const AggregatedStats& s) { return stddev(s.sum_fcst, s.sum_fcst_sq, s.count); }
+double obs_sd_of(const AggregatedStats& s) { return stddev(s.sum_obs, s.sum_obs_sq, s.count); }
+// Pearson correlation; NaN when forecast or observation is constant over the cell
+double corr_of(const AggregatedStats& s) {
+    const double sd = fcst_sd_of(s) * obs_sd_of(s);
+    if (sd <= 0.0) return std::numeric_limits<double>::quiet_NaN();
+    return (mean(s.sum_fcst_obs, s.count) - fcst_mean_of(s) * obs_mean_of(s)) / sd;
+}
+
+// Score columns in output order: bias and rmse come before n_samples (the original schema),
+// the extended scores follow it
+struct ScoreColumn { const char* name; double (*of)(const AggregatedStats&); };
+constexpr ScoreColumn kScoreColumns[] = {
+    {"bias", bias_of}, {"rmse", rmse_of},
+    {"mae", mae_of}, {"error_sd", error_sd_of}, {"fcst_mean", fcst_mean_of}, {"obs_mean", obs_mean_of},
+    {"fcst_sd", fcst_sd_of}, {"obs_sd", obs_sd_of}, {"corr", corr_of},
+};
+constexpr size_t kScoresBeforeCount = 2;
+constexpr size_t kNumScores = sizeof(kScoreColumns) / sizeof(kScoreColumns[0]);
+
+// Scores keep full double precision; pressure_level, coordinates and threshold keep a fixed format
+// (read back as float). Non-finite scores (corr of a constant field) are empty fields, which CSV
+// readers take as null in a float column rather than as text. Station rows carry lead_time only
+// when with_lead is set.
+template <typename Row>
+bool write_csv(const std::string& path, const MetricNames& names, const std::vector<Row>& rows, bool with_lead = true) {
+    constexpr bool is_temp = std::is_same_v<Row, TempResult>;
+    constexpr bool is_station = std::is_same_v<Row, StationResult>;
+    const auto& var_names = is_temp ? names.temp_variables : names.surface_variables;
+    const auto fixed6 = [](std::ostream& os) -> std::ostream& { return os << std::fixed << std::setprecision(6); };
+    const auto full = [](std::ostream& os) -> std::ostream& {
+        return os << std::defaultfloat << std::setprecision(std::numeric_limits<double>::max_digits10);
+    };
+    std::ofstream out(path, std::ios::trunc);
+    if (!out) return false;
+    if constexpr (is_station) out << "experiment,station_id,lat,lon,hgt" << (with_lead ? ",lead_time" : "") << ",obstypevar";
+    else out << (is_temp ? "experiment,lead_time,vt_hour,pressure_level,obstypevar" : "experiment,lead_time,vt_hour,obstypevar");
+    for (size_t c = 0; c < kNumScores; ++c) {
+        if (c == kScoresBeforeCount) out << ",n_samples";
+        out << "," << kScoreColumns[c].name;
+    }
+    out << "\n";
+    out << full;
+    for (const auto& r : rows) {
+        out << names.experiments[r.experiment] << ",";
+        if constexpr (is_station) {
+            out << r.station_id << "," << fixed6 << r.lat << "," << r.lon << "," << r.hgt << "," << full;
+            if (with_lead) out << r.lead_time << ",";
+        } else {
+            out << r.lead_time << "," << r.vt_hour << ",";
+            if constexpr (is_temp) out << fixed6 << r.pressure_level << "," << full;
+        }
+        out << var_names[r.variable];
+        for (size_t c = 0; c < kNumScores; ++c) {
+            if (c == kScoresBeforeCount) out << "," << r.stats.count;
+            const double v = kScoreColumns[c].of(r.stats);
+            out << ",";
+            if (std::isfinite(v)) out << v;
+        }
+        out << "\n";
+    }
+    out.close();
+    return static_cast<bool>(out);
+}
+
+bool write_contingency_csv(const std::string& path, const MetricNames& names, const std::vector<ContingencyResult>& rows) {
+    std::ofstream out(path, std::ios::trunc);
+    if (!out) return false;
+    out << "experiment,lead_time,vt_hour,obstypevar,threshold,hits,false_alarms,misses,correct_negatives\n";
+    out << std::fixed << std::setprecision(6);
+    for (const auto& r : rows) {
+        out << names.experiments[r.experiment] << "," << r.lead_time << "," << r.vt_hour << ","
+            << names.surface_variables[r.variable] << "," << r.threshold << "," << r.counts.hits << ","
+            << r.counts.false_alarms << "," << r.counts.misses << "," << r.counts.correct_negatives << "\n";
+    }
+    out.close();
+    return static_cast<bool>(out);
+}
+
+// Column builders: one value of each row, through of(row)
+template <typename Row, typename Of>
+void add_ints(MetricTable& table, const char* name, const std::vector<Row>& rows, Of of) {
+    MetricColumn& c = table.emplace_back(MetricColumn{name, MetricColumn::Type::Int64});
+    c.ints.reserve(rows.size());
+    for (const auto& r : rows) c.ints.push_back(of(r));
+}
+
+template <typename Row, typename Of>
+void add_doubles(MetricTable& table, const char* name, const std::vector<Row>& rows, Of of) {
+    MetricColumn& c = table.emplace_back(MetricColumn{name, MetricColumn::Type::Float64});
+    c.doubles.reserve(rows.size());
+    for (const auto& r : rows) c.doubles.push_back(of(r));
+}
+
+// Strings from a name table, by the interned id of each row
+template <typename Row, typename IdOf>
+void add_names(MetricTable& table, const char* name, const std::vector<Row>& rows,
+               const std::vector<std::string>& names, IdOf id_of) {
+    MetricColumn& c = table.emplace_back(MetricColumn{name, MetricColumn::Type::Utf8});
+    c.offsets.reserve(rows.size() + 1);
+    c.offsets.push_back(0);
+    for (const auto& r : rows) {
+        c.chars += names[id_of(r)];
+        c.offsets.push_back(static_cast<int32_t>(c.chars.size()));
+    }
+}
+
+// Typed columns matching what polars infers from the CSV (int64 counts and times, float64 values)
+template <typename Row>
+MetricTable metric_columns(const MetricNames& names, const std::vector<Row>& rows, bool with_lead = true) {
+    constexpr bool is_temp = std::is_same_v<Row, TempResult>;
+    constexpr bool is_station = std::is_same_v<Row, StationResult>;
+    MetricTable table;
+    add_names(table, "experiment", rows, names.experiments, [](const Row& r) { return r.experiment; });
+    if constexpr (is_station) {
+        add_ints(table, "station_id", rows, [](const Row& r) { return r.station_id; });
+        add_doubles(table, "lat", rows, [](const Row& r) { return r.lat; });
+        add_doubles(table, "lon", rows, [](const Row& r) { return r.lon; });
+        add_doubles(table, "hgt", rows, [](const Row& r) { return r.hgt; });
+    }
+    if (!is_station || with_lead) add_ints(table, "lead_time", rows, [](const Row& r) { return r.lead_time; });
+    if constexpr (!is_station) add_ints(table, "vt_hour", rows, [](const Row& r) { return r.vt_hour; });
+    if constexpr (is_temp) add_doubles(table, "pressure_level", rows, [](const Row& r) { return r.pressure_level; });
+    add_names(table, "obstypevar", rows, is_temp ? names.temp_variables : names.surface_variables,
+              [](const Row& r) { return r.variable; });
+    for (size_t c = 0; c < kNumScores; ++c) {
+        if (c == kScoresBeforeCount) add_ints(table, "n_samples", rows, [](const Row& r) { return r.stats.count; });
+        add_doubles(table, kScoreColumns[c].name, rows, [&](const Row& r) { return kScoreColumns[c].of(r.stats); });
+    }
+    return table;
+}
+
+MetricTable contingency_columns(const MetricNames& names, const std::vector<ContingencyResult>& rows) {
+    using Row = ContingencyResult;
+    MetricTable table;
+    add_names(table, "experiment", rows, names.experiments, [](const Row& r) { return r.experiment; });
+    add_ints(table, "lead_time", rows, [](const Row& r) { return r.lead_time; });
+    add_ints(table, "vt_hour", rows, [](const Row& r) { return r.vt_hour; });
+    add_names(table, "obstypevar", rows, names.surface_variables, [](const Row& r) { return r.variable; });
+    add_doubles(table, "threshold", rows, [](const Row& r) { return r.threshold; });
+    add_ints(table, "hits", rows, [](const Row& r) { return r.counts.hits; });
+    add_ints(table, "false_alarms", rows, [](const Row& r) { return r.counts.false_alarms; });
+    add_ints(table, "misses", rows, [](const Row& r) { return r.counts.misses; });
+    add_ints(table, "correct_negatives", rows, [](const Row& r) { return r.counts.correct_negatives; });
+    return table;
+}
+
+#ifdef VERIFY_WITH_PARQUET
+// Arrow arrays over the column buffers (no copy); table must outlive the result
+std::shared_ptr<arrow::Table> to_arrow(const MetricTable& table) {
+    std::vector<std::shared_ptr<arrow::Field>> fields;
+    std::vector<std::shared_ptr<arrow::Array>> columns;
+    for (const auto& c : table) {
+        switch (c.type) {
+        case MetricColumn::Type::Int64:
+            fields.push_back(arrow::field(c.name, arrow::int64()));
+            columns.push_back(std::make_shared<arrow::Int64Array>(c.ints.size(), arrow::Buffer::Wrap(c.ints)));
+            break;
+        case MetricColumn::Type::Float64:
+            fields.push_back(arrow::field(c.name, arrow::float64()));
+            columns.push_back(std::make_shared<arrow::DoubleArray>(c.doubles.size(), arrow::Buffer::Wrap(c.doubles)));
+            break;
+        case MetricColumn::Type::Utf8:
+            fields.push_back(arrow::field(c.name, arrow::utf8()));
+            columns.push_back(std::make_shared<arrow::StringArray>(
+                c.offsets.size() - 1, arrow::Buffer::Wrap(c.offsets), arrow::Buffer::Wrap(c.chars.data(), c.chars.size())));
+            break;
+        }
+    }
+    return arrow::Table::Make(arrow::schema(fields), columns);
+}
+
+arrow::Status write_table(const std::string& path, const MetricTable& table) {
+    ARROW_ASSIGN_OR_RAISE(auto out, arrow::io::FileOutputStream::Open(path));
+    ARROW_RETURN_NOT_OK(parquet::arrow::WriteTable(*to_arrow(table), arrow::default_memory_pool(), out, 1 << 20));
+    return out->Close();
+}
+#endif
+
+} // namespace
+
+bool parquet_available() {
+#ifdef VERIFY_WITH_PARQUET
+    return true;
+#else
+    return false;
+#endif
+}
+
+bool write_metrics(const std::string& outdir, const std::string& format, const MetricNames& names,
+                   const MetricResults& results) {
+    std::error_code ec;
+    fs::create_directories(outdir, ec);
+    for (const char* stem : {"surface_metrics", "temp_metrics", "precip_contingency", "station_metrics"}) {
+        for (const char* ext : {".csv", ".parquet"}) fs::remove(fs::path(outdir) / (std::string(stem) + ext), ec);
+    }
+    auto path_of = [&](const char* stem) { return (fs::path(outdir) / (std::string(stem) + "." + format)).string(); };
+    const std::string surface_path = path_of("surface_metrics");
+    const std::string temp_path = path_of("temp_metrics");
+    const std::string contingency_path = path_of("precip_contingency");
+    const std::string station_path = path_of("station_metrics");
+
+    if (format == "csv") {
+        std::cout << "Saving surface metrics to " << surface_path << std::endl;
+        bool ok = write_csv(surface_path, names, results.surface);
+        std::cout << "Saving temp metrics to " << temp_path << std::endl;
+        ok = write_csv(temp_path, names, results.temp) && ok;
+        if (!results.contingency.empty()) {
+            std::cout << "Saving precipitation contingency tables to " << contingency_path << std::endl;
+            ok = write_contingency_csv(contingency_path, names, results.contingency) && ok;
+        }
+        if (results.with_station_stats) {
+            std::cout << "Saving station metrics to " << station_path << std::endl;
+            ok = write_csv(station_path, names, results.stations, results.stations_by_lead) && ok;
+        }
+        if (!ok) std::cerr << "Error: Could not write metrics to " << outdir << std::endl;
+        return ok;
+    }
+#ifdef VERIFY_WITH_PARQUET
+    if (format == "parquet") {
+        std::cout << "Saving surface metrics to " << surface_path << std::endl;
+        arrow::Status st = write_table(surface_path, metric_columns(names, results.surface));
+        if (st.ok()) {
+            std::cout << "Saving temp metrics to " << temp_path << std::endl;
+            st = write_table(temp_path, metric_columns(names, results.temp));
+        }
+        if (st.ok() && !results.contingency.empty()) {
+            std::cout << "Saving precipitation contingency tables to " << contingency_path << std::endl;
+            st = write_table(contingency_path, contingency_columns(names, results.contingency));
+        }
+        if (st.ok() && results.with_station_stats) {
+            std::cout << "Saving station metrics to " << station_path << std::endl;
+            st = write_table(station_path, metric_columns(names, results.stations, results.stations_by_lead));
+        }
+        if (!st.ok()) std::cerr << "Error: Could not write Parquet metrics: " << st.ToString() << std::endl;
+        return st.ok();
+    }
+#endif
+    std::cerr << "Error: Output format '" << format << "' is not available in this build." << std::endl;
+    return false;
+}
+
+std::vector<std::pair<std::string, MetricTable>> metric_tables(const MetricNames& names, const MetricResults& results) {
+    std::vector<std::pair<std::string, MetricTable>> tables;
+    tables.emplace_back("surface_metrics", metric_columns(names, results.surface));
+    tables.emplace_back("temp_metrics", metric_columns(names, results.temp));
+    if (!results.contingency.empty()) {
+        tables.emplace_back("precip_contingency", contingency_columns(names, results.contingency));
+    }
+    if (results.with_station_stats) {
+        tables.emplace_back("station_metrics", metric_columns(names, results.stations, results.stations_by_lead));
+    }
+    return tables;
+}
@@ -0,0 +1,50 @@
+// MetricsWriter.hpp
+#pragma once
+
+#include "DataTypes.hpp"
+#include <cstdint>
+#include <string>
+#include <utility>
+#include <vector>
+
+// Name tables the interned ids of the result rows refer to
+struct MetricNames {
+    std::vector<std::string> experiments, surface_variables, temp_variables;
+};
+
+// True when the engine was built with native Parquet output (make PARQUET=1)
+bool parquet_available();
+
+// Result rows of one run. Station rows are written only with_station_stats; they are grouped by
+// lead time as well when stations_by_lead is set.
+struct MetricResults {
+    std::vector<SurfaceResult> surface;
+    std::vector<TempResult> temp;
+    std::vector<ContingencyResult> contingency;
+    std::vector<StationResult> stations;
+    bool with_station_stats = false;
+    bool stations_by_lead = false;
+};
+
+// Writes surface_metrics.<ext>, temp_metrics.<ext>, (when there are precipitation windows)
+// precip_contingency.<ext> and (when requested) station_metrics.<ext> into outdir, where format is
+// "csv" or "parquet". Outputs of a previous run in either format are removed first. Returns false
+// after printing the reason when the files cannot be written.
+bool write_metrics(const std::string& outdir, const std::string& format, const MetricNames& names,
+                   const MetricResults& results);
+
+// One column of a result table in Arrow layout (no nulls). A Utf8 column holds value i in
+// chars[offsets[i], offsets[i + 1]).
+struct MetricColumn {
+    enum class Type { Int64, Float64, Utf8 };
+    std::string name;
+    Type type;
+    std::vector<int64_t> ints;
+    std::vector<double> doubles;
+    std::vector<int32_t> offsets;
+    std::string chars;
+};
+using MetricTable = std::vector<MetricColumn>;
+
+// The tables write_metrics writes, by file stem, with the columns and types of its Parquet output
+std::vector<std::pair<std::string, MetricTable>> metric_tables(const MetricNames& names, const MetricResults& results);
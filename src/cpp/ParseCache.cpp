@@ -0,0 +1,272 @@
+// ParseCache.cpp
+#include "ParseCache.hpp"
+#include "FileUtils.hpp"
+#include <chrono>
+#include <cstdint>
+#include <cstdio>
+#include <cstring>
+#include <filesystem>
+#include <fstream>
+#include <functional>
+#include <iterator>
+#include <iostream>
+
+namespace fs = std::filesystem;
+
+namespace {
+
+// Bump when the parser or the layout below changes so old entries are re-parsed
+constexpr uint32_t kCacheFormat = 1;
+constexpr char kMagic[8] = {'V', 'P', 'C', 'A', 'C', 'H', 'E', '\0'};
+
+struct CacheHeader {
+    char magic[8];
+    uint32_t format;
+    uint32_t is_vfld;
+    int64_t mtime_ns;
+    uint64_t source_size;
+    int32_t version_flag;
+    uint32_t path_len;
+    uint64_t n_stations;
+    uint64_t n_levels;
+};
+
+// Every double member is stored as one column; the static_asserts catch fields added to the
+// structs without a matching column here.
+double SurfaceStation::* const kSurfaceColumns[] = {
+    &SurfaceStation::lat, &SurfaceStation::lon, &SurfaceStation::hgt,
+    &SurfaceStation::nn, &SurfaceStation::dd, &SurfaceStation::ff, &SurfaceStation::tt,
+    &SurfaceStation::rh, &SurfaceStation::ps, &SurfaceStation::pss, &SurfaceStation::ttha,
+    &SurfaceStation::pe, &SurfaceStation::qq, &SurfaceStation::vi, &SurfaceStation::td,
+    &SurfaceStation::tx, &SurfaceStation::tn, &SurfaceStation::gg, &SurfaceStation::gx,
+    &SurfaceStation::fx, &SurfaceStation::ch, &SurfaceStation::lc,
+    &SurfaceStation::pe1, &SurfaceStation::pe3, &SurfaceStation::pe6,
+    &SurfaceStation::pe12, &SurfaceStation::pe24,
+};
+double TempLevel::* const kTempColumns[] = {
+    &TempLevel::pressure, &TempLevel::temp, &TempLevel::td, &TempLevel::fi,
+    &TempLevel::rh, &TempLevel::qq, &TempLevel::dd, &TempLevel::ff,
+};
+static_assert(sizeof(SurfaceStation) == sizeof(double) * (1 + std::size(kSurfaceColumns)),
+              "SurfaceStation changed: update kSurfaceColumns and kCacheFormat");
+static_assert(sizeof(TempLevel) == sizeof(double) * (1 + std::size(kTempColumns)),
+              "TempLevel changed: update kTempColumns and kCacheFormat");
+
+size_t pad8(size_t n) { return (n + 7) & ~size_t(7); }
+
+size_t payload_size(size_t path_len, size_t n_stations, size_t n_levels) {
+    return sizeof(CacheHeader) + pad8(path_len)
+        + pad8(n_stations * sizeof(int32_t)) + n_stations * sizeof(double) * std::size(kSurfaceColumns)
+        + pad8(n_levels * sizeof(int32_t)) + n_levels * sizeof(double) * std::size(kTempColumns);
+}
+
+// Header of a mapped entry, or nullptr when it is truncated or from another format
+const CacheHeader* entry_header(const MappedFile& entry) {
+    if (!entry.ok() || entry.size() < sizeof(CacheHeader)) return nullptr;
+    const auto* h = reinterpret_cast<const CacheHeader*>(entry.data());
+    if (std::memcmp(h->magic, kMagic, sizeof(kMagic)) != 0 || h->format != kCacheFormat) return nullptr;
+    if (entry.size() != payload_size(h->path_len, h->n_stations, h->n_levels)) return nullptr;
+    return h;
+}
+
+std::string entry_source(const CacheHeader* h) {
+    return std::string(reinterpret_cast<const char*>(h + 1), h->path_len);
+}
+
+template <typename T>
+void put(std::string& buf, const T& v) { buf.append(reinterpret_cast<const char*>(&v), sizeof(T)); }
+
+void pad_to8(std::string& buf) { buf.append(pad8(buf.size()) - buf.size(), '\0'); }
+
+template <typename T>
+T get(const char*& p) { T v; std::memcpy(&v, p, sizeof(T)); p += sizeof(T); return v; }
+
+// Directory listing entries are text: a header line, the directory's mtime and path, then one
+// line per name prefixed with 'f' (regular file) or 'd' (subdirectory)
+constexpr char kListingHeader[] = "VPLIST 1";
+
+// Reads the directory and mtime a listing entry was made for, and its names when files/subdirs
+// are given; false for a missing or malformed entry
+bool read_listing(const std::string& path, std::string& dir, int64_t& mtime_ns,
+                  std::vector<std::string>* files = nullptr, std::vector<std::string>* subdirs = nullptr) {
+    std::ifstream in(path);
+    std::string line;
+    if (!std::getline(in, line) || line != kListingHeader) return false;
+    if (!std::getline(in, line)) return false;
+    try {
+        mtime_ns = std::stoll(line);
+    } catch (const std::exception&) {
+        return false;
+    }
+    if (!std::getline(in, dir)) return false;
+    if (!files) return true;
+    while (std::getline(in, line)) {
+        if (line.size() < 2) return false;
+        if (line[0] == 'f') files->push_back(line.substr(1));
+        else if (line[0] == 'd') subdirs->push_back(line.substr(1));
+        else return false;
+    }
+    return in.eof();
+}
+
+} // namespace
+
+ParseCache::ParseCache(const std::string& dir) : dir_(dir) {
+    if (!dir_.empty()) fs::create_directories(dir_);
+}
+
+std::string ParseCache::entry_path(const std::string& source, const char* ext) const {
+    char name[32];
+    std::snprintf(name, sizeof(name), "%016zx.%s", std::hash<std::string>{}(source), ext);
+    return (fs::path(dir_) / name).string();
+}
+
+void ParseCache::read(const std::string& filepath, bool is_vfld, int& version_flag,
+                      std::vector<SurfaceStation>& stations, std::vector<TempLevel>& temp_levels) {
+    int64_t mtime_ns;
+    uint64_t source_size;
+    if (!enabled() || !stat_file(filepath, mtime_ns, source_size)) {
+        read_data_file(filepath, is_vfld, version_flag, stations, temp_levels);
+        return;
+    }
+    const std::string source = fs::absolute(filepath).lexically_normal().string();
+    const std::string cache_path = entry_path(source, is_vfld ? "vfld" : "vobs");
+
+    {
+        MappedFile entry(cache_path);
+        const CacheHeader* h = entry_header(entry);
+        if (h && h->is_vfld == static_cast<uint32_t>(is_vfld) && h->mtime_ns == mtime_ns
+                && h->source_size == source_size && entry_source(h) == source) {
+            const char* p = entry.data() + sizeof(CacheHeader) + pad8(h->path_len);
+            version_flag = h->version_flag;
+            stations.assign(h->n_stations, SurfaceStation{});
+            for (auto& s : stations) s.id = get<int32_t>(p);
+            p = entry.data() + sizeof(CacheHeader) + pad8(h->path_len) + pad8(h->n_stations * sizeof(int32_t));
+            for (auto member : kSurfaceColumns) {
+                for (auto& s : stations) s.*member = get<double>(p);
+            }
+            const char* levels = p;
+            temp_levels.assign(h->n_levels, TempLevel{});
+            for (auto& t : temp_levels) t.station_id = get<int32_t>(p);
+            p = levels + pad8(h->n_levels * sizeof(int32_t));
+            for (auto member : kTempColumns) {
+                for (auto& t : temp_levels) t.*member = get<double>(p);
+            }
+            ++hits_;
+            return;
+        }
+    }
+
+    ++misses_;
+    version_flag = 0;
+    read_data_file(filepath, is_vfld, version_flag, stations, temp_levels);
+
+    std::string buf;
+    buf.reserve(payload_size(source.size(), stations.size(), temp_levels.size()));
+    CacheHeader h{};
+    std::memcpy(h.magic, kMagic, sizeof(kMagic));
+    h.format = kCacheFormat;
+    h.is_vfld = is_vfld;
+    h.mtime_ns = mtime_ns;
+    h.source_size = source_size;
+    h.version_flag = version_flag;
+    h.path_len = static_cast<uint32_t>(source.size());
+    h.n_stations = stations.size();
+    h.n_levels = temp_levels.size();
+    put(buf, h);
+    buf += source;
+    pad_to8(buf);
+    for (const auto& s : stations) put<int32_t>(buf, s.id);
+    pad_to8(buf);
+    for (auto member : kSurfaceColumns) {
+        for (const auto& s : stations) put(buf, s.*member);
+    }
+    for (const auto& t : temp_levels) put<int32_t>(buf, t.station_id);
+    pad_to8(buf);
+    for (auto member : kTempColumns) {
+        for (const auto& t : temp_levels) put(buf, t.*member);
+    }
+
+    if (!write_file_atomic(cache_path, buf)) {
+        #pragma omp critical
+        std::cerr << "Warning: Could not write parse cache entry for " << filepath << std::endl;
+    }
+}
+
+void ParseCache::list_directory(const std::string& dir, std::vector<std::string>& files,
+                                std::vector<std::string>& subdirs) {
+    int64_t mtime_ns = 0;
+    const bool cacheable = enabled() && stat_directory(dir, mtime_ns);
+    std::string source, cache_path;
+    if (cacheable) {
+        source = fs::absolute(dir).lexically_normal().string();
+        cache_path = entry_path(source, "dirlist");
+        std::string cached_dir;
+        int64_t cached_mtime_ns;
+        std::vector<std::string> cached_files, cached_subdirs;
+        if (read_listing(cache_path, cached_dir, cached_mtime_ns, &cached_files, &cached_subdirs)
+                && cached_dir == source && cached_mtime_ns == mtime_ns) {
+            files.insert(files.end(), cached_files.begin(), cached_files.end());
+            subdirs.insert(subdirs.end(), cached_subdirs.begin(), cached_subdirs.end());
+            ++listing_hits_;
+            return;
+        }
+    }
+
+    std::vector<std::string> found_files, found_subdirs;
+    for (const auto& entry : fs::directory_iterator(dir)) {
+        if (entry.is_regular_file()) found_files.push_back(entry.path().filename().string());
+        else if (entry.is_directory() && !entry.is_symlink()) found_subdirs.push_back(entry.path().filename().string());
+    }
+
+    // A directory modified within the last seconds may change again without a visible mtime
+    // change (coarse timestamps), so its listing is only stored once it has settled
+    const int64_t now_ns = std::chrono::duration_cast<std::chrono::nanoseconds>(
+        std::chrono::system_clock::now().time_since_epoch()).count();
+    if (cacheable && now_ns - mtime_ns > 2000000000LL) {
+        std::string buf = std::string(kListingHeader) + "\n" + std::to_string(mtime_ns) + "\n" + source + "\n";
+        for (const auto& name : found_files) buf += "f" + name + "\n";
+        for (const auto& name : found_subdirs) buf += "d" + name + "\n";
+        if (!write_file_atomic(cache_path, buf)) {
+            #pragma omp critical
+            std::cerr << "Warning: Could not write listing cache entry for " << dir << std::endl;
+        }
+    }
+    files.insert(files.end(), found_files.begin(), found_files.end());
+    subdirs.insert(subdirs.end(), found_subdirs.begin(), found_subdirs.end());
+}
+
+size_t ParseCache::prune() const {
+    size_t removed = 0;
+    if (!enabled() || !fs::is_directory(dir_)) return removed;
+    std::vector<fs::path> stale;
+    for (const auto& entry : fs::directory_iterator(dir_)) {
+        if (!entry.is_regular_file()) continue;
+        const fs::path& path = entry.path();
+        const std::string ext = path.extension().string();
+        if (ext == ".tmp") { stale.push_back(path); continue; }
+        if (ext == ".dirlist") {
+            std::string dir;
+            int64_t cached_mtime_ns, mtime_ns;
+            if (!read_listing(path.string(), dir, cached_mtime_ns) || !stat_directory(dir, mtime_ns)
+                    || mtime_ns != cached_mtime_ns) {
+                stale.push_back(path);
+            }
+            continue;
+        }
+        if (ext != ".vfld" && ext != ".vobs") continue;
+        MappedFile mapped(path.string());
+        const CacheHeader* h = entry_header(mapped);
+        int64_t mtime_ns;
+        uint64_t source_size;
+        if (!h || !stat_file(entry_source(h), mtime_ns, source_size)
+                || h->mtime_ns != mtime_ns || h->source_size != source_size) {
+            stale.push_back(path);
+        }
+    }
+    for (const auto& path : stale) {
+        std::error_code ec;
+        if (fs::remove(path, ec)) ++removed;
+    }
+    return removed;
+}
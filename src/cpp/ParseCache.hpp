@@ -0,0 +1,41 @@
+// ParseCache.hpp
+#pragma once
+
+#include "DataTypes.hpp"
+#include <atomic>
+#include <string>
+#include <vector>
+
+// Optional on-disk cache of parsed vfld/vobs files. Each input gets one binary columnar
+// entry in the cache directory, keyed by its path and validated against its mtime and size;
+// entries are memory-mapped on later runs instead of re-tokenizing the ASCII file. Directory
+// listings are cached the same way, validated against the directory's mtime.
+class ParseCache {
+public:
+    explicit ParseCache(const std::string& dir = "");
+
+    bool enabled() const { return !dir_.empty(); }
+
+    // Same contract as read_data_file; serves the parse from the cache when the entry is current
+    void read(const std::string& filepath, bool is_vfld, int& version_flag,
+              std::vector<SurfaceStation>& stations, std::vector<TempLevel>& temp_levels);
+
+    // Names of the regular files and subdirectories (symlinks to directories are not followed) of
+    // dir. Throws std::filesystem::filesystem_error when dir cannot be read.
+    void list_directory(const std::string& dir, std::vector<std::string>& files, std::vector<std::string>& subdirs);
+
+    // Removes entries whose source file or directory is gone or has changed, and leftover
+    // temporary files.
+    // Returns the number of files removed.
+    size_t prune() const;
+
+    size_t hits() const { return hits_; }
+    size_t misses() const { return misses_; }
+    size_t listing_hits() const { return listing_hits_; }
+
+private:
+    std::string entry_path(const std::string& source, const char* ext) const;
+
+    std::string dir_;
+    std::atomic<size_t> hits_{0}, misses_{0}, listing_hits_{0};
+};
@@ -0,0 +1,146 @@
+// StateStore.cpp
+#include "StateStore.hpp"
+#include "FileUtils.hpp"
+#include <cstring>
+#include <filesystem>
+#include <type_traits>
+
+namespace fs = std::filesystem;
+
+namespace {
+
+// Bump when the accumulated statistics or the layout below change so old states are recomputed
+constexpr uint32_t kStateFormat = 1;
+constexpr char kMagic[8] = {'V', 'P', 'S', 'T', 'A', 'T', 'E', '\0'};
+
+// Rows are stored as raw structs; the row sizes in the header reject states of another build
+struct StateHeader {
+    char magic[8];
+    uint32_t format;
+    uint32_t surface_row_size;
+    uint32_t temp_row_size;
+    uint32_t contingency_row_size;
+    uint64_t config_len;
+    uint64_t n_inputs;
+    uint64_t n_surface;
+    uint64_t n_temp;
+    uint64_t n_contingency;
+};
+static_assert(std::is_trivially_copyable_v<SurfaceResult> && std::is_trivially_copyable_v<TempResult>
+              && std::is_trivially_copyable_v<ContingencyResult>, "state rows are stored as raw structs");
+
+template <typename T>
+void put(std::string& buf, const T& v) { buf.append(reinterpret_cast<const char*>(&v), sizeof(T)); }
+
+template <typename Row>
+void put_rows(std::string& buf, const std::vector<Row>& rows) {
+    buf.append(reinterpret_cast<const char*>(rows.data()), rows.size() * sizeof(Row));
+}
+
+// Bounds-checked sequential reads from a mapped state
+struct Reader {
+    const char* p;
+    const char* end;
+
+    bool take(void* dst, size_t n) {
+        if (static_cast<size_t>(end - p) < n) return false;
+        std::memcpy(dst, p, n);
+        p += n;
+        return true;
+    }
+    bool take_string(std::string& s, size_t n) {
+        if (static_cast<size_t>(end - p) < n) return false;
+        s.assign(p, n);
+        p += n;
+        return true;
+    }
+    template <typename Row>
+    bool take_rows(std::vector<Row>& rows, size_t n) {
+        if (static_cast<size_t>(end - p) / sizeof(Row) < n) return false;
+        rows.resize(n);
+        return take(rows.data(), n * sizeof(Row));
+    }
+};
+
+} // namespace
+
+StateStore::StateStore(const std::string& dir, const std::string& config) : dir_(dir), config_(config) {
+    if (!dir_.empty()) fs::create_directories(dir_);
+}
+
+std::string StateStore::path_of(long long valid_time) const {
+    return (fs::path(dir_) / (std::to_string(valid_time) + ".state")).string();
+}
+
+bool StateStore::describe(const std::vector<std::string>& paths, std::vector<StateInput>& inputs) {
+    inputs.clear();
+    for (const auto& path : paths) {
+        StateInput in;
+        in.path = fs::absolute(path).lexically_normal().string();
+        if (!stat_file(in.path, in.mtime_ns, in.size)) return false;
+        inputs.push_back(std::move(in));
+    }
+    return true;
+}
+
+bool StateStore::load(long long valid_time, const std::vector<StateInput>& inputs, ValidTimeState& state) const {
+    if (!enabled()) return false;
+    MappedFile file(path_of(valid_time));
+    if (!file.ok()) return false;
+    Reader r{file.data(), file.data() + file.size()};
+    StateHeader h;
+    if (!r.take(&h, sizeof(h)) || std::memcmp(h.magic, kMagic, sizeof(kMagic)) != 0 || h.format != kStateFormat
+            || h.surface_row_size != sizeof(SurfaceResult) || h.temp_row_size != sizeof(TempResult)
+            || h.contingency_row_size != sizeof(ContingencyResult)) {
+        return false;
+    }
+    std::string config;
+    if (!r.take_string(config, h.config_len) || config != config_ || h.n_inputs != inputs.size()) return false;
+    for (const auto& expected : inputs) {
+        uint64_t path_len;
+        StateInput in;
+        if (!r.take(&path_len, sizeof(path_len)) || !r.take_string(in.path, path_len)
+                || !r.take(&in.mtime_ns, sizeof(in.mtime_ns)) || !r.take(&in.size, sizeof(in.size))) {
+            return false;
+        }
+        if (in.path != expected.path || in.mtime_ns != expected.mtime_ns || in.size != expected.size) return false;
+    }
+    ValidTimeState loaded;
+    if (!r.take_rows(loaded.surface, h.n_surface) || !r.take_rows(loaded.temp, h.n_temp)
+            || !r.take_rows(loaded.contingency, h.n_contingency) || r.p != r.end) {
+        return false;
+    }
+    state.surface.insert(state.surface.end(), loaded.surface.begin(), loaded.surface.end());
+    state.temp.insert(state.temp.end(), loaded.temp.begin(), loaded.temp.end());
+    state.contingency.insert(state.contingency.end(), loaded.contingency.begin(), loaded.contingency.end());
+    return true;
+}
+
+bool StateStore::save(long long valid_time, const std::vector<StateInput>& inputs, const ValidTimeState& state) const {
+    if (!enabled()) return false;
+    StateHeader h{};
+    std::memcpy(h.magic, kMagic, sizeof(kMagic));
+    h.format = kStateFormat;
+    h.surface_row_size = sizeof(SurfaceResult);
+    h.temp_row_size = sizeof(TempResult);
+    h.contingency_row_size = sizeof(ContingencyResult);
+    h.config_len = config_.size();
+    h.n_inputs = inputs.size();
+    h.n_surface = state.surface.size();
+    h.n_temp = state.temp.size();
+    h.n_contingency = state.contingency.size();
+
+    std::string buf;
+    put(buf, h);
+    buf += config_;
+    for (const auto& in : inputs) {
+        put<uint64_t>(buf, in.path.size());
+        buf += in.path;
+        put(buf, in.mtime_ns);
+        put(buf, in.size);
+    }
+    put_rows(buf, state.surface);
+    put_rows(buf, state.temp);
+    put_rows(buf, state.contingency);
+    return write_file_atomic(path_of(valid_time), buf);
+}
@@ -0,0 +1,48 @@
+// StateStore.hpp
+#pragma once
+
+#include "DataTypes.hpp"
+#include <cstdint>
+#include <string>
+#include <vector>
+
+// An input file as recorded with a state: absolute path, mtime and size
+struct StateInput {
+    std::string path;
+    int64_t mtime_ns = 0;
+    uint64_t size = 0;
+};
+
+// Result rows of one valid time
+struct ValidTimeState {
+    std::vector<SurfaceResult> surface;
+    std::vector<TempResult> temp;
+    std::vector<ContingencyResult> contingency;
+};
+
+// Optional on-disk checkpoint of the aggregates of each valid time (<dir>/<valid_time>.state).
+// A state records the configuration and the input files (vfld, PE window partners, vobs) it was
+// computed from, and is reused only while both are unchanged.
+class StateStore {
+public:
+    // config identifies everything besides the input files that the rows depend on
+    explicit StateStore(const std::string& dir = "", const std::string& config = "");
+
+    bool enabled() const { return !dir_.empty(); }
+
+    // Describes the given files; false if one of them is not a readable regular file
+    static bool describe(const std::vector<std::string>& paths, std::vector<StateInput>& inputs);
+
+    // Appends the rows of a current state for valid_time to state; false (and nothing appended)
+    // when there is none, or it was made from other inputs or another configuration
+    bool load(long long valid_time, const std::vector<StateInput>& inputs, ValidTimeState& state) const;
+
+    // Replaces the state of valid_time; false after a failed write
+    bool save(long long valid_time, const std::vector<StateInput>& inputs, const ValidTimeState& state) const;
+
+private:
+    std::string path_of(long long valid_time) const;
+
+    std::string dir_;
+    std::string config_;
+};
@@ -1,46 +1,57 @@
 // VerificationUtils.cpp
 #include "VerificationUtils.hpp"
+#include <algorithm>
 #include <cmath>
 
 bool is_missing(double v) { return v < -998.0; }
 
+double SurfaceStation::* surface_field(const std::string& var) {
+    if (var == "NN") return &SurfaceStation::nn;
+    else if (var == "DD") return &SurfaceStation::dd;
+    else if (var == "FF") return &SurfaceStation::ff;
+    else if (var == "TT") return &SurfaceStation::tt;
+    else if (var == "TTHA") return &SurfaceStation::ttha;
+    else if (var == "RH") return &SurfaceStation::rh;
+    else if (var == "PS") return &SurfaceStation::ps;
+    else if (var == "SPS" || var == "PSS") return &SurfaceStation::pss;   // station pressure
+    else if (var == "PE") return &SurfaceStation::pe;          // total (forecast only)
+    else if (var == "PE1") return &SurfaceStation::pe1;
+    else if (var == "PE3") return &SurfaceStation::pe3;
+    else if (var == "PE6") return &SurfaceStation::pe6;
+    else if (var == "PE12") return &SurfaceStation::pe12;
+    else if (var == "PE24") return &SurfaceStation::pe24;
+    else if (var == "QQ") return &SurfaceStation::qq;
+    else if (var == "VI") return &SurfaceStation::vi;
+    else if (var == "TD") return &SurfaceStation::td;
+    else if (var == "TX") return &SurfaceStation::tx;
+    else if (var == "TN") return &SurfaceStation::tn;
+    else if (var == "GG") return &SurfaceStation::gg;
+    else if (var == "GX") return &SurfaceStation::gx;
+    else if (var == "FX") return &SurfaceStation::fx;
+    else if (var == "CH") return &SurfaceStation::ch;
+    else if (var == "LC") return &SurfaceStation::lc;
+    return nullptr;
+}
+
+double TempLevel::* temp_field(const std::string& var) {
+    if (var == "TT") return &TempLevel::temp;
+    else if (var == "TD") return &TempLevel::td;
+    else if (var == "RH") return &TempLevel::rh;
+    else if (var == "QQ") return &TempLevel::qq;
+    else if (var == "DD") return &TempLevel::dd;
+    else if (var == "FF") return &TempLevel::ff;
+    else if (var == "FI") return &TempLevel::fi;
+    return nullptr;
+}
+
 double get_surface_value(const SurfaceStation& s, const std::string& var) {
-    if (var == "NN") return s.nn;
-    else if (var == "DD") return s.dd;
-    else if (var == "FF") return s.ff;
-    else if (var == "TT") return s.tt;
-    else if (var == "TTHA") return s.ttha;
-    else if (var == "RH") return s.rh;
-    else if (var == "PS") return s.ps;
-    else if (var == "SPS" || var == "PSS") return s.pss;   // station pressure
-    else if (var == "PE") return s.pe;          // total (forecast only)
-    else if (var == "PE1") return s.pe1;
-    else if (var == "PE3") return s.pe3;
-    else if (var == "PE6") return s.pe6;
-    else if (var == "PE12") return s.pe12;
-    else if (var == "PE24") return s.pe24;
-    else if (var == "QQ") return s.qq;
-    else if (var == "VI") return s.vi;
-    else if (var == "TD") return s.td;
-    else if (var == "TX") return s.tx;
-    else if (var == "TN") return s.tn;
-    else if (var == "GG") return s.gg;
-    else if (var == "GX") return s.gx;
-    else if (var == "FX") return s.fx;
-    else if (var == "CH") return s.ch;
-    else if (var == "LC") return s.lc;
-    return -999.0;
+    auto field = surface_field(var);
+    return field ? s.*field : -999.0;
 }
 
 double get_temp_value(const TempLevel& t, const std::string& var) {
-    if (var == "TT") return t.temp;
-    else if (var == "TD") return t.td;
-    else if (var == "RH") return t.rh;
-    else if (var == "QQ") return t.qq;
-    else if (var == "DD") return t.dd;
-    else if (var == "FF") return t.ff;
-    else if (var == "FI") return t.fi;
-    return -999.0;
+    auto field = temp_field(var);
+    return field ? t.*field : -999.0;
 }
 
 double directional_diff(double f, double o) {
@@ -50,3 +61,63 @@ double directional_diff(double f, double o) {
     while (d < -180.0) d += 360.0;
     return d;
 }
+
+long long temp_level_key(int station_id, double pressure) {
+    return ((long long)station_id << 32) ^ (long long)std::llround(pressure * 100.0);
+}
+
+void build_temp_index(VobsData& vobs) {
+    auto& index = vobs.temp_index;
+    index.clear();
+    index.reserve(vobs.temp_levels.size());
+    for (size_t i = 0; i < vobs.temp_levels.size(); ++i) {
+        index.emplace_back(temp_level_key(vobs.temp_levels[i].station_id, vobs.temp_levels[i].pressure), i);
+    }
+    std::stable_sort(index.begin(), index.end(),
+                     [](const auto& a, const auto& b) { return a.first < b.first; });
+    // Keep the last entry of each run of equal keys
+    size_t out = 0;
+    for (size_t i = 0; i < index.size(); ++i) {
+        if (i + 1 < index.size() && index[i + 1].first == index[i].first) continue;
+        index[out++] = index[i];
+    }
+    index.resize(out);
+}
+
+const TempLevel* find_temp_level(const VobsData& vobs, int station_id, double pressure) {
+    const long long key = temp_level_key(station_id, pressure);
+    auto it = std::lower_bound(vobs.temp_index.begin(), vobs.temp_index.end(), key,
+                               [](const auto& entry, long long k) { return entry.first < k; });
+    if (it == vobs.temp_index.end() || it->first != key) return nullptr;
+    return &vobs.temp_levels[it->second];
+}
+
+void intersect_samples(CommonSamples& shared, const CommonSamples& other) {
+    auto intersect = [](auto& into, const auto& from) {
+        for (auto it = into.begin(); it != into.end(); ) {
+            auto match = from.find(it->first);
+            it->second = (match == from.end()) ? 0 : (it->second & match->second);
+            it = it->second ? std::next(it) : into.erase(it);
+        }
+    };
+    intersect(shared.surface, other.surface);
+    intersect(shared.temp, other.temp);
+}
+
+void remove_stations(const std::unordered_set<int>& blacklist, std::vector<SurfaceStation>& stations,
+                     std::vector<TempLevel>& temp_levels) {
+    if (blacklist.empty()) return;
+    stations.erase(std::remove_if(stations.begin(), stations.end(),
+                                  [&](const SurfaceStation& s) { return blacklist.count(s.id) > 0; }),
+                   stations.end());
+    temp_levels.erase(std::remove_if(temp_levels.begin(), temp_levels.end(),
+                                     [&](const TempLevel& t) { return blacklist.count(t.station_id) > 0; }),
+                      temp_levels.end());
+}
+
+std::vector<size_t> order_by_cost(const std::vector<uint64_t>& cost) {
+    std::vector<size_t> order(cost.size());
+    for (size_t i = 0; i < order.size(); ++i) order[i] = i;
+    std::stable_sort(order.begin(), order.end(), [&](size_t x, size_t y) { return cost[x] > cost[y]; });
+    return order;
+}
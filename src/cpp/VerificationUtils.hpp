@@ -2,9 +2,33 @@
 #pragma once
 
 #include "DataTypes.hpp"
+#include <cstdint>
 #include <string>
+#include <unordered_set>
+#include <utility>
+#include <vector>
 
 bool is_missing(double v);
+// Member holding a variable, resolved once per variable instead of per value (nullptr if unknown)
+double SurfaceStation::* surface_field(const std::string& var);
+double TempLevel::* temp_field(const std::string& var);
 double get_surface_value(const SurfaceStation& s, const std::string& var);
 double get_temp_value(const TempLevel& t, const std::string& var);
-double directional_diff(double f, double o);
\ No newline at end of file
+double directional_diff(double f, double o);
+
+// Sorted (station_id, pressure) index over vobs.temp_levels, built once per valid time and
+// shared read-only by all threads. Of duplicate levels the last one read is kept.
+long long temp_level_key(int station_id, double pressure);
+void build_temp_index(VobsData& vobs);
+const TempLevel* find_temp_level(const VobsData& vobs, int station_id, double pressure);
+
+// Keeps in `shared` only the variables that `other` also has for the same station / level
+void intersect_samples(CommonSamples& shared, const CommonSamples& other);
+
+// Drops the stations (and their upper-air levels) listed in blacklist right after reading a file
+void remove_stations(const std::unordered_set<int>& blacklist, std::vector<SurfaceStation>& stations,
+                     std::vector<TempLevel>& temp_levels);
+
+// Positions of cost in descending order (ties keep their order), so that a dynamic schedule
+// starts with the most expensive items and the short ones fill the gaps at the end
+std::vector<size_t> order_by_cost(const std::vector<uint64_t>& cost);
@@ -0,0 +1,120 @@
+// engine_module.cpp
+// Python module obsver_engine (make python): runs the verification engine in-process and hands
+// its tables to Python through the Arrow PyCapsule interface, so polars and pyarrow wrap the
+// column buffers without a copy or a round trip through files
+#include "ArrowExport.hpp"
+#include "Engine.hpp"
+
+#include <pybind11/pybind11.h>
+#include <pybind11/stl.h>
+
+#include <iostream>
+#include <memory>
+#include <string>
+#include <vector>
+
+namespace py = pybind11;
+
+namespace {
+
+// A result table; pl.DataFrame(table) and pa.table(table) import it through __arrow_c_stream__
+class Table {
+public:
+    explicit Table(MetricTable columns) : columns_(std::make_shared<const MetricTable>(std::move(columns))) {}
+
+    // requested_schema is a best-effort request the interface allows producers to ignore
+    py::capsule arrow_c_stream(const py::object& /* requested_schema */) const {
+        auto* stream = new ArrowArrayStream;
+        export_table(columns_, stream);
+        return py::capsule(stream, "arrow_array_stream", [](PyObject* capsule) {
+            auto* stream = static_cast<ArrowArrayStream*>(PyCapsule_GetPointer(capsule, "arrow_array_stream"));
+            if (stream->release) stream->release(stream);
+            delete stream;
+        });
+    }
+
+    std::vector<std::string> column_names() const {
+        std::vector<std::string> names;
+        for (const auto& c : *columns_) names.push_back(c.name);
+        return names;
+    }
+
+    size_t num_rows() const {
+        if (columns_->empty()) return 0;
+        const MetricColumn& c = columns_->front();
+        if (c.type == MetricColumn::Type::Utf8) return c.offsets.size() - 1;
+        return c.type == MetricColumn::Type::Int64 ? c.ints.size() : c.doubles.size();
+    }
+
+private:
+    std::shared_ptr<const MetricTable> columns_;
+};
+
+py::dict verify(long long start, long long end, int fcint, const std::string& vobs_dir,
+                const std::vector<std::string>& experiment_dirs, const std::vector<std::string>& surface_variables,
+                const std::vector<std::string>& temp_variables, const std::vector<double>& precip_thresholds,
+                const std::string& cache_dir, bool stream, size_t prefetch, bool common_stations, bool station_stats,
+                bool station_stats_by_lead, const std::string& station_blacklist, const std::string& state_dir,
+                int shard_index, int shard_count, bool shard_by_time, bool verbose) {
+    EngineOptions options;
+    options.start = start;
+    options.end = end;
+    options.fcint = fcint;
+    options.vobs_dir = vobs_dir;
+    options.experiment_dirs = experiment_dirs;
+    options.surface_variables = surface_variables;
+    options.temp_variables = temp_variables;
+    options.precip_thresholds = precip_thresholds;
+    options.cache_dir = cache_dir;
+    options.stream = stream;
+    options.prefetch_batches = prefetch;
+    options.common_samples = common_stations;
+    options.station_stats = station_stats || station_stats_by_lead;
+    options.station_stats_by_lead = station_stats_by_lead;
+    options.station_blacklist = station_blacklist;
+    options.state_dir = state_dir;
+    options.shard_index = shard_index;
+    options.shard_count = shard_count;
+    options.shard_by_time = shard_by_time;
+
+    MetricNames names;
+    MetricResults results;
+    std::vector<std::pair<std::string, MetricTable>> tables;
+    {
+        py::gil_scoped_release release;
+        std::ostream quiet(nullptr);
+        run_verification(options, verbose ? std::cout : quiet, names, results);
+        tables = metric_tables(names, results);
+    }
+    py::dict out;
+    for (auto& [stem, columns] : tables) out[py::str(stem)] = Table(std::move(columns));
+    return out;
+}
+
+} // namespace
+
+PYBIND11_MODULE(obsver_engine, m) {
+    m.doc() = "In-process access to the verify_cpp_parallel verification engine";
+
+    py::class_<Table>(m, "Table", "Result table exported through the Arrow PyCapsule interface")
+        .def("__arrow_c_stream__", &Table::arrow_c_stream, py::arg("requested_schema") = py::none())
+        .def_property_readonly("column_names", &Table::column_names)
+        .def_property_readonly("num_rows", &Table::num_rows)
+        .def("__len__", &Table::num_rows);
+
+    m.def("verify", &verify,
+          "Verifies like verify_cpp_parallel and returns its tables by file stem (surface_metrics, temp_metrics,\n"
+          "precip_contingency when PE windows are verified, station_metrics with station_stats). Empty variable\n"
+          "and threshold lists select the engine defaults. Raises RuntimeError when there is nothing to verify.",
+          py::arg("start"), py::arg("end"), py::arg("fcint"), py::arg("vobs_dir"), py::arg("experiment_dirs"),
+          py::kw_only(),
+          py::arg("surface_variables") = std::vector<std::string>(),
+          py::arg("temp_variables") = std::vector<std::string>(),
+          py::arg("precip_thresholds") = std::vector<double>(),
+          py::arg("cache_dir") = "", py::arg("stream") = false, py::arg("prefetch") = 1,
+          py::arg("common_stations") = false, py::arg("station_stats") = false,
+          py::arg("station_stats_by_lead") = false, py::arg("station_blacklist") = "", py::arg("state_dir") = "",
+          py::arg("shard_index") = 1, py::arg("shard_count") = 1, py::arg("shard_by_time") = false,
+          py::arg("verbose") = false);
+    m.attr("parquet_available") = parquet_available();
+}
@@ -1,4 +1,6 @@
-import argparse, os, sqlite3, duckdb, polars as pl
+import argparse, hashlib, os, sqlite3, duckdb, polars as pl
+
+from .shard import SHARD_BY, parse_shard, shard_files, shard_metadata
 
 REQUIRED_COLUMNS = {"fcst_dttm","valid_dttm","SID","parameter","level","lon","lat"}
 
@@ -42,8 +44,45 @@ def pick_table(tables, requested):
         return low[rl]
     return None  # do NOT auto-substitute arbitrary single table (avoid wrong data)
 
-def insert_keys_from_table(con, file_path, table_name, round_dec, start_date, end_date, debug=False):
-    con.execute(f"ATTACH '{file_path}' AS db1 (TYPE SQLITE);")
+def key_select_sql(table_name, round_dec, where_sql="", with_valid_time=False):
+    extra = ", valid_dttm" if with_valid_time else ""
+    return f"""
+        SELECT DISTINCT
+            CAST(hash(
+                CAST(fcst_dttm AS BIGINT),
+                CAST(valid_dttm AS BIGINT),
+                SID,
+                parameter,
+                level,
+                CAST(ROUND(lon * POW(10,{round_dec})) AS BIGINT),
+                CAST(ROUND(lat * POW(10,{round_dec})) AS BIGINT)
+            ) AS HUGEINT) AS obs_key{extra}
+        FROM db1."{table_name}"
+        {where_sql}
+    """
+
+def cached_keys(con, file_path, table_name, round_dec, cache_dir):
+    """
+    Parquet file with the keys (and valid_dttm) of a whole SQLite file, keyed by the
+    file's path, size and mtime, so reruns only read new or changed files and any
+    --start/--end window can be applied to it.
+    """
+    st = os.stat(file_path)
+    tag = f"{os.path.abspath(file_path)}:{st.st_size}:{st.st_mtime_ns}:{table_name}:{round_dec}"
+    path = os.path.join(cache_dir, f"common_keys_{hashlib.sha256(tag.encode()).hexdigest()}.parquet")
+    if not os.path.exists(path):
+        con.execute(f"ATTACH '{file_path}' AS db1 (TYPE SQLITE);")
+        try:
+            keys = con.execute(key_select_sql(table_name, round_dec, with_valid_time=True)).pl()
+        finally:
+            con.execute("DETACH db1;")
+        tmp = f"{path}.{os.getpid()}.tmp"
+        keys.write_parquet(tmp)
+        os.replace(tmp, path)
+    return path
+
+def insert_keys_from_table(con, file_path, table_name, round_dec, start_date, end_date, debug=False,
+                           cache_dir=None):
     if debug:
         print(f"[debug] Inserting keys from {file_path} table {table_name}")
 
@@ -55,21 +94,17 @@ def insert_keys_from_table(con, file_path, table_name, round_dec, start_date, en
         where_clauses.append(f"valid_dttm <= '{end_date}'")
     where_sql = f"WHERE {' AND '.join(where_clauses)}" if where_clauses else ""
 
-    con.execute(f"""
-        INSERT INTO work_keys
-        SELECT DISTINCT
-            CAST(hash(
-                CAST(fcst_dttm AS BIGINT),
-                CAST(valid_dttm AS BIGINT),
-                SID,
-                parameter,
-                level,
-                CAST(ROUND(lon * POW(10,{round_dec})) AS BIGINT),
-                CAST(ROUND(lat * POW(10,{round_dec})) AS BIGINT)
-            ) AS HUGEINT) AS obs_key
-        FROM db1."{table_name}"
-        {where_sql};
-    """)
+    if cache_dir:
+        path = cached_keys(con, file_path, table_name, round_dec, cache_dir)
+        con.execute(f"""
+            INSERT INTO work_keys
+            SELECT DISTINCT CAST(obs_key AS HUGEINT) FROM read_parquet('{path}')
+            {where_sql};
+        """)
+        return
+
+    con.execute(f"ATTACH '{file_path}' AS db1 (TYPE SQLITE);")
+    con.execute(f"INSERT INTO work_keys {key_select_sql(table_name, round_dec, where_sql)};")
     con.execute("DETACH db1;")
 
 def main():
@@ -83,7 +118,15 @@ def main():
     ap.add_argument("--debug", action="store_true")
     ap.add_argument("--strict-missing", action="store_true",
                     help="Abort if any SQLite file lacks the requested table or required columns.")
+    ap.add_argument("--cache-dir", help="Cache of per-file keys; reruns only read new or changed files.")
+    ap.add_argument("--shard", type=parse_shard,
+                    help="i/N: read only the files of shard i of N and write the keys of each experiment "
+                         "(experiment, obs_key) for merge.py.")
+    ap.add_argument("--shard-by", choices=SHARD_BY, default="hash",
+                    help="Assign files to shards by a hash of their path or by time range (default: hash).")
     args = ap.parse_args()
+    if args.cache_dir:
+        os.makedirs(args.cache_dir, exist_ok=True)
 
     if not args.exp:
         raise SystemExit("Provide at least one --exp EXP_NAME DATA_ROOT pair")
@@ -96,12 +139,12 @@ def main():
     for exp_name, root in args.exp:
         exp_names.append(exp_name)
         print(f"Collecting keys for {exp_name} ...")
-        any_file = False
         used_files = 0
         skipped_no_table = 0
         skipped_cols = 0
-        for f in find_sqlites(root, args.obstypevar):
-            any_file = True
+        files = sorted(find_sqlites(root, args.obstypevar))
+        any_file = bool(files)
+        for f in shard_files(files, root, args.shard, args.shard_by):
             tables, cols = inspect_sqlite(f)
             if not tables:
                 skipped_no_table += 1
@@ -126,7 +169,8 @@ def main():
                 continue
             # Attach + insert
             try:
-                insert_keys_from_table(con, f, chosen, args.round_dec, args.start, args.end, args.debug)
+                insert_keys_from_table(con, f, chosen, args.round_dec, args.start, args.end, args.debug,
+                                       args.cache_dir)
                 used_files += 1
             except Exception as e:
                 skipped_cols += 1
@@ -147,6 +191,13 @@ def main():
         print(f"{exp_name}: files used={used_files}, skipped_no_table={skipped_no_table}, skipped_bad_columns={skipped_cols}")
 
     exp_tables = [f"ks_{n}" for n in exp_names]
+    if args.shard:
+        # Keys of each experiment; merge.py intersects the union over all shards
+        union = " UNION ALL ".join([f"SELECT '{n}' AS experiment, obs_key FROM ks_{n}" for n in exp_names])
+        df = con.execute(union).pl()
+        df.write_parquet(args.out, metadata=shard_metadata(args.shard))
+        print(f"Wrote {len(df)} keys of shard {args.shard[0]}/{args.shard[1]} to {args.out}")
+        return
     if len(exp_tables) == 1:
         con.execute(f"CREATE TABLE common AS SELECT obs_key FROM {exp_tables[0]};")
     else:
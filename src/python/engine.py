@@ -0,0 +1,173 @@
+"""
+In-process verification with the C++ engine of verify_cpp_parallel.
+
+The engine is loaded from the obsver_engine extension module (make -C src/cpp python)
+and its result tables become Polars frames through the Arrow C stream interface:
+numeric columns share the engine's buffers and nothing goes through CSV files.
+Variable lists and precipitation thresholds are arguments here, not the
+SURFPAR_MONITOR/TEMPPAR_MONITOR/PRECIP_THRESHOLDS_MONITOR variables the
+executable reads.
+"""
+import argparse
+import importlib
+import os
+import sys
+from typing import Dict, Optional, Sequence, Tuple
+
+import polars as pl
+
+from . import plot_cube
+from .shard import SHARD_BY, parse_shard, write_marker
+
+# Build directory of the extension module
+CPP_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "cpp"))
+# Output names of the engine, as written by verify_cpp_parallel
+TABLES = ["surface_metrics", "temp_metrics", "precip_contingency", "station_metrics"]
+# Float columns of the engine's tables; their type must not depend on the values of a CSV file
+FLOAT_COLUMNS = ["bias", "rmse", "mae", "error_sd", "fcst_mean", "obs_mean", "fcst_sd", "obs_sd", "corr",
+                 "pressure_level", "lat", "lon", "hgt", "threshold"]
+
+
+def load_extension():
+    """Import obsver_engine, from src/cpp when it is not installed elsewhere."""
+    try:
+        return importlib.import_module("obsver_engine")
+    except ImportError:
+        pass
+    if CPP_DIR not in sys.path:
+        sys.path.append(CPP_DIR)
+    try:
+        return importlib.import_module("obsver_engine")
+    except ImportError as e:
+        raise ImportError("obsver_engine is not built; run `make -C src/cpp python` (needs pybind11).") from e
+
+
+def run(start: int, end: int, fcint: int, vobs_dir: str, experiment_dirs: Sequence[str], *,
+        surface_variables: Optional[Sequence[str]] = None,
+        temp_variables: Optional[Sequence[str]] = None,
+        precip_thresholds: Optional[Sequence[float]] = None,
+        cache_dir: Optional[str] = None,
+        stream: bool = False,
+        prefetch: int = 1,
+        common_stations: bool = False,
+        station_stats: bool = False,
+        station_stats_by_lead: bool = False,
+        station_blacklist: Optional[str] = None,
+        state_dir: Optional[str] = None,
+        shard: Optional[Tuple[int, int]] = None,
+        shard_by: str = "hash",
+        verbose: bool = False) -> Dict[str, pl.DataFrame]:
+    """
+    Verify like verify_cpp_parallel and return its tables by output name, with
+    the columns and types of its metrics files. precip_contingency is present
+    when PE windows are verified, station_metrics with station_stats(_by_lead).
+    None selects the engine defaults for variables and thresholds; as with
+    SURFPAR_MONITOR, a surface list also selects the PE windows to verify.
+    shard (i, N) verifies only the valid times of shard i (merge.py combines shards).
+    Raises RuntimeError when there is nothing to verify.
+    """
+    engine = load_extension()
+    tables = engine.verify(
+        int(start), int(end), int(fcint), vobs_dir, list(experiment_dirs),
+        surface_variables=list(surface_variables or []),
+        temp_variables=list(temp_variables or []),
+        precip_thresholds=[float(t) for t in precip_thresholds or []],
+        cache_dir=cache_dir or "",
+        stream=stream,
+        prefetch=prefetch,
+        common_stations=common_stations,
+        station_stats=station_stats,
+        station_stats_by_lead=station_stats_by_lead,
+        station_blacklist=station_blacklist or "",
+        state_dir=state_dir or "",
+        shard_index=shard[0] if shard else 1,
+        shard_count=shard[1] if shard else 1,
+        shard_by_time=shard_by == "time",
+        verbose=verbose,
+    )
+    return {name: pl.DataFrame(table) for name, table in tables.items()}
+
+
+def read_csv_table(path: str) -> pl.DataFrame:
+    """An engine table from a CSV output of verify_cpp_parallel, with Float64 float columns."""
+    with open(path, "r", encoding="utf-8") as f:
+        header = f.readline().strip().split(",")
+    return pl.read_csv(path, schema_overrides={c: pl.Float64 for c in FLOAT_COLUMNS if c in header})
+
+
+def write_tables(tables: Dict[str, pl.DataFrame], outdir: str, shard: Optional[Tuple[int, int]] = None) -> None:
+    """
+    Write <name>.parquet files into outdir, replacing the outputs of a previous run.
+    The tables of shard (i, N) are marked as such for merge.py.
+    """
+    os.makedirs(outdir, exist_ok=True)
+    write_marker(outdir, None)
+    for name in TABLES:
+        for ext in (".csv", ".parquet"):
+            path = os.path.join(outdir, name + ext)
+            if os.path.exists(path):
+                os.remove(path)
+    for name, df in tables.items():
+        path = os.path.join(outdir, f"{name}.parquet")
+        df.write_parquet(path)
+        print(f"Saving {name.replace('_', ' ')} to {path} (rows={df.height})")
+    write_marker(outdir, shard)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Run the C++ verification engine in-process and write its metrics and plot cubes.")
+    parser.add_argument("start", type=int, help="Start date (YYYYMMDDHH).")
+    parser.add_argument("end", type=int, help="End date (YYYYMMDDHH).")
+    parser.add_argument("fcint", type=int, help="Forecast start time interval in hours.")
+    parser.add_argument("vobs_dir", help="vobs directory.")
+    parser.add_argument("experiment_dirs", nargs="+", help="vfld directory of each experiment.")
+    parser.add_argument("--outdir", help="Directory for the metrics Parquet files (default: not written).")
+    parser.add_argument("--cube", help="Surface plot cube to build from the surface metrics (plot_cube.py).")
+    parser.add_argument("--temp-cube", help="Temp plot cube to build from the temp metrics.")
+    parser.add_argument("--surfpar", nargs="+", help="Surface variables incl. PE windows (default: engine defaults).")
+    parser.add_argument("--temppar", nargs="+", help="Upper-air variables (default: engine defaults).")
+    parser.add_argument("--thresholds", nargs="+", type=float, help="Precipitation thresholds in mm.")
+    parser.add_argument("--cache-dir", help="Parse cache directory.")
+    parser.add_argument("--state-dir", help="Per valid time checkpoint directory.")
+    parser.add_argument("--stream", action="store_true", help="Stream vobs files by forecast run.")
+    parser.add_argument("--prefetch", type=int, default=1, help="Batches of vobs read ahead when streaming.")
+    parser.add_argument("--common-stations", action="store_true",
+                        help="Verify only samples that every experiment has.")
+    parser.add_argument("--station-stats", action="store_true", help="Also compute per-station metrics.")
+    parser.add_argument("--station-stats-by-lead", action="store_true",
+                        help="Per-station metrics per lead time.")
+    parser.add_argument("--station-blacklist", help="File of station ids to skip.")
+    parser.add_argument("--shard", type=parse_shard, help="i/N: verify only the valid times of shard i of N.")
+    parser.add_argument("--shard-by", choices=SHARD_BY, default="hash",
+                        help="Assign valid times to shards by hash or by time range (default: hash).")
+    parser.add_argument("--quiet", action="store_true", help="Do not print the engine's progress.")
+    args = parser.parse_args()
+
+    try:
+        tables = run(args.start, args.end, args.fcint, args.vobs_dir, args.experiment_dirs,
+                     surface_variables=args.surfpar, temp_variables=args.temppar,
+                     precip_thresholds=args.thresholds, cache_dir=args.cache_dir, stream=args.stream,
+                     prefetch=args.prefetch, common_stations=args.common_stations,
+                     station_stats=args.station_stats, station_stats_by_lead=args.station_stats_by_lead,
+                     station_blacklist=args.station_blacklist, state_dir=args.state_dir,
+                     shard=args.shard, shard_by=args.shard_by, verbose=not args.quiet)
+    except RuntimeError as e:
+        print(f"Verification failed: {e}")
+        sys.exit(1)
+
+    if args.outdir:
+        write_tables(tables, args.outdir, args.shard)
+    for name, out in (("surface_metrics", args.cube), ("temp_metrics", args.temp_cube)):
+        if not out:
+            continue
+        df = tables.get(name)
+        if df is None or df.is_empty():
+            print(f"No {name.replace('_', ' ')}; no cube written to {out}.")
+            continue
+        plot_cube.build_cube(df).write_parquet(out)
+        print(f"Plot cube saved to {out}")
+
+
+if __name__ == "__main__":
+    main()
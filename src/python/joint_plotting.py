@@ -6,12 +6,25 @@ from typing import Dict, List, Optional, Iterable, Tuple
 import polars as pl
 import matplotlib.pyplot as plt
 
+from . import plot_cube
+from .plot_cache import PlotCache, style_salt
+
 BRACKET_MIDPOINTS: Dict[str, int] = {
     "1050-950": 1000, "950-850": 900, "850-750": 800, "750-650": 700,
     "650-550": 600, "550-450": 500, "450-350": 400, "350-250": 300,
     "250-150": 200, "150-0": 75
 }
 
+RC_PARAMS = {
+    "font.size": 16,
+    "axes.titlesize": 18,
+    "axes.labelsize": 15,
+    "xtick.labelsize": 13,
+    "ytick.labelsize": 13,
+    "legend.fontsize": 13,
+    "figure.titlesize": 20,
+}
+
 METRIC_STYLES = {
     "rmse": {"linestyle": "--", "label": "RMSE", "marker": "o"},
     "bias": {"linestyle": "-", "label": "Bias", "marker": "s"},
@@ -20,6 +33,8 @@ METRIC_STYLES = {
 # ---------------- Aggregations ---------------- #
 
 def _aggregate(df: pl.DataFrame, group_cols: List[str]) -> pl.DataFrame:
+    if plot_cube.is_cube(df):
+        return plot_cube.aggregate_view(df, group_cols[0])
     needed = {"experiment", *group_cols, "bias", "rmse", "n"}
     missing = needed - set(df.columns)
     if missing:
@@ -35,7 +50,7 @@ def _aggregate(df: pl.DataFrame, group_cols: List[str]) -> pl.DataFrame:
 
 # ---------------- Utilities ---------------- #
 
-def _parse_mapping(specs: Optional[Iterable[str]], label: str) -> Dict[str, str]:
+def parse_mapping(specs: Optional[Iterable[str]], label: str) -> Dict[str, str]:
     out: Dict[str, str] = {}
     if not specs:
         return out
@@ -112,8 +127,9 @@ def plot_profiles_pressure(df: pl.DataFrame,
                            start_date: Optional[str],
                            end_date: Optional[str],
                            cycle_hours: List[int],
-                           hours: Optional[List[str]]) -> None:
-    if "pressure_bracket" not in df.columns:
+                           hours: Optional[List[str]],
+                           cache: Optional[PlotCache] = None) -> None:
+    if not plot_cube.has_view(df, "pressure_bracket"):
         return
     mapping_df = pl.DataFrame({
         "pressure_bracket": list(BRACKET_MIDPOINTS.keys()),
@@ -125,28 +141,37 @@ def plot_profiles_pressure(df: pl.DataFrame,
            .agg(pl.sum("n_sum").alias("n_all"))
            .sort("pressure_midpoint")
     )
+    experiments = sorted(agg["experiment"].unique())
+    title = _build_title(prefix, "Vertical Profiles", start_date, end_date, cycle_hours, hours)
+    out_path = os.path.join(outdir, f"{prefix}_profile{lead_time_tag}.png")
+    digest = None
+    if cache is not None:
+        digest = cache.digest("profile_pressure", agg, counts, experiments, exp_colors, exp_names, title)
+        if cache.is_current(out_path, digest):
+            print(f"Unchanged plot: {out_path}")
+            return
     fig, ax = plt.subplots(figsize=(12, 8))
     plt.subplots_adjust(right=0.72)
     ax2 = ax.twiny()
     ax2.barh(counts["pressure_midpoint"], counts["n_all"], color="gray", alpha=0.15, height=60)
     ax2.set_xlabel("Count")
-    experiments = sorted(agg["experiment"].unique())
     handles = _plot_metric_lines(ax, agg, x_col="rmse", y_col="pressure_midpoint",
                                  experiments=experiments,
                                  exp_colors=exp_colors,
                                  exp_names=exp_names,
                                  invert_y=True)
     ax.axvline(0, color="black", linewidth=1)
-    ax.set_title(_build_title(prefix, "Vertical Profiles", start_date, end_date, cycle_hours, hours))
+    ax.set_title(title)
     ax.set_xlabel("Value")
     ax.set_ylabel("Pressure (hPa)")
     ax.set_yticks(list(BRACKET_MIDPOINTS.values()))
     ax.set_yticklabels(list(BRACKET_MIDPOINTS.keys()))
     ax.grid(True, linestyle="--", linewidth=0.5, alpha=0.7)
     ax.legend(handles=handles, loc="center left", bbox_to_anchor=(1.02, 0.5), frameon=True)
-    out_path = os.path.join(outdir, f"{prefix}_profile{lead_time_tag}.png")
     fig.savefig(out_path, bbox_inches="tight")
     plt.close(fig)
+    if cache is not None:
+        cache.record(out_path, digest)
     print(f"Saved plot: {out_path}")
 
 def plot_profiles_channel(df: pl.DataFrame,
@@ -158,8 +183,9 @@ def plot_profiles_channel(df: pl.DataFrame,
                           start_date: Optional[str],
                           end_date: Optional[str],
                           cycle_hours: List[int],
-                          hours: Optional[List[str]]) -> None:
-    if "channel" not in df.columns:
+                          hours: Optional[List[str]],
+                          cache: Optional[PlotCache] = None) -> None:
+    if not plot_cube.has_view(df, "channel"):
         return
     agg = _aggregate(df, ["channel"])
     counts = (
@@ -167,26 +193,35 @@ def plot_profiles_channel(df: pl.DataFrame,
            .agg(pl.sum("n_sum").alias("n_all"))
            .sort("channel")
     )
+    experiments = sorted(agg["experiment"].unique())
+    title = _build_title(prefix, "Vertical Profiles", start_date, end_date, cycle_hours, hours)
+    out_path = os.path.join(outdir, f"{prefix}_profile{lead_time_tag}.png")
+    digest = None
+    if cache is not None:
+        digest = cache.digest("profile_channel", agg, counts, experiments, exp_colors, exp_names, title)
+        if cache.is_current(out_path, digest):
+            print(f"Unchanged plot: {out_path}")
+            return
     fig, ax = plt.subplots(figsize=(12, 8))
     plt.subplots_adjust(right=0.72)
     ax2 = ax.twiny()
     ax2.barh(counts["channel"], counts["n_all"], color="gray", alpha=0.15, height=0.8)
     ax2.set_xlabel("Count")
-    experiments = sorted(agg["experiment"].unique())
     handles = _plot_metric_lines(ax, agg, x_col="rmse", y_col="channel",
                                  experiments=experiments,
                                  exp_colors=exp_colors,
                                  exp_names=exp_names)
     ax.axvline(0, color="black", linewidth=1)
-    ax.set_title(_build_title(prefix, "Vertical Profiles", start_date, end_date, cycle_hours, hours))
+    ax.set_title(title)
     ax.set_xlabel("Value")
     ax.set_ylabel("Channel")
     ax.set_yticks(counts["channel"].to_list())
     ax.grid(True, linestyle="--", linewidth=0.5, alpha=0.7)
     ax.legend(handles=handles, loc="center left", bbox_to_anchor=(1.02, 0.5), frameon=True)
-    out_path = os.path.join(outdir, f"{prefix}_profile{lead_time_tag}.png")
     fig.savefig(out_path, bbox_inches="tight")
     plt.close(fig)
+    if cache is not None:
+        cache.record(out_path, digest)
     print(f"Saved plot: {out_path}")
 
 def plot_timeseries(df: pl.DataFrame,
@@ -198,8 +233,9 @@ def plot_timeseries(df: pl.DataFrame,
                     start_date: Optional[str],
                     end_date: Optional[str],
                     cycle_hours: List[int],
-                    hours: Optional[List[str]]) -> None:
-    if "vt_hour" not in df.columns:
+                    hours: Optional[List[str]],
+                    cache: Optional[PlotCache] = None) -> None:
+    if not plot_cube.has_view(df, "vt_hour"):
         return
     agg = _aggregate(df, ["vt_hour"]).sort("vt_hour")
     counts = (
@@ -207,12 +243,20 @@ def plot_timeseries(df: pl.DataFrame,
            .agg(pl.sum("n_sum").alias("n_all"))
            .sort("vt_hour")
     )
+    experiments = sorted(agg["experiment"].unique())
+    title = _build_title(prefix, "Time Series", start_date, end_date, cycle_hours, hours)
+    out_path = os.path.join(outdir, f"{prefix}_timeseries{lead_time_tag}.png")
+    digest = None
+    if cache is not None:
+        digest = cache.digest("timeseries", agg, counts, experiments, exp_colors, exp_names, title)
+        if cache.is_current(out_path, digest):
+            print(f"Unchanged plot: {out_path}")
+            return
     fig, ax = plt.subplots(figsize=(14, 8))
     plt.subplots_adjust(right=0.72)
     ax2 = ax.twinx()
     ax2.bar(counts["vt_hour"], counts["n_all"], color="gray", alpha=0.12, width=0.8)
     ax2.set_ylabel("Count")
-    experiments = sorted(agg["experiment"].unique())
     handles: List = []
     for metric in ("rmse", "bias"):
         style = METRIC_STYLES[metric]
@@ -231,23 +275,26 @@ def plot_timeseries(df: pl.DataFrame,
             )
             handles.append(h)
     ax.axhline(0, color="black", linewidth=1)
-    ax.set_title(_build_title(prefix, "Time Series", start_date, end_date, cycle_hours, hours))
+    ax.set_title(title)
     ax.set_xlabel("Valid Time")
     ax.set_ylabel("Value")
     ax.tick_params(axis="x", rotation=45)
     ax.grid(True, linestyle="--", linewidth=0.5, alpha=0.7)
     ax.legend(handles=handles, loc="center left", bbox_to_anchor=(1.02, 0.5), frameon=True)
-    out_path = os.path.join(outdir, f"{prefix}_timeseries{lead_time_tag}.png")
     fig.savefig(out_path, bbox_inches="tight")
     plt.close(fig)
+    if cache is not None:
+        cache.record(out_path, digest)
     print(f"Saved plot: {out_path}")
 
 # ---------------- Main ---------------- #
 
 def main() -> None:
     parser = argparse.ArgumentParser(description="Joint plotting for multiple experiments.")
-    parser.add_argument("--metrics", nargs="+", required=True,
+    parser.add_argument("--metrics", nargs="+",
                         help="Metrics parquet files (one or more, any experiments).")
+    parser.add_argument("--cube", help="Pre-aggregated plot cube (plot_cube.py); used instead of --metrics.")
+    parser.add_argument("--obstypevar", help="Filter: obstypevar to plot from a multi-variable cube.")
     parser.add_argument("--outdir", required=True, help="Output directory.")
     parser.add_argument("--title-prefix", required=True, help="Title / filename prefix.")
     parser.add_argument("--lead-time", type=int, help="Filter: specific lead_time.")
@@ -261,25 +308,21 @@ def main() -> None:
                         help="(Deprecated) Forecast cycle interval; ignored.")
     parser.add_argument("--hours", nargs="+",
                         help="Filter: list of valid-time hours (integers).")
+    parser.add_argument("--no-plot-cache", action="store_true",
+                        help="Always re-render; do not consult or update the plot cache index.")
     args = parser.parse_args()
+    if not args.metrics and not args.cube:
+        parser.error("one of --metrics or --cube is required")
     os.makedirs(args.outdir, exist_ok=True)
 
     if args.fcint is not None:
         print("NOTE: --fcint is deprecated and ignored (no effect on plots).")
 
-    plt.rcParams.update({
-        "font.size": 16,
-        "axes.titlesize": 18,
-        "axes.labelsize": 15,
-        "xtick.labelsize": 13,
-        "ytick.labelsize": 13,
-        "legend.fontsize": 13,
-        "figure.titlesize": 20,
-    })
+    plt.rcParams.update(RC_PARAMS)
 
     # Load
     dfs: List[pl.DataFrame] = []
-    for path in args.metrics:
+    for path in [args.cube] if args.cube else args.metrics:
         if not os.path.exists(path):
             print(f"Missing metrics file: {path}")
             continue
@@ -298,12 +341,22 @@ def main() -> None:
     all_df = pl.concat(dfs, how="vertical_relaxed")
 
     # Optional filtering
-    if args.lead_time is not None and "lead_time" in all_df.columns:
-        all_df = all_df.filter(pl.col("lead_time") == args.lead_time)
+    if args.obstypevar and "obstypevar" in all_df.columns:
+        all_df = all_df.filter(pl.col("obstypevar") == args.obstypevar)
+
+    if plot_cube.is_cube(all_df):
+        all_df = plot_cube.filter_cube(
+            all_df,
+            lead_times=[args.lead_time] if args.lead_time is not None else None,
+            hours=args.hours or None,
+        )
+    else:
+        if args.lead_time is not None and "lead_time" in all_df.columns:
+            all_df = all_df.filter(pl.col("lead_time") == args.lead_time)
 
-    if args.hours and "vt_hour" in all_df.columns and all_df["vt_hour"].dtype.is_temporal():
-        want_hours = {int(h) for h in args.hours}
-        all_df = all_df.filter(pl.col("vt_hour").dt.hour().is_in(sorted(want_hours)))
+        if args.hours and "vt_hour" in all_df.columns and all_df["vt_hour"].dtype.is_temporal():
+            want_hours = {int(h) for h in args.hours}
+            all_df = all_df.filter(pl.col("vt_hour").dt.hour().is_in(sorted(want_hours)))
 
     if all_df.is_empty():
         print("All data removed after filtering; aborting.")
@@ -323,26 +376,30 @@ def main() -> None:
 
     # Experiment sets
     experiments = sorted(all_df["experiment"].unique().to_list())
-    exp_names_map = _parse_mapping(args.exp_name, "exp-name")
-    exp_color_map = _ensure_colors(experiments, _parse_mapping(args.exp_color, "exp-color"))
+    exp_names_map = parse_mapping(args.exp_name, "exp-name")
+    exp_color_map = _ensure_colors(experiments, parse_mapping(args.exp_color, "exp-color"))
 
     lead_time_tag = f"_lt_{args.lead_time}" if args.lead_time is not None else ""
+    cache = PlotCache(args.outdir, f"joint_plotting_{args.title_prefix}{lead_time_tag}",
+                      salt=style_salt(args), code_files=[__file__],
+                      enabled=not args.no_plot_cache)
 
     # Plot (channel vs pressure profile selection)
-    if "channel" in all_df.columns:
+    if plot_cube.has_view(all_df, "channel"):
         plot_profiles_channel(all_df, args.outdir, args.title_prefix,
                               exp_color_map, exp_names_map, lead_time_tag,
-                              start_date, end_date, cycle_hours, args.hours)
-    elif "pressure_bracket" in all_df.columns:
+                              start_date, end_date, cycle_hours, args.hours, cache)
+    elif plot_cube.has_view(all_df, "pressure_bracket"):
         plot_profiles_pressure(all_df, args.outdir, args.title_prefix,
                                exp_color_map, exp_names_map, lead_time_tag,
-                               start_date, end_date, cycle_hours, args.hours)
+                               start_date, end_date, cycle_hours, args.hours, cache)
     else:
         print("No profile dimension (channel/pressure_bracket) found: skipping profile plot.")
 
     plot_timeseries(all_df, args.outdir, args.title_prefix,
                     exp_color_map, exp_names_map, lead_time_tag,
-                    start_date, end_date, cycle_hours, args.hours)
+                    start_date, end_date, cycle_hours, args.hours, cache)
+    cache.close()
 
 if __name__ == "__main__":
     main()
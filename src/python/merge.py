@@ -0,0 +1,136 @@
+"""
+Combines the outputs of a sharded run (--shard i/N) into the outputs of one run.
+
+- metrics: verify.py shard files. Their rows are per-file aggregates, so the
+  merged file is their concatenation (in the order given).
+- keys: build_common_keys.py shard files with the keys of each experiment. The
+  common keys are the intersection over experiments of each experiment's union
+  over all shards.
+- engine: verify_cpp_parallel / engine.py output directories. Every row belongs
+  to one valid time and each valid time to one shard, so the tables are the
+  shards' rows in the engine's output order; --cube/--temp-cube build the plot
+  cubes that scorecard.py and the plotting scripts read.
+
+The inputs must be exactly shards 1..N of one N, each once (as recorded in the
+shard outputs); a missing, failed or repeated shard is an error.
+"""
+import argparse
+import os
+import sys
+from typing import Dict, Optional, Sequence
+
+import polars as pl
+
+from . import plot_cube
+from .engine import TABLES, read_csv_table, write_tables
+from .shard import check_complete
+
+KINDS = ["metrics", "keys", "engine"]
+# Output order of verify_cpp_parallel; rows of one cell keep their order
+ENGINE_ORDER = ["experiment", "lead_time", "vt_hour"]
+
+
+def merge_metrics(paths: Sequence[str]) -> pl.DataFrame:
+    """Rows of all verify.py shard files; empty shards are skipped."""
+    frames = []
+    for path in paths:
+        df = pl.read_parquet(path)
+        if not df.is_empty():
+            frames.append(df)
+    if not frames:
+        return pl.DataFrame()
+    return pl.concat(frames, how="vertical_relaxed")
+
+
+def merge_keys(paths: Sequence[str]) -> pl.DataFrame:
+    """Common obs_key of build_common_keys.py shard files (columns experiment, obs_key)."""
+    frames = [pl.read_parquet(path) for path in paths]
+    frames = [df for df in frames if not df.is_empty()]
+    if not frames:
+        return pl.DataFrame()
+    keys = pl.concat(frames, how="vertical_relaxed")
+    if "experiment" not in keys.columns:
+        raise ValueError("Key files have no experiment column; build them with build_common_keys.py --shard.")
+    common: Optional[pl.DataFrame] = None
+    for _, exp_keys in keys.group_by("experiment", maintain_order=True):
+        exp_keys = exp_keys.select("obs_key").unique()
+        common = exp_keys if common is None else common.join(exp_keys, on="obs_key", how="semi")
+    return common
+
+
+def _read_table(path_stem: str) -> Optional[pl.DataFrame]:
+    for ext, read in ((".parquet", pl.read_parquet), (".csv", read_csv_table)):
+        if os.path.exists(path_stem + ext):
+            return read(path_stem + ext)
+    return None
+
+
+def merge_engine(dirs: Sequence[str]) -> Dict[str, pl.DataFrame]:
+    """Engine tables by name from the shards' output directories (Parquet or CSV)."""
+    tables: Dict[str, pl.DataFrame] = {}
+    for name in TABLES:
+        # Empty shard tables are skipped (a header-only CSV has no column types)
+        frames = [df for df in (_read_table(os.path.join(d, name)) for d in dirs) if df is not None]
+        if len(frames) > 1:
+            frames = [df for df in frames if not df.is_empty()] or frames[:1]
+        if not frames:
+            continue
+        if name == "station_metrics":
+            raise ValueError("Shards have per-station metrics, which cannot be merged; run shards without --station-stats.")
+        df = pl.concat(frames, how="vertical_relaxed")
+        tables[name] = df.sort(ENGINE_ORDER, maintain_order=True)
+    return tables
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Merge the outputs of sharded runs (--shard i/N).")
+    parser.add_argument("kind", choices=KINDS,
+                        help="metrics (verify.py), keys (build_common_keys.py) or engine (verify_cpp_parallel).")
+    parser.add_argument("inputs", nargs="+", help="Shard output files (metrics, keys) or directories (engine).")
+    parser.add_argument("--out", help="Merged Parquet file (metrics, keys).")
+    parser.add_argument("--outdir", help="Directory for the merged engine tables (engine).")
+    parser.add_argument("--cube", help="Surface plot cube to build from the merged surface metrics (engine).")
+    parser.add_argument("--temp-cube", help="Temp plot cube to build from the merged temp metrics (engine).")
+    args = parser.parse_args()
+
+    missing = [p for p in args.inputs if not os.path.exists(p)]
+    if missing:
+        print(f"Error: missing shard output {missing[0]}")
+        sys.exit(1)
+    try:
+        check_complete(args.inputs)
+        if args.kind == "engine":
+            if not args.outdir and not args.cube and not args.temp_cube:
+                parser.error("engine needs --outdir, --cube or --temp-cube")
+            tables = merge_engine(args.inputs)
+            if not tables:
+                print("Error: no engine tables in the shard directories.")
+                sys.exit(1)
+            if args.outdir:
+                write_tables(tables, args.outdir)
+            for name, out in (("surface_metrics", args.cube), ("temp_metrics", args.temp_cube)):
+                if not out:
+                    continue
+                df = tables.get(name)
+                if df is None or df.is_empty():
+                    print(f"No {name.replace('_', ' ')}; no cube written to {out}.")
+                    continue
+                plot_cube.build_cube(df).write_parquet(out)
+                print(f"Plot cube saved to {out}")
+            return
+        if not args.out:
+            parser.error(f"{args.kind} needs --out")
+        df = merge_metrics(args.inputs) if args.kind == "metrics" else merge_keys(args.inputs)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    out_dir = os.path.dirname(args.out)
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+    df.write_parquet(args.out)
+    what = "verification metrics" if args.kind == "metrics" else "common keys"
+    print(f"Merged {len(args.inputs)} shards: {df.height} {what} saved to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
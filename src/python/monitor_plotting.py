@@ -1,17 +1,22 @@
 import argparse
 import os
-import json
 import polars as pl
 import matplotlib.pyplot as plt
-from typing import Dict, Optional
-import matplotlib.ticker as mticker
+from typing import Dict, Optional, Tuple
 
-METRIC_STYLES = {
-    "rmse": {"linestyle": "--", "label": "RMSE"},
-    "bias": {"linestyle": "-", "label": "Bias"}
+from . import plot_cube, plot_templates
+from .plot_cache import PlotCache, style_salt
+from .plot_templates import SeriesFigure, var_label_unit
+
+RC_PARAMS = {
+    'font.size': 18, 'axes.titlesize': 18, 'axes.labelsize': 16,
+    'xtick.labelsize': 12, 'ytick.labelsize': 16, 'legend.fontsize': 16,
+    'figure.titlesize': 20
 }
 
 def _aggregate_by_lead_time(df: pl.DataFrame) -> pl.DataFrame:
+    if plot_cube.is_cube(df):
+        return plot_cube.aggregate_view(df, "lead_time", group=["experiment", "obstypevar"])
     return (df.group_by(["experiment", "lead_time", "obstypevar"])
               .agg([
                   pl.mean("bias").alias("bias"),
@@ -20,6 +25,8 @@ def _aggregate_by_lead_time(df: pl.DataFrame) -> pl.DataFrame:
               ]))
 
 def _aggregate_by_vt_hour(df: pl.DataFrame) -> pl.DataFrame:
+    if plot_cube.is_cube(df):
+        return plot_cube.aggregate_view(df, "vt_hour", group=["experiment", "obstypevar"])
     return (df.group_by(["experiment", "vt_hour", "obstypevar"])
               .agg([
                   pl.mean("bias").alias("bias"),
@@ -27,7 +34,17 @@ def _aggregate_by_vt_hour(df: pl.DataFrame) -> pl.DataFrame:
                   pl.sum("n_samples").alias("n_sum")
               ]))
 
-def plot_series(df: pl.DataFrame, outdir: str, title_prefix: str, exp_colors: Dict[str, str], exp_names: Dict[str, str], x_axis: str, start_date: str, end_date: str, fcint: Optional[int]) -> None: 
+def _partition(agg: pl.DataFrame, x_axis: str) -> Tuple[Dict[str, pl.DataFrame], Dict[Tuple[str, str], pl.DataFrame]]:
+    """Split aggregated metrics once into per-obstypevar counts and per-(obstypevar, experiment) series."""
+    counts = (agg.group_by(["obstypevar", x_axis])
+                 .agg(pl.sum("n_sum").alias("n_all"))
+                 .sort(x_axis))
+    counts_by_ov = {k[0]: v for k, v in counts.partition_by(["obstypevar"], as_dict=True).items()}
+    series = {k: v.sort(x_axis)
+              for k, v in agg.partition_by(["obstypevar", "experiment"], as_dict=True).items()}
+    return counts_by_ov, series
+
+def plot_series(df: pl.DataFrame, outdir: str, title_prefix: str, exp_colors: Dict[str, str], exp_names: Dict[str, str], x_axis: str, start_date: str, end_date: str, fcint: Optional[int], cache: Optional[PlotCache] = None) -> None: 
     if x_axis == "lead_time":
         agg = _aggregate_by_lead_time(df).sort("lead_time")
         x_label = "Lead Time (h)"
@@ -37,98 +54,71 @@ def plot_series(df: pl.DataFrame, outdir: str, title_prefix: str, exp_colors: Di
     else:
         raise ValueError(f"Unknown x_axis: {x_axis}")
 
-    # Load variable display names (surface context for this script)
-    var_name_path = os.path.join(os.path.dirname(__file__), "var_names.json")
-    var_names = {"surface": {}, "upper_air": {}}
-    if os.path.exists(var_name_path):
-        try:
-            with open(var_name_path, "r", encoding="utf-8") as f:
-                var_names = json.load(f)
-        except Exception:
-            pass
-
-    obstypevars = df["obstypevar"].unique().to_list()
-
-    for ov in obstypevars:
-        ov_df = agg.filter(pl.col("obstypevar") == ov)
-        if ov_df.is_empty():
-            continue
-
-        counts = (ov_df.group_by(x_axis)
-                    .agg(pl.sum("n_sum").alias("n_all"))
-                    .sort(x_axis))
-
-        fig, ax = plt.subplots(figsize=(15.0, 10.0))
-        plt.subplots_adjust(right=0.75)
-        ax2 = ax.twinx()
-        ax2.bar(counts[x_axis], counts["n_all"], color="gray", alpha=0.12, width=0.8)
-        ax2.set_ylabel("Count")
+    counts_by_ov, series_by_key = _partition(agg, x_axis)
+    exps_in_order = list(exp_colors.keys())
 
-        line_handles = []
-        exps_in_order = list(exp_colors.keys())
-
-        for exp in exps_in_order:
-            sub = ov_df.filter(pl.col("experiment") == exp).sort(x_axis)
-            if sub.is_empty():
-                continue
-            disp_name = exp_names.get(exp, exp)
-            h_rmse, = ax.plot(sub[x_axis], sub["rmse"], color=exp_colors[exp],
-                              linestyle=METRIC_STYLES["rmse"]["linestyle"], marker="o",
-                              label=f"RMSE {disp_name}")
-            line_handles.append(h_rmse)
-
-        for exp in exps_in_order:
-            sub = ov_df.filter(pl.col("experiment") == exp).sort(x_axis)
-            if sub.is_empty():
+    xticks = None
+    if x_axis == "lead_time":
+        max_lead_time = df["lead_time"].max()
+        if max_lead_time is not None:
+            xticks = range(0, max_lead_time + 1, 3)
+
+    # One figure for all variables; only artist data, labels and legend change per variable.
+    # Built lazily so a run where every plot is cached never creates a figure.
+    template = None
+    try:
+        for ov in df["obstypevar"].unique().to_list():
+            counts = counts_by_ov.get(ov)
+            if counts is None:
                 continue
-            disp_name = exp_names.get(exp, exp)
-            h_bias, = ax.plot(sub[x_axis], sub["bias"], color=exp_colors[exp],
-                              linestyle=METRIC_STYLES["bias"]["linestyle"], marker="s",
-                              label=f"Bias {disp_name}")
-            line_handles.append(h_bias)
-
-        ax.axhline(0, color='black', linestyle='-', linewidth=1)
-        entry = var_names.get("surface", {}).get(ov, ov)
-        if isinstance(entry, dict):
-            label = entry.get("label", ov)
-            unit = entry.get("unit")
-        else:
-            label, unit = entry, None
-        base_title = f"{label} [{unit}]" if unit else label
-        title = base_title
-        if start_date and end_date:
-            title += f"\n{start_date} - {end_date}"
-        
-        if fcint is not None:
-            fcint_hours = ", ".join(f"{h:02d}" for h in range(0, 24, fcint))
-            title += f"\n{fcint_hours} UTC"
-
-        ax.set_title(title)
-        ax.set_xlabel(x_label)
-        # Use variable unit on y-axis when available
-        ax.set_ylabel(unit if unit else "Value")
-
-        if x_axis == "vt_hour":
-            ax.xaxis.set_major_locator(mticker.MaxNLocator(nbins=10))
-        elif x_axis == "lead_time":
-            max_lead_time = df["lead_time"].max()
-            if max_lead_time is not None:
-                ax.set_xticks(range(0, max_lead_time + 1, 3))
-
-        ax.tick_params(axis='x', rotation=45)
-        ax.grid(True, linestyle="--", linewidth=0.5, alpha=0.7)
-        ax.legend(handles=line_handles, loc='center left', bbox_to_anchor=(1.14, 0.5), frameon=True)
-
-        plot_dir = os.path.join(outdir, ov)
-        os.makedirs(plot_dir, exist_ok=True)
-        path = os.path.join(plot_dir, f"{ov}_{x_axis}_series.png")
-        fig.savefig(path, bbox_inches="tight")
-        plt.close(fig)
-        print(f"Saved plot: {path}")
+
+            series = {}
+            for exp in exps_in_order:
+                sub = series_by_key.get((ov, exp))
+                if sub is None or sub.is_empty():
+                    continue
+                series[exp] = (sub[x_axis].to_list(), sub["rmse"].to_list(), sub["bias"].to_list())
+
+            label, unit = var_label_unit("surface", ov)
+            base_title = f"{label} [{unit}]" if unit else label
+            title = base_title
+            if start_date and end_date:
+                title += f"\n{start_date} - {end_date}"
+
+            if fcint is not None:
+                fcint_hours = ", ".join(f"{h:02d}" for h in range(0, 24, fcint))
+                title += f"\n{fcint_hours} UTC"
+
+            plot_dir = os.path.join(outdir, ov)
+            os.makedirs(plot_dir, exist_ok=True)
+            path = os.path.join(plot_dir, f"{ov}_{x_axis}_series.png")
+            digest = None
+            if cache is not None:
+                digest = cache.digest(x_axis, counts, series, title, exps_in_order,
+                                      exp_colors, exp_names, list(xticks) if xticks else None)
+                if cache.is_current(path, digest):
+                    print(f"Unchanged plot: {path}")
+                    continue
+
+            if template is None:
+                template = SeriesFigure(exps_in_order, exp_colors, exp_names, x_label,
+                                        xticks=xticks, categorical=(x_axis == "vt_hour"))
+            # Use variable unit on y-axis when available
+            template.update_series(counts[x_axis].to_list(), counts["n_all"].to_list(), series,
+                                   title, unit if unit else "Value",
+                                   categories=(x_axis == "vt_hour"))
+            template.save(path)
+            if cache is not None:
+                cache.record(path, digest)
+            print(f"Saved plot: {path}")
+    finally:
+        if template is not None:
+            template.close()
 
 def main() -> None: 
     parser = argparse.ArgumentParser(description="Monitor plotting for multiple experiments.")
-    parser.add_argument("--metrics", nargs="+", required=True, help="Metrics parquet files.")
+    parser.add_argument("--metrics", nargs="+", help="Metrics parquet files.")
+    parser.add_argument("--cube", help="Pre-aggregated plot cube (plot_cube.py); used instead of --metrics.")
     parser.add_argument("--outdir", required=True, help="Output directory for plots.")
     parser.add_argument("--title-prefix", required=True, help="Title / filename prefix.")
     parser.add_argument("--exp-color", action="append",
@@ -136,17 +126,17 @@ def main() -> None:
     parser.add_argument("--exp-name", action="append",
                         help="Experiment name mapping LONG_NAME=SHORT_NAME (repeatable).")
     parser.add_argument("--fcint", type=int, help="Forecast interval in hours.")
+    parser.add_argument("--no-plot-cache", action="store_true",
+                        help="Always re-render; do not consult or update the plot cache index.")
     args = parser.parse_args()
+    if not args.metrics and not args.cube:
+        parser.error("one of --metrics or --cube is required")
     os.makedirs(args.outdir, exist_ok=True)
 
-    plt.rcParams.update({
-        'font.size': 18, 'axes.titlesize': 18, 'axes.labelsize': 16,
-        'xtick.labelsize': 12, 'ytick.labelsize': 16, 'legend.fontsize': 16,
-        'figure.titlesize': 20
-    })
+    plt.rcParams.update(RC_PARAMS)
 
     dfs = []
-    for m in args.metrics:
+    for m in [args.cube] if args.cube else args.metrics:
         if not os.path.exists(m):
             print(f"Missing metrics file: {m}")
             continue
@@ -188,8 +178,12 @@ def main() -> None:
         if e not in exp_colors:
             exp_colors[e] = next(default_cycle)
 
-    plot_series(all_df, args.outdir, args.title_prefix, exp_colors, exp_names_map, "lead_time", start_date, end_date, args.fcint)
-    plot_series(all_df, args.outdir, args.title_prefix, exp_colors, exp_names_map, "vt_hour", start_date, end_date, args.fcint)
+    cache = PlotCache(args.outdir, f"monitor_plotting_{args.title_prefix}",
+                      salt=style_salt(args), code_files=[__file__, plot_templates.__file__],
+                      enabled=not args.no_plot_cache)
+    plot_series(all_df, args.outdir, args.title_prefix, exp_colors, exp_names_map, "lead_time", start_date, end_date, args.fcint, cache)
+    plot_series(all_df, args.outdir, args.title_prefix, exp_colors, exp_names_map, "vt_hour", start_date, end_date, args.fcint, cache)
+    cache.close()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,636 @@
+"""
+DAG runner for the monitor and obsver workflows of scr/run_all_monitor.sh and
+scr/run_all_obsver.sh.
+
+The stages of both scripts (common keys, verification, plot cubes, scorecards,
+series export and plots) become steps with declared input and output files.
+A step depends on the steps that produce its inputs. It is skipped when the
+fingerprint of its command, inputs and environment matches the last successful
+run and its outputs still exist. Independent steps run concurrently within a CPU
+and memory budget. Timings, fingerprints and a log file per step are kept in the
+state directory, so a failed run resumes at the failed steps.
+
+The configuration is read from the same Env_exp_* files in scr/ that drive the
+shell scripts; only their variable assignments are used.
+"""
+import argparse
+import datetime as dt
+import glob
+import hashlib
+import json
+import os
+import re
+import shlex
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+import polars as pl
+
+from .engine import TABLES, read_csv_table
+
+PROJECTS = ["monitor", "obsver"]
+# Rough peak memory per step kind in MB, used only to schedule steps within the memory budget
+STEP_MEMORY_MB = {"engine": 8192, "verify": 4096, "keys": 2048, "cube": 2048, "plot": 1024}
+
+_ASSIGNMENT = re.compile(r"^\s*(?:export\s+)?([A-Za-z_][A-Za-z0-9_]*)=(.*)$")
+_VARIABLE = re.compile(r"\$(?:\{([A-Za-z_][A-Za-z0-9_]*)\}|([A-Za-z_][A-Za-z0-9_]*))")
+
+Command = Optional[List[str]]
+
+
+def read_env_file(path: str, base: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+    """
+    Environment of an Env_exp_* file: base (default os.environ) updated with the
+    file's NAME=value and export NAME=value lines in file order, expanding $NAME
+    and ${NAME}. Lines with command substitutions are ignored.
+    """
+    env = dict(os.environ if base is None else base)
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            m = _ASSIGNMENT.match(line)
+            if not m or "$(" in m.group(2) or "`" in m.group(2):
+                continue
+            try:
+                words = shlex.split(m.group(2), comments=True)
+            except ValueError:
+                continue
+            value = " ".join(words)
+            env[m.group(1)] = _VARIABLE.sub(lambda v: env.get(v.group(1) or v.group(2), ""), value)
+    return env
+
+
+def env_get(env: Dict[str, str], name: str, default: str = "") -> str:
+    """${NAME:-default}"""
+    return env.get(name) or default
+
+
+def _python(module: str, *args: str) -> List[str]:
+    return [sys.executable, "-m", f"src.python.{module}", *args]
+
+
+def _source(module: str) -> str:
+    return os.path.join("src", "python", f"{module}.py")
+
+
+class Step:
+    """
+    One node of the pipeline. cmd is the command, or a callable returning it when
+    the step is started (None skips the step). inputs and outputs are files or
+    directories; the step is skipped when an input is missing, not when one of
+    optional_inputs is. after names extra dependencies. post runs after a successful
+    command, expand replaces the step by the steps it returns once its
+    dependencies are done. env_keys are environment variables the step reads,
+    which are part of its fingerprint.
+    """
+
+    def __init__(self, name: str, cmd: Union[Command, Callable[[], Command]] = None, *,
+                 inputs: Sequence[str] = (), optional_inputs: Sequence[str] = (), outputs: Sequence[str] = (),
+                 after: Sequence[str] = (), cpus: int = 1, mem_mb: int = STEP_MEMORY_MB["plot"], env_keys: Sequence[str] = (),
+                 env: Optional[Dict[str, str]] = None, dirs: Sequence[str] = (),
+                 post: Optional[Callable[[], None]] = None,
+                 expand: Optional[Callable[[], List["Step"]]] = None) -> None:
+        self.name = name
+        self.cmd = cmd
+        self.inputs = [os.path.normpath(p) for p in inputs]
+        self.optional_inputs = [os.path.normpath(p) for p in optional_inputs]
+        self.outputs = [os.path.normpath(p) for p in outputs]
+        self.after = list(after)
+        self.cpus = cpus
+        self.mem_mb = mem_mb
+        self.env_keys = list(env_keys)
+        self.env = env or {}
+        self.dirs = list(dirs)
+        self.post = post
+        self.expand = expand
+
+    def command(self) -> Command:
+        return self.cmd() if callable(self.cmd) else self.cmd
+
+
+def _hash_path(h: "hashlib._Hash", path: str) -> None:
+    """Adds size and mtime of a file, or of every file below a directory."""
+    if os.path.isdir(path):
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                _hash_path(h, os.path.join(root, name))
+        return
+    try:
+        st = os.stat(path)
+        h.update(f"{path}\0{st.st_size}\0{st.st_mtime_ns}\n".encode())
+    except OSError:
+        h.update(f"{path}\0missing\n".encode())
+
+
+def fingerprint(step: Step, cmd: List[str], env: Dict[str, str]) -> str:
+    h = hashlib.sha256()
+    h.update(json.dumps([cmd, step.env, {k: env.get(k, "") for k in step.env_keys}], sort_keys=True).encode())
+    for path in sorted(step.inputs + step.optional_inputs):
+        _hash_path(h, path)
+    return h.hexdigest()
+
+
+def available_memory_mb() -> int:
+    """MemAvailable of /proc/meminfo in MB; 0 (no limit) where it cannot be read."""
+    try:
+        with open("/proc/meminfo", "r", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) // 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return 0
+
+
+class Pipeline:
+    """
+    Runs steps in dependency order, at most cpus CPUs and mem_mb MB (0: no limit)
+    at a time. A step that needs more than the budget runs alone.
+    """
+
+    def __init__(self, steps: Sequence[Step], env: Dict[str, str], state_dir: str, cpus: int,
+                 mem_mb: int = 0, force: bool = False) -> None:
+        self.steps: Dict[str, Step] = {}
+        for step in steps:
+            if step.name in self.steps:
+                raise ValueError(f"Duplicate step name: {step.name}")
+            self.steps[step.name] = step
+        self.env = env
+        self.state_dir = state_dir
+        self.state_path = os.path.join(state_dir, "state.json")
+        self.log_dir = os.path.join(state_dir, "logs")
+        self.cpus = max(1, cpus)
+        self.mem_mb = max(0, mem_mb)
+        self.force = force
+        self.state: Dict[str, dict] = {}
+        if os.path.exists(self.state_path):
+            try:
+                with open(self.state_path, "r", encoding="utf-8") as f:
+                    self.state = json.load(f).get("steps", {})
+            except (OSError, ValueError) as e:
+                print(f"Ignoring unreadable pipeline state {self.state_path}: {e}")
+        self.status: Dict[str, str] = {}
+        self.timings: Dict[str, float] = {}
+
+    def dependencies(self, step: Step) -> List[str]:
+        producers = {out: s.name for s in self.steps.values() for out in s.outputs}
+        deps = [producers[p] for p in step.inputs + step.optional_inputs
+                if p in producers and producers[p] != step.name]
+        return list(dict.fromkeys(deps + [d for d in step.after if d in self.steps]))
+
+    def describe(self) -> None:
+        for step in self.steps.values():
+            deps = self.dependencies(step)
+            print(f"{step.name}" + (f"  (after {', '.join(deps)})" if deps else ""))
+            if step.expand:
+                print("    expands into further steps")
+            elif callable(step.cmd):
+                print("    command resolved at run time")
+            elif step.cmd:
+                print(f"    {shlex.join(step.cmd)}")
+
+    def _log_path(self, name: str) -> str:
+        return os.path.join(self.log_dir, re.sub(r"[^A-Za-z0-9_.-]+", "_", name) + ".log")
+
+    def _save_state(self) -> None:
+        os.makedirs(self.state_dir, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.state_dir, prefix=".state_", suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"steps": dict(sorted(self.state.items()))}, f, indent=1)
+        os.replace(tmp, self.state_path)
+
+    def _execute(self, step: Step, cmd: List[str]) -> int:
+        env = dict(self.env)
+        env.update(step.env)
+        with open(self._log_path(step.name), "w", encoding="utf-8") as log:
+            log.write(f"$ {shlex.join(cmd)}\n")
+            log.flush()
+            try:
+                rc = subprocess.run(cmd, env=env, stdout=log, stderr=subprocess.STDOUT).returncode
+                if rc == 0 and step.post:
+                    step.post()
+            except Exception as e:
+                log.write(f"\n{type(e).__name__}: {e}\n")
+                rc = 1
+        return rc
+
+    def _prepare(self, step: Step) -> Tuple[str, Command, str]:
+        """(status, command, fingerprint) of a step whose dependencies are done; status "run" starts it."""
+        cmd = step.command()
+        if not cmd:
+            return "skipped (nothing to do)", None, ""
+        missing = [p for p in step.inputs if not os.path.exists(p)]
+        if missing:
+            return f"skipped (missing input {missing[0]})", None, ""
+        fp = fingerprint(step, cmd, self.env)
+        previous = self.state.get(step.name, {})
+        if (not self.force and previous.get("fingerprint") == fp and previous.get("status") == "done"
+                and all(os.path.exists(p) for p in step.outputs)):
+            return "up to date", None, fp
+        return "run", cmd, fp
+
+    def run(self) -> bool:
+        """Runs the pipeline; False if a step failed."""
+        os.makedirs(self.log_dir, exist_ok=True)
+        pending = list(self.steps)
+        running: Dict[Future, Tuple[Step, str, float]] = {}
+        used_cpus = used_mem = 0
+        start = time.monotonic()
+        with ThreadPoolExecutor(max_workers=max(1, len(self.steps))) as pool:
+            while pending or running:
+                for name in list(pending):
+                    step = self.steps[name]
+                    deps = self.dependencies(step)
+                    if any(d in pending or self.status.get(d) == "running" for d in deps):
+                        continue
+                    blocked = [d for d in deps if self.status.get(d) in ("failed", "blocked")]
+                    if blocked:
+                        pending.remove(name)
+                        self.status[name] = "blocked"
+                        print(f"[blocked] {name} (after failed {blocked[0]})")
+                        continue
+                    if step.expand:
+                        pending.remove(name)
+                        added = step.expand()
+                        for new in added:
+                            if new.name in self.steps:
+                                raise ValueError(f"Duplicate step name: {new.name}")
+                            self.steps[new.name] = new
+                            new.after = list(dict.fromkeys(new.after + deps))
+                            pending.append(new.name)
+                        self.status[name] = "done"
+                        print(f"[expand] {name}: {len(added)} steps")
+                        continue
+                    cpus = min(step.cpus, self.cpus)
+                    fits = (used_cpus + cpus <= self.cpus
+                            and (not self.mem_mb or used_mem + step.mem_mb <= self.mem_mb))
+                    if running and not fits:
+                        break  # in order, so a large step is not starved by smaller ones
+                    pending.remove(name)
+                    status, cmd, fp = self._prepare(step)
+                    if status != "run":
+                        self.status[name] = status
+                        print(f"[{status}] {name}")
+                        continue
+                    for d in step.dirs + [os.path.dirname(p) for p in step.outputs]:
+                        if d:
+                            os.makedirs(d, exist_ok=True)
+                    self.status[name] = "running"
+                    used_cpus += cpus
+                    used_mem += step.mem_mb
+                    print(f"[start] {name}")
+                    running[pool.submit(self._execute, step, cmd)] = (step, fp, time.monotonic())
+                if not running:
+                    if pending:
+                        raise RuntimeError(f"Unresolvable dependencies: {', '.join(pending)}")
+                    break
+                done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in done:
+                    step, fp, t0 = running.pop(future)
+                    used_cpus -= min(step.cpus, self.cpus)
+                    used_mem -= step.mem_mb
+                    seconds = time.monotonic() - t0
+                    self.timings[step.name] = seconds
+                    rc = future.result()
+                    ok = rc == 0
+                    self.status[step.name] = "done" if ok else "failed"
+                    self.state[step.name] = {
+                        "fingerprint": fp if ok else "",
+                        "status": self.status[step.name],
+                        "seconds": round(seconds, 3),
+                        "finished": dt.datetime.now().isoformat(timespec="seconds"),
+                    }
+                    self._save_state()
+                    print(f"[{'done' if ok else 'FAILED'}] {step.name} ({seconds:.1f} s)"
+                          + ("" if ok else f", exit code {rc}, log: {self._log_path(step.name)}"))
+        self._summary(time.monotonic() - start)
+        return not any(s in ("failed", "blocked") for s in self.status.values())
+
+    def _summary(self, total: float) -> None:
+        print("--------------------------------------------------")
+        print(f"Pipeline finished in {total:.1f} s")
+        for name, seconds in sorted(self.timings.items(), key=lambda kv: -kv[1]):
+            print(f"  {seconds:8.1f} s  {self.status[name]:<8}  {name}")
+        counts: Dict[str, int] = {}
+        for status in self.status.values():
+            counts[status] = counts.get(status, 0) + 1
+        print("  " + ", ".join(f"{n} {s}" for s, n in sorted(counts.items())))
+
+
+def _exp_args(exps: List[str], names: List[str], colors: List[str]) -> List[str]:
+    """--exp-color/--exp-name options of the plotting scripts."""
+    args: List[str] = []
+    for i, exp in enumerate(exps):
+        if i < len(colors) and colors[i]:
+            args += ["--exp-color", f"{exp}={colors[i]}"]
+    for i, exp in enumerate(exps):
+        args += ["--exp-name", f"{exp}={names[i] if i < len(names) else exp}"]
+    return args
+
+
+def _csv_to_parquet(workdir: str) -> None:
+    """Parquet copies of the engine's CSV outputs (builds without native Parquet output)."""
+    for name in TABLES:
+        csv, parquet = (os.path.join(workdir, f"{name}{ext}") for ext in (".csv", ".parquet"))
+        if not os.path.exists(parquet) and os.path.exists(csv):
+            read_csv_table(csv).write_parquet(parquet)
+
+
+def rolling_steps(prefix: str, domain: str, metrics: Sequence[str], workdir: str, plots: str, exps: List[str],
+                  names: List[str], fcint: str, title: str, env: Dict[str, str]) -> List[Step]:
+    """Trailing-window cubes (ROLLING_WINDOWS) of a domain and their scorecards."""
+    windows = env_get(env, "ROLLING_WINDOWS").split()
+    if not windows:
+        return []
+    cubes = {days: os.path.join(workdir, "rolling", f"{domain}_cube_{days}d.parquet") for days in windows}
+    name = f"{prefix}:rolling" + (f":{domain}" if prefix == "monitor" else "")
+
+    def cmd() -> Command:
+        existing = [m for m in metrics if os.path.exists(m)]
+        if not existing:
+            return None
+        return _python("rolling", "--partitions", os.path.join(workdir, "rolling", f"{domain}_days"),
+                       "--metrics", *existing, *[a for days, out in cubes.items() for a in ("--window", f"{days}={out}")])
+
+    steps = [Step(name, cmd, inputs=[_source("rolling"), _source("plot_cube")], optional_inputs=list(metrics),
+                  outputs=list(cubes.values()), mem_mb=STEP_MEMORY_MB["cube"])]
+    for days, cube in cubes.items():
+        for i in range(len(exps) - 1):
+            for j in range(i + 1, len(exps)):
+                steps.append(Step(
+                    f"{name}:scorecard:{days}d:{names[i]}_vs_{names[j]}",
+                    _python("scorecard", "--exp-a", exps[i], "--exp-b", exps[j], "--exp-a-name", names[i],
+                            "--exp-b-name", names[j], "--cube", cube, "--outdir", plots, "--fcint", fcint,
+                            "--title", f"{title}_{names[i]}_vs_{names[j]}_{days}d"),
+                    inputs=[cube, _source("scorecard")], dirs=[plots], env_keys=["SURFPAR_MONITOR", "TEMPPAR_MONITOR"]))
+    return steps
+
+
+def monitor_steps(env: Dict[str, str], cpus: int) -> List[Step]:
+    """Steps of scr/run_all_monitor.sh."""
+    master = env_get(env, "MASTER_OUTPUT")
+    outdir = env_get(env, "MONITOR_OUTPUT", os.path.join(master, "monitor") if master else "out/verification_run_monitor")
+    exps = env_get(env, "MONITOR_EXP_BASES", "meps2_preop_rednmc06mbr000 meps2_preop_rednmc04mbr000").split()
+    names = env_get(env, "MONITOR_EXP_NAMES", "REF rednmc04").split()
+    start = env_get(env, "START_MONITOR", "2025070200")
+    end = env_get(env, "END_MONITOR", "2025073121")
+    fcint = env_get(env, "FCINT_MONITOR", "12")
+    colors = env_get(env, "EXP_COLORS_MONITOR", "#1f77b4 #d62728").split()
+    render_png = env_get(env, "RENDER_PNG", "1") == "1"
+    in_process = env_get(env, "IN_PROCESS_ENGINE", "0") == "1"
+    cache_dir, state_dir = env_get(env, "PARSE_CACHE_DIR"), env_get(env, "STATE_DIR")
+    station_stats, blacklist = env_get(env, "STATION_STATS", "0"), env_get(env, "STATION_BLACKLIST")
+    temp_cycles = env_get(env, "MONITOR_TEMP_CYCLES")
+
+    workdir = os.path.join(outdir, "work")
+    plots = os.path.join(outdir, "plots")
+    vobs = os.path.abspath(os.path.join("data", "monitor", "vobs", "vobs_meps"))
+    vflds = [os.path.abspath(os.path.join("data", "monitor", "vfld", exp)) for exp in exps]
+    metrics = os.path.join(workdir, "surface_metrics.parquet")
+    temp_metrics = os.path.join(workdir, "temp_metrics.parquet")
+    cube = os.path.join(workdir, "surface_cube.parquet")
+    temp_cube = os.path.join(workdir, "temp_cube.parquet")
+
+    opts = ["--outdir", workdir]
+    if cache_dir:
+        opts += ["--cache-dir", os.path.abspath(cache_dir)]
+    if state_dir:
+        opts += ["--state-dir", os.path.abspath(state_dir)]
+    if env_get(env, "STREAM_VOBS", "0") == "1":
+        opts.append("--stream")
+    if env_get(env, "RESTRICT_COMMON_KEYS", "0") == "1":
+        opts.append("--common-stations")
+    if station_stats == "1":
+        opts.append("--station-stats")
+    elif station_stats == "lead":
+        opts.append("--station-stats-by-lead")
+    if blacklist:
+        opts += ["--station-blacklist", os.path.abspath(blacklist)]
+    positional = [start, end, fcint, vobs, *vflds]
+    inputs = [vobs, *vflds] + ([os.path.abspath(blacklist)] if blacklist else [])
+    env_keys = ["SURFPAR_MONITOR", "TEMPPAR_MONITOR", "PRECIP_THRESHOLDS_MONITOR"]
+
+    def verify_cmd(cmd: List[str]) -> Callable[[], Command]:
+        def resolve() -> Command:
+            for d in (cache_dir, state_dir):
+                if d:
+                    os.makedirs(d, exist_ok=True)
+            return cmd
+        return resolve
+
+    steps: List[Step] = []
+    if in_process:
+        engine_opts = ["--cube", cube, "--temp-cube", temp_cube]
+        for opt, name in (("--surfpar", "SURFPAR_MONITOR"), ("--temppar", "TEMPPAR_MONITOR"),
+                          ("--thresholds", "PRECIP_THRESHOLDS_MONITOR")):
+            if env_get(env, name):
+                engine_opts += [opt, *env[name].split()]
+        modules = glob.glob(os.path.join("src", "cpp", "obsver_engine*.so"))
+        steps.append(Step("monitor:verify", verify_cmd(_python("engine", *opts, *engine_opts, "--", *positional)),
+                          inputs=inputs + modules + [_source("engine")],
+                          outputs=[metrics, temp_metrics, cube, temp_cube],
+                          cpus=cpus, mem_mb=STEP_MEMORY_MB["engine"], env_keys=env_keys,
+                          env={"OMP_NUM_THREADS": env_get(env, "OMP_NUM_THREADS", str(cpus))}))
+    else:
+        binary = os.path.join("src", "cpp", "verify_cpp_parallel")
+        steps.append(Step("monitor:verify", verify_cmd([binary, *opts, *positional]),
+                          inputs=inputs + [binary], outputs=[metrics, temp_metrics],
+                          cpus=cpus, mem_mb=STEP_MEMORY_MB["engine"], env_keys=env_keys,
+                          env={"OMP_NUM_THREADS": env_get(env, "OMP_NUM_THREADS", str(cpus))},
+                          post=lambda: _csv_to_parquet(workdir)))
+        for domain, src, out in (("surface", metrics, cube), ("temp", temp_metrics, temp_cube)):
+            steps.append(Step(f"monitor:cube:{domain}", _python("plot_cube", "--metrics", src, "--out", out),
+                              inputs=[src, _source("plot_cube")], outputs=[out], mem_mb=STEP_MEMORY_MB["cube"]))
+
+    if len(exps) > 1:
+        for domain, src in (("surface", cube), ("temp", temp_cube)):
+            for i in range(len(exps) - 1):
+                for j in range(i + 1, len(exps)):
+                    title = f"monitor_{domain}_{names[i]}_vs_{names[j]}"
+                    steps.append(Step(
+                        f"monitor:scorecard:{domain}:{names[i]}_vs_{names[j]}",
+                        _python("scorecard", "--exp-a", exps[i], "--exp-b", exps[j], "--exp-a-name", names[i],
+                                "--exp-b-name", names[j], "--cube", src, "--outdir", plots, "--fcint", fcint,
+                                "--title", title),
+                        inputs=[src, _source("scorecard")], dirs=[plots], env_keys=["SURFPAR_MONITOR", "TEMPPAR_MONITOR"]))
+    for domain, src in (("surface", metrics), ("temp", temp_metrics)):
+        steps += rolling_steps("monitor", domain, [src], workdir, plots, exps, names, fcint, f"monitor_{domain}", env)
+
+    exp_args = _exp_args(exps, names, colors)
+    cycles = ["--monitor-temp-cycles", temp_cycles] if temp_cycles else []
+    steps.append(Step("monitor:series:surface",
+                      _python("series_export", "--cube", cube, "--outdir", plots, "--domain", "surface",
+                              "--fcint", fcint, *exp_args),
+                      inputs=[cube, _source("series_export")], dirs=[plots]))
+    steps.append(Step("monitor:series:temp",
+                      _python("series_export", "--cube", temp_cube, "--outdir", plots, "--domain", "temp",
+                              "--fcint", fcint, *cycles, *exp_args),
+                      inputs=[temp_cube, _source("series_export")], dirs=[plots]))
+    if render_png:
+        steps.append(Step("monitor:plots:surface",
+                          _python("monitor_plotting", "--cube", cube, "--outdir", plots,
+                                  "--title-prefix", "monitor_surface", "--fcint", fcint, *exp_args),
+                          inputs=[cube, _source("monitor_plotting")], dirs=[plots]))
+        steps.append(Step("monitor:plots:temp",
+                          _python("monitor_profile_plotting", "--cube", temp_cube, "--outdir", plots,
+                                  "--fcint", fcint, *cycles, *exp_args),
+                          inputs=[temp_cube, _source("monitor_profile_plotting")], dirs=[plots]))
+    return steps
+
+
+def _lead_times(path: str) -> List[int]:
+    """Lead times in a metrics file; empty if it cannot be read."""
+    try:
+        df = pl.read_parquet(path, columns=["lead_time"])
+    except Exception:
+        return []
+    return sorted(df["lead_time"].drop_nulls().unique().to_list())
+
+
+def obsver_steps(env: Dict[str, str], cpus: int) -> List[Step]:
+    """Steps of scr/run_all_obsver.sh."""
+    exps = env_get(env, "OBSVER_EXP_BASES", "meps2_preop_rednmc06 meps2_preop_rednmc06_t2h2").split()
+    names = env_get(env, "OBSVER_EXP_NAMES", " ".join(exps[:2])).split()
+    obsvars = env_get(env, "OBSVARS", "atms_tb").split()
+    hours = env_get(env, "OBSVER_HOURS").split()
+    common_keys = env_get(env, "USE_COMMON_KEYS", "0") == "1"
+    start, end = env.get("START_OBSVER"), env.get("END_OBSVER")
+    if not start or not end:
+        raise ValueError("START_OBSVER and END_OBSVER must be set for obsver.")
+    fcint = env_get(env, "FCINT_OBSVER", "12")
+    round_dec = env_get(env, "ROUND_DEC", "2")
+    cache_dir = env_get(env, "VERIFY_CACHE_DIR")
+    colors = env_get(env, "EXP_COLORS_OBSVER", "#1f77b4 #d62728").split()
+    default_leads = "0" if env_get(env, "VERIF_RENDER_URL") else "1"
+    lead_plots = env_get(env, "GENERATE_LEADTIME_PLOTS", default_leads) == "1"
+    render_png = env_get(env, "RENDER_PNG", "1") == "1"
+    master = env_get(env, "MASTER_OUTPUT")
+    outdir = env_get(env, "OBSVER_OUTPUT", os.path.join(master, "obsver") if master else "out/obsver_run/obsver")
+    plots = os.path.join(outdir, "plots")
+    roots = [os.path.join("data", "obsver", exp) for exp in exps]
+    cube = os.path.join(outdir, "plot_cube.parquet")
+    jobs = 8
+
+    steps: List[Step] = []
+    metric_files: List[str] = []
+    for ov in obsvars:
+        keyfile = ""
+        if common_keys:
+            keyfile = os.path.join(outdir, f"common_{ov}_keys.parquet")
+            build_args = [a for exp, root in zip(exps, roots) for a in ("--exp", exp, root)]
+            steps.append(Step(f"obsver:keys:{ov}",
+                              _python("build_common_keys", "--obstypevar", ov, "--round-dec", round_dec,
+                                      "--out", keyfile, "--start", start, "--end", end, *build_args,
+                                      *(["--cache-dir", cache_dir] if cache_dir else [])),
+                              inputs=roots + [_source("build_common_keys")], outputs=[keyfile],
+                              mem_mb=STEP_MEMORY_MB["keys"]))
+        for exp, root in zip(exps, roots):
+            out = os.path.join(outdir, f"{exp}_{ov}_metrics.parquet")
+            metric_files.append(out)
+            cmd = _python("verify", "--exp-name", exp, "--data-root", root, "--obstypevar", ov, "--start", start,
+                          "--end", end, "--out", out, "--jobs", str(jobs), "--by-model", "--fcint", fcint,
+                          "--round-dec", round_dec, "--by-lead")
+            if ov.endswith("_tb"):
+                cmd += ["--parameter", "tb"]
+            if keyfile:
+                cmd += ["--key-filter", keyfile]
+            if cache_dir:
+                cmd += ["--cache-dir", cache_dir]
+            steps.append(Step(f"obsver:verify:{ov}:{exp}", cmd,
+                              inputs=[root, _source("verify")] + ([keyfile] if keyfile else []), outputs=[out],
+                              cpus=jobs, mem_mb=STEP_MEMORY_MB["verify"]))
+
+    def cube_cmd() -> Command:
+        existing = [f for f in metric_files if os.path.exists(f)]
+        if not existing and os.path.exists(cube):
+            os.remove(cube)
+        return _python("plot_cube", "--metrics", *existing, "--out", cube) if existing else None
+
+    # The cube takes the metric files that were written, as run_all_obsver.sh does
+    steps.append(Step("obsver:cube", cube_cmd, inputs=[_source("plot_cube")], optional_inputs=metric_files,
+                      outputs=[cube], mem_mb=STEP_MEMORY_MB["cube"]))
+
+    exp_args = _exp_args(exps, names, colors)
+    hours_args = ["--hours", *hours] if hours else []
+    for ov in obsvars:
+        ov_plots = os.path.join(plots, ov)
+        joint = ["--cube", cube, "--obstypevar", ov, "--outdir", ov_plots, "--title-prefix", ov]
+        dates = ["--start-date", start, "--end-date", end, "--fcint", fcint]
+        if not render_png:
+            continue
+        steps.append(Step(f"obsver:plots:{ov}", _python("joint_plotting", *joint, *dates, *exp_args, *hours_args),
+                          inputs=[cube, _source("joint_plotting")], dirs=[ov_plots]))
+        if not lead_plots:
+            continue
+
+        def lead_steps(ov: str = ov, joint: List[str] = joint, dates: List[str] = dates,
+                       ov_plots: str = ov_plots) -> List[Step]:
+            # Lead times of the first experiment's metrics, as run_all_obsver.sh lists them
+            first = os.path.join(outdir, f"{exps[0]}_{ov}_metrics.parquet")
+            return [Step(f"obsver:plots:{ov}:lead{lt}",
+                         _python("joint_plotting", *joint, "--lead-time", str(lt), *dates, *exp_args, *hours_args),
+                         inputs=[cube, _source("joint_plotting")], dirs=[ov_plots])
+                    for lt in _lead_times(first)]
+
+        steps.append(Step(f"obsver:plots:{ov}:leads", expand=lead_steps, inputs=[cube]))
+
+    steps.append(Step("obsver:series",
+                      _python("series_export", "--cube", cube, "--outdir", plots, "--domain", "obsver",
+                              "--start-date", start, "--end-date", end, *exp_args, *hours_args),
+                      inputs=[cube, _source("series_export")], dirs=[plots]))
+    if len(exps) > 1:
+        for i in range(len(exps) - 1):
+            for j in range(i + 1, len(exps)):
+                steps.append(Step(
+                    f"obsver:scorecard:{names[i]}_vs_{names[j]}",
+                    _python("scorecard", "--exp-a", exps[i], "--exp-b", exps[j], "--exp-a-name", names[i],
+                            "--exp-b-name", names[j], "--cube", cube, "--fcint", fcint, "--outdir", plots,
+                            "--title", f"Scorecard_{names[i]}_vs_{names[j]}"),
+                    inputs=[cube, _source("scorecard")], dirs=[plots]))
+    steps += rolling_steps("obsver", "obsver", metric_files, outdir, plots, exps, names, fcint, "Scorecard", env)
+    return steps
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Run the monitor and obsver workflows as a DAG, skipping steps whose inputs are unchanged.")
+    parser.add_argument("env_file", help="Env_exp_* configuration file (scr/), e.g. scr/Env_exp_meps2_preop_rednmc06_04.")
+    parser.add_argument("--projects", nargs="+", choices=PROJECTS,
+                        help="Projects to run (default: those enabled by MONITOR=1/OBSVER=1 in the file).")
+    parser.add_argument("--cpus", type=int, default=os.cpu_count() or 1, help="CPU budget of concurrent steps.")
+    parser.add_argument("--mem-mb", type=int, default=available_memory_mb(),
+                        help="Memory budget of concurrent steps in MB (default: available memory, 0=no limit).")
+    parser.add_argument("--state-dir", help="Fingerprints, timings and step logs (default: MASTER_OUTPUT/.pipeline).")
+    parser.add_argument("--force", action="store_true", help="Run every step, even if it is up to date.")
+    parser.add_argument("--dry-run", action="store_true", help="List the steps and their dependencies only.")
+    args = parser.parse_args()
+
+    env = read_env_file(args.env_file)
+    projects = args.projects or [p for p in PROJECTS if env_get(env, p.upper(), "1") == "1"]
+    steps: List[Step] = []
+    try:
+        if "monitor" in projects:
+            steps += monitor_steps(env, args.cpus)
+        if "obsver" in projects:
+            steps += obsver_steps(env, args.cpus)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    state_dir = args.state_dir or os.path.join(env_get(env, "MASTER_OUTPUT", "out"), ".pipeline")
+    pipeline = Pipeline(steps, env, state_dir, cpus=args.cpus, mem_mb=args.mem_mb, force=args.force)
+    if args.dry_run:
+        pipeline.describe()
+        return
+    print(f"Running {', '.join(projects)} ({len(steps)} steps, {args.cpus} CPUs"
+          + (f", {args.mem_mb} MB)" if args.mem_mb else ")"))
+    if not pipeline.run():
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
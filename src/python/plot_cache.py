@@ -0,0 +1,133 @@
+import os
+import json
+import hashlib
+import tempfile
+from typing import Dict, Iterable, Optional, Set
+
+import polars as pl
+
+
+class PlotCache:
+    """
+    Content-addressed record of the PNGs written by one plotting invocation.
+
+    Each figure is keyed by a SHA-256 over the data subset it draws, the style
+    and CLI options (`salt`) and the source of the plotting code. A figure whose
+    digest matches the sidecar index entry for its (existing) PNG is not
+    re-rendered. The index lives next to the plots as `.plot_cache_<scope>.json`;
+    use a distinct scope for every invocation that may run concurrently on the
+    same outdir. On close(), PNGs recorded by a previous run of the same scope
+    but not produced by this one are deleted as orphans.
+    """
+
+    def __init__(self, outdir: str, scope: str, salt: Iterable = (),
+                 code_files: Iterable[str] = (), enabled: bool = True) -> None:
+        self.outdir = outdir
+        self.enabled = enabled
+        safe_scope = "".join(c if c.isalnum() or c in "-_." else "_" for c in scope)
+        self.index_path = os.path.join(outdir, f".plot_cache_{safe_scope}.json")
+        self._old: Dict[str, str] = self._load() if enabled else {}
+        self._new: Dict[str, str] = {}
+        h = hashlib.sha256()
+        for path in code_files:
+            try:
+                with open(path, "rb") as f:
+                    h.update(f.read())
+            except OSError:
+                h.update(path.encode())
+        for part in salt:
+            self._update(h, part)
+        self._base = h.digest()
+
+    def _load(self) -> Dict[str, str]:
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return {k: v for k, v in data.get("images", {}).items() if isinstance(v, str)}
+        except Exception:
+            return {}
+
+    @staticmethod
+    def _update(h, part) -> None:
+        if isinstance(part, pl.DataFrame):
+            # Row order of group_by output is not stable; round floats so
+            # reduction-order noise does not invalidate the cache.
+            frame = part.sort(part.columns) if part.width else part
+            h.update(frame.write_csv(float_precision=10).encode())
+        elif isinstance(part, pl.Series):
+            PlotCache._update(h, part.to_frame())
+        elif isinstance(part, (bytes, bytearray)):
+            h.update(part)
+        else:
+            h.update(json.dumps(part, sort_keys=True, default=str).encode())
+        h.update(b"\x00")
+
+    def digest(self, *parts) -> str:
+        """Hash the given data/options together with the invocation salt."""
+        h = hashlib.sha256(self._base)
+        for part in parts:
+            self._update(h, part)
+        return h.hexdigest()
+
+    def _key(self, path: str) -> str:
+        return os.path.relpath(path, self.outdir)
+
+    def is_current(self, path: str, digest: str) -> bool:
+        """True if `path` exists and was rendered from the same digest; keeps it in the index."""
+        if not self.enabled:
+            return False
+        key = self._key(path)
+        if self._old.get(key) == digest and os.path.exists(path):
+            self._new[key] = digest
+            return True
+        return False
+
+    def record(self, path: str, digest: str) -> None:
+        if self.enabled:
+            self._new[self._key(path)] = digest
+
+    def orphans(self) -> Set[str]:
+        return set(self._old) - set(self._new)
+
+    def close(self, evict: bool = True) -> None:
+        """Write the index; with evict=True delete PNGs no longer produced by this scope."""
+        if not self.enabled:
+            return
+        if evict:
+            for key in sorted(self.orphans()):
+                path = os.path.join(self.outdir, key)
+                try:
+                    os.remove(path)
+                    print(f"Evicted orphaned plot: {path}")
+                    parent = os.path.dirname(path)
+                    if os.path.abspath(parent) != os.path.abspath(self.outdir) and not os.listdir(parent):
+                        os.rmdir(parent)
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    print(f"Failed to evict {path}: {e}")
+                    self._new.setdefault(key, self._old[key])
+        else:
+            for key in self.orphans():
+                self._new[key] = self._old[key]
+        os.makedirs(self.outdir, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.outdir, prefix=".plot_cache_", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"images": dict(sorted(self._new.items()))}, f, indent=1)
+            os.replace(tmp, self.index_path)
+        except Exception:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+
+
+def style_salt(args, rc_keys: Optional[Iterable[str]] = None) -> list:
+    """Options and matplotlib style that affect rendering, for use as PlotCache salt."""
+    import matplotlib.pyplot as plt
+    opts = {k: v for k, v in vars(args).items() if k != "no_plot_cache"}
+    keys = sorted(rc_keys) if rc_keys is not None else sorted(plt.rcParams.keys())
+    rc = {k: plt.rcParams[k] for k in keys}
+    return [opts, rc]
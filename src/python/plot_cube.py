@@ -0,0 +1,156 @@
+import argparse
+import os
+from typing import Iterable, List, Optional, Sequence
+
+import polars as pl
+
+# View name -> grouping dimensions kept besides (experiment, obstypevar).
+# lead_time and hod (valid hour of day) are kept so the per-lead-time and
+# --hours/--monitor-temp-cycles filters of the plotters can be applied on the cube.
+VIEWS = {
+    "lead_time": ["lead_time", "hod"],
+    "vt_hour": ["vt_hour", "lead_time", "hod"],
+    "pressure_level": ["pressure_level", "lead_time", "hod"],
+    "pressure_bracket": ["pressure_bracket", "lead_time", "hod"],
+    "channel": ["channel", "lead_time", "hod"],
+}
+# Kept in every view when present (joint_plotting titles list the cycle hours)
+EXTRA_KEYS = ["cycle_hour"]
+SUM_COLUMNS = ["bias_sum", "rmse_sum", "n_rows", "n_sum"]
+# Sample-weighted partial statistics: sums of errors, squared errors and (when the
+# metrics have mae) absolute errors, for pooled bias/RMSE/MAE over any collapse
+PARTIAL_COLUMNS = ["err_sum", "sq_err_sum", "abs_err_sum"]
+
+
+def _count_column(df: pl.DataFrame) -> str:
+    for c in ("n_samples", "n"):
+        if c in df.columns:
+            return c
+    raise ValueError("Metrics have no count column (n_samples or n).")
+
+
+def _with_hod(df: pl.DataFrame) -> pl.DataFrame:
+    if "vt_hour" not in df.columns:
+        return df
+    if df["vt_hour"].dtype.is_temporal():
+        return df.with_columns(pl.col("vt_hour").dt.hour().cast(pl.Int32).alias("hod"))
+    # Monitor metrics carry vt_hour as YYYYMMDDHH integers
+    return df.with_columns((pl.col("vt_hour") % 100).cast(pl.Int32).alias("hod"))
+
+
+def build_cube(df: pl.DataFrame) -> pl.DataFrame:
+    """
+    Pre-aggregate raw metrics into one long frame with a `view` column. Each row
+    holds mergeable sums (bias_sum, rmse_sum, n_rows, n_sum) so any further
+    collapse reproduces the plotters' row means exactly: mean = sum / n_rows.
+    The PARTIAL_COLUMNS sums give the pooled statistics, e.g. bias = err_sum / n_sum.
+    """
+    count_col = _count_column(df)
+    df = _with_hod(df)
+    partial = [(pl.col("bias") * pl.col(count_col)).sum().alias("err_sum"),
+               (pl.col("rmse").pow(2) * pl.col(count_col)).sum().alias("sq_err_sum")]
+    if "mae" in df.columns:
+        partial.append((pl.col("mae") * pl.col(count_col)).sum().alias("abs_err_sum"))
+    parts: List[pl.DataFrame] = []
+    for view, dims in VIEWS.items():
+        if view not in df.columns:
+            continue
+        keys = ["experiment", "obstypevar"] + [d for d in dims if d in df.columns]
+        keys += [k for k in EXTRA_KEYS if k in df.columns and k not in keys]
+        part = (df.filter(pl.col(view).is_not_null())
+                  .group_by(keys)
+                  .agg([
+                      pl.sum("bias").alias("bias_sum"),
+                      pl.sum("rmse").alias("rmse_sum"),
+                      pl.len().alias("n_rows"),
+                      pl.sum(count_col).alias("n_sum"),
+                      *partial,
+                  ])
+                  .with_columns(pl.lit(view).alias("view")))
+        parts.append(part)
+    if not parts:
+        return pl.DataFrame()
+    return pl.concat(parts, how="diagonal_relaxed")
+
+
+def is_cube(df: pl.DataFrame) -> bool:
+    return "view" in df.columns and "bias_sum" in df.columns
+
+
+def has_view(df: pl.DataFrame, view: str) -> bool:
+    if not is_cube(df):
+        return view in df.columns
+    return not df.filter(pl.col("view") == view).is_empty()
+
+
+def filter_cube(cube: pl.DataFrame,
+                obstypevars: Optional[Sequence[str]] = None,
+                lead_times: Optional[Iterable[int]] = None,
+                hours: Optional[Iterable[int]] = None) -> pl.DataFrame:
+    """Apply the plotters' row filters (variable, lead time, valid hour) on cube rows."""
+    if obstypevars:
+        cube = cube.filter(pl.col("obstypevar").is_in(list(obstypevars)))
+    if lead_times is not None and "lead_time" in cube.columns:
+        cube = cube.filter(pl.col("lead_time").is_in(list(lead_times)))
+    if hours is not None and "hod" in cube.columns:
+        cube = cube.filter(pl.col("hod").is_in([int(h) for h in hours]))
+    return cube
+
+
+def aggregate_view(cube: pl.DataFrame, view: str, group: Sequence[str] = ("experiment",)) -> pl.DataFrame:
+    """
+    Collapse one view of the cube to `group` + [view] with bias/rmse as the mean
+    over the original metric rows and n_sum as the summed sample count.
+    """
+    keys = [*group, view]
+    return (cube.filter(pl.col("view") == view)
+                .group_by(keys)
+                .agg([
+                    (pl.sum("bias_sum") / pl.sum("n_rows")).alias("bias"),
+                    (pl.sum("rmse_sum") / pl.sum("n_rows")).alias("rmse"),
+                    pl.sum("n_sum").alias("n_sum"),
+                ]))
+
+
+def read_metrics(paths: Iterable[str]) -> Optional[pl.DataFrame]:
+    dfs = []
+    for m in paths:
+        if not os.path.exists(m):
+            print(f"Missing metrics file: {m}")
+            continue
+        try:
+            df = pl.read_parquet(m)
+        except Exception as e:
+            print(f"Failed reading {m}: {e}")
+            continue
+        if df.is_empty():
+            print(f"Empty metrics file: {m}")
+            continue
+        dfs.append(df)
+    if not dfs:
+        return None
+    return pl.concat(dfs, how="vertical_relaxed")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build the pre-aggregated plot cube shared by the plotting scripts.")
+    parser.add_argument("--metrics", nargs="+", required=True,
+                        help="Metrics parquet files of one domain (e.g. all surface or all obsver files).")
+    parser.add_argument("--out", required=True, help="Output cube parquet file.")
+    args = parser.parse_args()
+
+    all_df = read_metrics(args.metrics)
+    if all_df is None:
+        print("No valid metrics loaded; aborting.")
+        return
+    cube = build_cube(all_df)
+    out_dir = os.path.dirname(args.out)
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+    cube.write_parquet(args.out)
+    views = sorted(cube["view"].unique().to_list()) if not cube.is_empty() else []
+    print(f"Plot cube saved to {args.out} (rows={cube.height}, source rows={all_df.height}, views={views})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+import os
+import json
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import matplotlib.pyplot as plt
+import matplotlib.ticker as mticker
+
+METRIC_STYLES = {
+    "rmse": {"linestyle": "--", "label": "RMSE", "marker": "o"},
+    "bias": {"linestyle": "-", "label": "Bias", "marker": "s"},
+}
+
+# (x values, rmse values, bias values) for one experiment
+Series = Tuple[Sequence, Sequence, Sequence]
+
+
+@lru_cache(maxsize=None)
+def load_var_names() -> Dict[str, dict]:
+    """Load variable name mapping JSON once per process; return safe default on failure."""
+    var_name_path = os.path.join(os.path.dirname(__file__), "var_names.json")
+    var_names = {"surface": {}, "upper_air": {}}
+    if os.path.exists(var_name_path):
+        try:
+            with open(var_name_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+                if isinstance(data, dict):
+                    var_names.update({k: v for k, v in data.items() if isinstance(v, dict)})
+        except Exception:
+            pass
+    return var_names
+
+
+def var_label_unit(group: str, var: str) -> Tuple[str, Optional[str]]:
+    entry = load_var_names().get(group, {}).get(var, var)
+    if isinstance(entry, dict):
+        return entry.get("label", var), entry.get("unit")
+    return entry, None
+
+
+class _MetricFigure(ABC):
+    """
+    Figure with one RMSE and one Bias line per experiment plus a count bar backdrop
+    on a twin axis. The layout is built once; update() swaps the artists' data so
+    many variables can be rendered without rebuilding the figure. Subclasses
+    define the orientation: the twin axis, the count bars and the line data.
+    """
+
+    def __init__(self, experiments: List[str], exp_colors: Dict[str, str],
+                 exp_names: Dict[str, str], figsize: Tuple[float, float], right: float) -> None:
+        self.fig, self.ax = plt.subplots(figsize=figsize)
+        self.fig.subplots_adjust(right=right)
+        self.ax2 = self._make_twin()
+        self._bars = None
+        self._bar_pos: List = []
+        self.lines: Dict[Tuple[str, str], object] = {}
+        for metric in ("rmse", "bias"):
+            style = METRIC_STYLES[metric]
+            for exp in experiments:
+                disp = exp_names.get(exp, exp)
+                (h,) = self.ax.plot([], [], color=exp_colors[exp], linestyle=style["linestyle"],
+                                    marker=style["marker"], label=f"{style['label']} {disp}")
+                self.lines[(metric, exp)] = h
+
+    @abstractmethod
+    def _make_twin(self):
+        """Twin axis of the count bars."""
+
+    @abstractmethod
+    def _draw_bars(self, pos: List, counts: Sequence):
+        """New count bars at pos."""
+
+    @abstractmethod
+    def _set_line(self, line, x: Sequence, y: Sequence) -> None:
+        """Point a metric line at x (lead time, valid time or level) and y (metric)."""
+
+    def _update_bars(self, pos: List, counts: Sequence) -> None:
+        if self._bars is not None and pos == self._bar_pos:
+            for rect, n in zip(self._bars, counts):
+                self._set_bar_size(rect, n)
+        else:
+            if self._bars is not None:
+                self._bars.remove()
+            self._bars = self._draw_bars(pos, counts)
+            self._bar_pos = list(pos)
+
+    @abstractmethod
+    def _set_bar_size(self, rect, n) -> None:
+        """Resize one count bar to n."""
+
+    def update(self, pos: List, counts: Sequence, series: Dict[str, Series], title: str) -> None:
+        """Point all artists at a new variable; experiments missing from `series` are hidden."""
+        self._update_bars(pos, counts)
+        handles = []
+        for (metric, exp), line in self.lines.items():
+            data = series.get(exp)
+            if data is None:
+                self._set_line(line, [], [])
+                line.set_visible(False)
+                continue
+            x, rmse, bias = data
+            self._set_line(line, x, rmse if metric == "rmse" else bias)
+            line.set_visible(True)
+            handles.append(line)
+        for a in (self.ax, self.ax2):
+            a.relim(visible_only=True)
+            a.autoscale_view()
+        self.ax.set_title(title)
+        self._legend(handles)
+
+    @abstractmethod
+    def _legend(self, handles: List) -> None:
+        """Legend of the visible lines."""
+
+    def save(self, path: str) -> None:
+        self.fig.savefig(path, bbox_inches="tight")
+
+    def close(self) -> None:
+        plt.close(self.fig)
+
+
+class SeriesFigure(_MetricFigure):
+    """
+    Metric series against lead time or valid time. For a categorical x axis pass
+    the category labels to update_series(); positions are then 0..n-1 as matplotlib
+    would assign them for string data.
+    """
+
+    def __init__(self, experiments: List[str], exp_colors: Dict[str, str],
+                 exp_names: Dict[str, str], x_label: str,
+                 xticks: Optional[Sequence[int]] = None, categorical: bool = False) -> None:
+        super().__init__(experiments, exp_colors, exp_names, figsize=(15.0, 10.0), right=0.75)
+        self._categories: List[str] = []
+        self._xticks = list(xticks) if xticks is not None and not categorical else None
+        self.ax2.set_ylabel("Count")
+        self.ax.axhline(0, color='black', linestyle='-', linewidth=1)
+        self.ax.set_xlabel(x_label)
+        if categorical:
+            self.ax.xaxis.set_major_locator(mticker.MaxNLocator(nbins=10))
+            self.ax.xaxis.set_major_formatter(mticker.FuncFormatter(self._category_label))
+        self.ax.tick_params(axis='x', rotation=45)
+        self.ax.grid(True, linestyle="--", linewidth=0.5, alpha=0.7)
+
+    def _category_label(self, value, _pos) -> str:
+        idx = round(value)
+        return self._categories[idx] if 0 <= idx < len(self._categories) else ""
+
+    def _make_twin(self):
+        return self.ax.twinx()
+
+    def _draw_bars(self, pos, counts):
+        return self.ax2.bar(pos, counts, color="gray", alpha=0.12, width=0.8)
+
+    def _set_bar_size(self, rect, n) -> None:
+        rect.set_height(n)
+
+    def _set_line(self, line, x, y) -> None:
+        line.set_data(x, y)
+
+    def _legend(self, handles) -> None:
+        self.ax.legend(handles=handles, loc='center left', bbox_to_anchor=(1.14, 0.5), frameon=True)
+
+    def update_series(self, x_all: Sequence, counts: Sequence, series: Dict[str, Series],
+                      title: str, y_label: str, categories: bool = False) -> None:
+        """
+        x_all/counts: union of x values with summed counts (sorted). With
+        categories=True, x values are labels and are mapped to their positions.
+        """
+        if categories:
+            self._categories = [str(v) for v in x_all]
+            index = {v: i for i, v in enumerate(self._categories)}
+            pos = list(range(len(self._categories)))
+            series = {e: ([index[str(v)] for v in x], r, b) for e, (x, r, b) in series.items()}
+        else:
+            pos = list(x_all)
+        self.update(pos, counts, series, title)
+        if self._xticks is not None:
+            # Fixed ticks widen the autoscaled view like set_xticks on a fresh axis does
+            self.ax.set_xticks(self._xticks)
+        self.ax.set_ylabel(y_label)
+
+
+class ProfileFigure(_MetricFigure):
+    """Metric values against pressure level (inverted y axis) with horizontal count bars."""
+
+    def __init__(self, experiments: List[str], exp_colors: Dict[str, str],
+                 exp_names: Dict[str, str]) -> None:
+        super().__init__(experiments, exp_colors, exp_names, figsize=(15.0, 10.0), right=0.75)
+        self.ax2.set_xlabel("Count")
+        self.ax.axvline(0, color='black', linestyle='-', linewidth=1)
+        self.ax.set_ylabel("Pressure (hPa)")
+        self.ax.invert_yaxis()
+        self.ax.grid(True, which="both", linestyle="--", linewidth=0.5, alpha=0.7)
+
+    def _make_twin(self):
+        return self.ax.twiny()
+
+    def _draw_bars(self, pos, counts):
+        return self.ax2.barh(pos, counts, color="gray", alpha=0.15, height=10)
+
+    def _set_bar_size(self, rect, n) -> None:
+        rect.set_width(n)
+
+    def _set_line(self, line, x, y) -> None:
+        # Profiles plot the metric on x against the level on y
+        line.set_data(y, x)
+
+    def _legend(self, handles) -> None:
+        self.ax.legend(handles=handles, loc='center left', bbox_to_anchor=(1, 0.5), frameon=True)
+
+    def update_profile(self, levels: Sequence, counts: Sequence, series: Dict[str, Series],
+                       title: str, x_label: str) -> None:
+        self.update(list(levels), counts, series, title)
+        self.ax.set_yticks(list(levels))
+        self.ax.set_xlabel(x_label)
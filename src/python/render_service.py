@@ -0,0 +1,319 @@
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import polars as pl
+
+from . import joint_plotting, monitor_plotting, monitor_profile_plotting, plot_cube, plot_templates
+from .series_export import DOMAINS
+
+# pyplot keeps global state; figures are rendered one at a time while cache hits are served concurrently
+_RENDER_LOCK = threading.Lock()
+
+
+class DiskLRU:
+    """
+    Size-bounded PNG cache directory. Recency is the file mtime, refreshed on every
+    hit, so the order survives restarts; the least recently used files are removed
+    once the total size exceeds max_bytes.
+    """
+
+    def __init__(self, root: str, max_bytes: int) -> None:
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._total = 0
+        os.makedirs(root, exist_ok=True)
+        found = []
+        for name in os.listdir(root):
+            if not name.endswith(".png"):
+                continue
+            try:
+                st = os.stat(os.path.join(root, name))
+            except OSError:
+                continue
+            found.append((st.st_mtime, name[:-4], st.st_size))
+        for _, key, size in sorted(found):
+            self._entries[key] = size
+            self._total += size
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root, f"{key}.png")
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            if key not in self._entries:
+                return None
+            path = self.path(key)
+            try:
+                os.utime(path)
+            except FileNotFoundError:
+                self._total -= self._entries.pop(key)
+                return None
+            self._entries.move_to_end(key)
+            return path
+
+    def put(self, key: str, src: str) -> str:
+        """Move a rendered file into the cache and evict down to the size bound."""
+        path = self.path(key)
+        size = os.path.getsize(src)
+        os.replace(src, path)
+        with self._lock:
+            self._total -= self._entries.pop(key, 0)
+            self._entries[key] = size
+            self._total += size
+            while self._total > self.max_bytes and len(self._entries) > 1:
+                old_key, old_size = self._entries.popitem(last=False)
+                self._total -= old_size
+                try:
+                    os.remove(self.path(old_key))
+                except FileNotFoundError:
+                    pass
+        return path
+
+
+class CubeStore:
+    """Plot cubes per (project, domain), reloaded when the file on disk changes."""
+
+    def __init__(self, specs: Dict[Tuple[str, str], str]) -> None:
+        self.specs = specs
+        self._frames: Dict[Tuple[str, str], Tuple[Tuple[int, int], pl.DataFrame]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, project: str, domain: str) -> Tuple[Optional[pl.DataFrame], Tuple[int, int]]:
+        path = self.specs.get((project, domain))
+        if path is None:
+            return None, (0, 0)
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None, (0, 0)
+        stamp = (st.st_mtime_ns, st.st_size)
+        with self._lock:
+            cached = self._frames.get((project, domain))
+            if cached is None or cached[0] != stamp:
+                cached = (stamp, pl.read_parquet(path))
+                self._frames[(project, domain)] = cached
+        return cached[1], stamp
+
+    def domains(self, project: str) -> List[str]:
+        return [d for (p, d) in self.specs if p == project]
+
+
+class RenderError(Exception):
+    def __init__(self, status: int, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+
+
+class Renderer:
+    def __init__(self, cubes: CubeStore, cache: DiskLRU, exp_colors: Dict[str, str],
+                 exp_names: Dict[str, str], fcint: Optional[int]) -> None:
+        self.cubes = cubes
+        self.cache = cache
+        self.exp_colors = exp_colors
+        self.exp_names = exp_names
+        self.fcint = fcint
+        h = hashlib.sha256()
+        for mod in (joint_plotting, monitor_plotting, monitor_profile_plotting, plot_templates, plot_cube):
+            with open(mod.__file__, "rb") as f:
+                h.update(f.read())
+        h.update(json.dumps([exp_colors, exp_names, fcint], sort_keys=True).encode())
+        self._code = h.hexdigest()
+
+    def _resolve(self, project: str, variable: str) -> Tuple[str, str]:
+        """Map the webapp variable name (e.g. temp_TT) to (domain, obstypevar)."""
+        domains = sorted(self.cubes.domains(project), key=lambda d: -len(DOMAINS[d]["prefix"]))
+        for domain in domains:
+            prefix = DOMAINS[domain]["prefix"]
+            if variable.startswith(prefix):
+                return domain, variable[len(prefix):]
+        raise RenderError(404, f"No cube configured for project {project!r} and variable {variable!r}")
+
+    def _colors(self, cube: pl.DataFrame, experiments: List[str]) -> Dict[str, str]:
+        # Colours are assigned over all experiments so they do not change with the selection
+        colors = dict(self.exp_colors)
+        default_cycle = itertools.cycle(plt.rcParams['axes.prop_cycle'].by_key()['color'])
+        for e in sorted(cube["experiment"].unique().to_list()):
+            if e not in colors:
+                colors[e] = next(default_cycle)
+        return {e: colors[e] for e in experiments}
+
+    def render(self, project: str, variable: str, plot_type: str,
+               lead_time: Optional[int], experiments: Optional[List[str]]) -> str:
+        domain, var = self._resolve(project, variable)
+        if plot_type not in {p for p, _ in DOMAINS[domain]["plots"]}:
+            raise RenderError(400, f"Unknown plot type {plot_type!r} for {domain}")
+        cube, stamp = self.cubes.get(project, domain)
+        if cube is None:
+            raise RenderError(404, f"Plot cube for {project}/{domain} not found")
+        all_exps = sorted(cube["experiment"].unique().to_list())
+        exps = [e for e in (experiments or all_exps) if e in all_exps]
+        if not exps:
+            raise RenderError(404, "None of the requested experiments are in the cube")
+
+        key = hashlib.sha256(json.dumps(
+            [self._code, project, domain, var, plot_type, lead_time, exps, stamp]).encode()).hexdigest()
+        hit = self.cache.get(key)
+        if hit is not None:
+            return hit
+
+        with _RENDER_LOCK:
+            # A concurrent request may have rendered the same figure meanwhile
+            hit = self.cache.get(key)
+            if hit is not None:
+                return hit
+            df = plot_cube.filter_cube(cube, obstypevars=[var],
+                                       lead_times=[lead_time] if lead_time is not None else None)
+            df = df.filter(pl.col("experiment").is_in(exps))
+            if df.is_empty():
+                raise RenderError(404, "No data for this selection")
+            with tempfile.TemporaryDirectory(dir=self.cache.root) as tmp:
+                produced = self._render_into(tmp, domain, var, plot_type, lead_time, df, cube, exps)
+                if produced is None or not os.path.exists(produced):
+                    raise RenderError(404, "Nothing to plot for this selection")
+                return self.cache.put(key, produced)
+
+    def _render_into(self, tmp: str, domain: str, var: str, plot_type: str, lead_time: Optional[int],
+                     df: pl.DataFrame, cube: pl.DataFrame, exps: List[str]) -> Optional[str]:
+        colors = self._colors(cube, exps)
+        start_date = df["vt_hour"].min()
+        end_date = df["vt_hour"].max()
+        if domain == "obsver":
+            with plt.rc_context(joint_plotting.RC_PARAMS):
+                tag = f"_lt_{lead_time}" if lead_time is not None else ""
+                cycle_hours = sorted(df["cycle_hour"].unique().to_list()) if "cycle_hour" in df.columns else []
+                args = (df, tmp, var, colors, self.exp_names, tag,
+                        str(start_date), str(end_date), cycle_hours, None)
+                if plot_type == "profile":
+                    if plot_cube.has_view(df, "channel"):
+                        joint_plotting.plot_profiles_channel(*args)
+                    else:
+                        joint_plotting.plot_profiles_pressure(*args)
+                else:
+                    joint_plotting.plot_timeseries(*args)
+            return os.path.join(tmp, f"{var}_{plot_type}{tag}.png")
+        if domain == "surface":
+            x_axis = plot_type[:-len("_series")]
+            with plt.rc_context(monitor_plotting.RC_PARAMS):
+                monitor_plotting.plot_series(df, tmp, var, colors, self.exp_names, x_axis,
+                                             start_date, end_date, self.fcint)
+            return os.path.join(tmp, var, f"{var}_{plot_type}.png")
+        with plt.rc_context(monitor_profile_plotting.RC_PARAMS):
+            cycles = [lead_time] if lead_time is not None else None
+            if plot_type == "profile":
+                monitor_profile_plotting.plot_temp_profiles(df, tmp, colors, self.exp_names, start_date,
+                                                            end_date, self.fcint, None, cycles)
+            else:
+                monitor_profile_plotting.plot_series(df, tmp, colors, self.exp_names, plot_type[:-len("_series")],
+                                                     start_date, end_date, self.fcint, None, cycles)
+        return os.path.join(tmp, f"temp_{var}", f"temp_{var}_{plot_type}.png")
+
+
+def _make_handler(renderer: Renderer):
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, status: int, body: bytes, content_type: str) -> None:
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _error(self, status: int, message: str) -> None:
+            self._send(status, json.dumps({"error": message}).encode(), "application/json")
+
+        def do_GET(self) -> None:
+            url = urlparse(self.path)
+            if url.path == "/health":
+                self._send(200, b'{"status":"ok"}', "application/json")
+                return
+            if url.path != "/render":
+                self._error(404, "Unknown endpoint")
+                return
+            q = parse_qs(url.query)
+            project = q.get("project", [""])[0]
+            variable = q.get("variable", [""])[0]
+            plot_type = q.get("plot", [""])[0]
+            if not (project and variable and plot_type):
+                self._error(400, "project, variable and plot are required")
+                return
+            lead_raw = q.get("lead_time", [""])[0]
+            try:
+                lead_time = int(lead_raw) if lead_raw not in ("", "all") else None
+            except ValueError:
+                self._error(400, f"Invalid lead_time: {lead_raw}")
+                return
+            try:
+                path = renderer.render(project, variable, plot_type, lead_time, q.get("exp"))
+                with open(path, "rb") as f:
+                    body = f.read()
+            except RenderError as e:
+                self._error(e.status, str(e))
+                return
+            except Exception as e:
+                self._error(500, f"Render failed: {e}")
+                return
+            self._send(200, body, "image/png")
+
+        def log_message(self, fmt, *args) -> None:
+            print(f"{self.address_string()} - {fmt % args}")
+
+    return Handler
+
+
+def _parse_cube_specs(specs: List[str], parser: argparse.ArgumentParser) -> Dict[Tuple[str, str], str]:
+    out: Dict[Tuple[str, str], str] = {}
+    for spec in specs:
+        if "=" not in spec:
+            parser.error(f"malformed --cube '{spec}' (need PROJECT[:DOMAIN]=PATH)")
+        target, path = spec.split("=", 1)
+        project, _, domain = target.partition(":")
+        domain = domain or project
+        if domain not in DOMAINS:
+            parser.error(f"unknown domain '{domain}' in --cube '{spec}' (one of {', '.join(sorted(DOMAINS))})")
+        out[(project, domain)] = path
+    return out
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="On-demand plot rendering service with an LRU disk cache.")
+    parser.add_argument("--cube", action="append", required=True,
+                        help="Plot cube per project and domain: PROJECT[:DOMAIN]=PATH "
+                             "(e.g. obsver=out/.../plot_cube.parquet, monitor:temp=.../temp_cube.parquet). Repeatable.")
+    parser.add_argument("--cache-dir", required=True, help="Directory for cached PNGs.")
+    parser.add_argument("--max-cache-mb", type=float, default=512.0, help="Disk cache size bound in MB.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--exp-color", action="append", help="Experiment color mapping EXP=COLOR (repeatable).")
+    parser.add_argument("--exp-name", action="append", help="Experiment name mapping LONG_NAME=SHORT_NAME (repeatable).")
+    parser.add_argument("--fcint", type=int, help="Forecast interval in hours (monitor titles).")
+    args = parser.parse_args()
+
+    cubes = CubeStore(_parse_cube_specs(args.cube, parser))
+    cache = DiskLRU(args.cache_dir, int(args.max_cache_mb * 1024 * 1024))
+    renderer = Renderer(cubes, cache, joint_plotting.parse_mapping(args.exp_color, "exp-color"),
+                        joint_plotting.parse_mapping(args.exp_name, "exp-name"), args.fcint)
+    server = ThreadingHTTPServer((args.host, args.port), _make_handler(renderer))
+    print(f"Render service on http://{args.host}:{args.port} (cache {args.cache_dir}, {args.max_cache_mb:g} MB)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
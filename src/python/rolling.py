@@ -0,0 +1,201 @@
+"""
+Trailing-window plot cubes from daily partitions of partial statistics.
+
+Metrics are split by valid date into one plot cube per day (cube_YYYYMMDD.parquet).
+Cube rows hold sums only (plot_cube.SUM_COLUMNS and PARTIAL_COLUMNS), so the cube
+of a window is the sum of its daily cubes. A window cube is updated by adding the
+days that entered the window and subtracting those that left it; it is rebuilt
+from all of its days when that is less work or when a day inside it changed.
+Window cubes have the layout of plot_cube.py and can be passed as --cube to
+scorecard.py, series_export.py and the plotting scripts.
+"""
+import argparse
+import datetime as dt
+import json
+import os
+import re
+import sys
+from typing import Dict, List, Optional, Tuple
+
+import polars as pl
+
+from . import plot_cube
+
+_PARTITION = re.compile(r"^cube_(\d{8})\.parquet$")
+
+
+def valid_date(df: pl.DataFrame) -> pl.Expr:
+    """YYYYMMDD (Int32) of the vt_hour column, a datetime or a YYYYMMDDHH integer."""
+    if df["vt_hour"].dtype.is_temporal():
+        return pl.col("vt_hour").dt.strftime("%Y%m%d").cast(pl.Int32)
+    return (pl.col("vt_hour") // 100).cast(pl.Int32)
+
+
+def write_partitions(metrics: pl.DataFrame, outdir: str) -> List[str]:
+    """
+    Write one cube per valid date of metrics into outdir. A partition whose
+    content is unchanged is not rewritten. Returns the dates that were written.
+    """
+    if "vt_hour" not in metrics.columns:
+        raise ValueError("Metrics have no vt_hour column; they cannot be split by day.")
+    os.makedirs(outdir, exist_ok=True)
+    metrics = metrics.with_columns(valid_date(metrics).alias("_date"))
+    written: List[str] = []
+    for (date,), day in metrics.group_by("_date", maintain_order=True):
+        if date is None:
+            continue
+        cube = plot_cube.build_cube(day.drop("_date"))
+        key = [c for c in cube.columns if c not in _sum_columns(cube)]
+        cube = cube.sort(key, nulls_last=True)
+        path = os.path.join(outdir, f"cube_{date}.parquet")
+        if os.path.exists(path):
+            try:
+                if pl.read_parquet(path).equals(cube):
+                    continue
+            except Exception:
+                pass
+        tmp = f"{path}.{os.getpid()}.tmp"
+        cube.write_parquet(tmp)
+        os.replace(tmp, path)
+        written.append(str(date))
+    return written
+
+
+def list_partitions(outdir: str) -> Dict[str, str]:
+    """Partition files of outdir by date (YYYYMMDD)."""
+    if not os.path.isdir(outdir):
+        return {}
+    parts = {}
+    for name in os.listdir(outdir):
+        m = _PARTITION.match(name)
+        if m:
+            parts[m.group(1)] = os.path.join(outdir, name)
+    return dict(sorted(parts.items()))
+
+
+def _sum_columns(cube: pl.DataFrame) -> List[str]:
+    return [c for c in plot_cube.SUM_COLUMNS + plot_cube.PARTIAL_COLUMNS if c in cube.columns]
+
+
+def _stat(path: str) -> List[int]:
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime_ns]
+
+
+def combine(parts: List[Tuple[pl.DataFrame, int]]) -> pl.DataFrame:
+    """Sum of cubes, each multiplied by its sign (+1 or -1); groups left without rows are dropped."""
+    frames = []
+    for cube, sign in parts:
+        if cube.is_empty():
+            continue
+        sums = _sum_columns(cube)
+        frames.append(cube.with_columns(
+            [(pl.col(c).cast(pl.Float64 if cube[c].dtype.is_float() else pl.Int64) * sign).alias(c) for c in sums]))
+    if not frames:
+        return pl.DataFrame()
+    df = pl.concat(frames, how="diagonal_relaxed")
+    sums = _sum_columns(df)
+    key = [c for c in df.columns if c not in sums]
+    return (df.group_by(key)
+              .agg([pl.sum(c) for c in sums])
+              .filter(pl.col("n_rows") > 0)
+              .with_columns(pl.col("n_rows").cast(pl.UInt32))
+              .select(df.columns)
+              .sort(key, nulls_last=True))
+
+
+def window_dates(end: str, days: int) -> List[str]:
+    """The days dates ending at end (YYYYMMDD)."""
+    last = dt.datetime.strptime(end, "%Y%m%d")
+    return [(last - dt.timedelta(days=i)).strftime("%Y%m%d") for i in range(days - 1, -1, -1)]
+
+
+def update_window(partition_dir: str, out: str, days: int, end: Optional[str] = None) -> pl.DataFrame:
+    """
+    Cube of the trailing days-day window ending at end (default: the newest
+    partition), written to out. The dates and file stats of the window are kept
+    in out + ".json" for the next update.
+    """
+    parts = list_partitions(partition_dir)
+    if not parts:
+        raise ValueError(f"No daily partitions in {partition_dir}")
+    end = end or max(parts)
+    wanted = {d: parts[d] for d in window_dates(end, days) if d in parts}
+    stats = {d: _stat(p) for d, p in wanted.items()}
+
+    state_path = out + ".json"
+    previous: Dict[str, List[int]] = {}
+    if os.path.exists(state_path) and os.path.exists(out):
+        try:
+            with open(state_path, "r", encoding="utf-8") as f:
+                previous = json.load(f).get("days", {})
+        except (OSError, ValueError):
+            previous = {}
+    # Days kept in the window must be unchanged; the others are added or subtracted
+    kept = [d for d in wanted if d in previous]
+    incoming = [d for d in wanted if d not in previous]
+    outgoing = [d for d in previous if d not in wanted]
+    incremental = (previous and all(previous[d] == stats[d] for d in kept)
+                   and all(d in parts and _stat(parts[d]) == previous[d] for d in outgoing)
+                   and len(incoming) + len(outgoing) < len(wanted))
+    if incremental:
+        terms = [(pl.read_parquet(out), 1)]
+        terms += [(pl.read_parquet(parts[d]), 1) for d in incoming]
+        terms += [(pl.read_parquet(parts[d]), -1) for d in outgoing]
+        mode = f"+{len(incoming)}/-{len(outgoing)} days"
+    else:
+        terms = [(pl.read_parquet(p), 1) for p in wanted.values()]
+        mode = f"rebuilt from {len(terms)} days"
+    cube = combine(terms)
+
+    out_dir = os.path.dirname(out)
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+    tmp = f"{out}.{os.getpid()}.tmp"
+    cube.write_parquet(tmp)
+    os.replace(tmp, out)
+    with open(state_path, "w", encoding="utf-8") as f:
+        json.dump({"end": end, "window_days": days, "days": stats}, f, indent=1)
+    print(f"{days}-day window ending {end} saved to {out} ({mode}, rows={cube.height})")
+    return cube
+
+
+def _parse_window(value: str) -> Tuple[int, str]:
+    days, sep, out = value.partition("=")
+    if not sep or not days.isdigit() or int(days) < 1 or not out:
+        raise argparse.ArgumentTypeError(f"expected DAYS=OUT, got {value!r}")
+    return int(days), out
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Keep daily plot cube partitions and assemble trailing-window cubes from them.")
+    parser.add_argument("--partitions", required=True, help="Directory of the daily partitions.")
+    parser.add_argument("--metrics", nargs="+", help="Metrics parquet files to (re)partition first.")
+    parser.add_argument("--window", action="append", type=_parse_window, default=[],
+                        help="DAYS=OUT: cube of the trailing DAYS days (repeatable), e.g. 7=cube_7d.parquet.")
+    parser.add_argument("--end", help="Last day of the windows (YYYYMMDD; default: newest partition).")
+    args = parser.parse_args()
+
+    if args.metrics:
+        all_df = plot_cube.read_metrics(args.metrics)
+        if all_df is None:
+            print("No valid metrics loaded; aborting.")
+            sys.exit(1)
+        try:
+            written = write_partitions(all_df, args.partitions)
+        except ValueError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        print(f"Daily partitions in {args.partitions}: {len(written)} written"
+              + (f" ({', '.join(written)})" if written else ""))
+    for days, out in args.window:
+        try:
+            update_window(args.partitions, out, days, args.end)
+        except ValueError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
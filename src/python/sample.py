@@ -0,0 +1,100 @@
+"""
+Stratified samples and error bounds for fast previews (--sample FRACTION).
+
+A preview (verify.py --sample) verifies a fraction of the input files. Files are
+stratified by the hour of their forecast cycle, and each stratum is sampled
+systematically over its dates, so the sample spans the whole period and every
+cycle. The confidence intervals treat each
+sampled unit as a cluster of observations: ratio estimates of bias and mean
+squared error, with the between-unit variance and a finite population correction.
+"""
+import argparse
+import random
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import polars as pl
+
+# Two-sided 95 % normal quantile
+Z95 = 1.959963984540054
+
+
+def parse_fraction(text: str) -> float:
+    """A --sample fraction in (0, 1]; raises argparse.ArgumentTypeError otherwise."""
+    try:
+        value = float(text)
+    except ValueError:
+        value = -1.0
+    if not 0.0 < value <= 1.0:
+        raise argparse.ArgumentTypeError(f"expected a fraction in (0, 1], got {text!r}")
+    return value
+
+
+def resolve_seed(seed: Optional[int]) -> int:
+    """seed, or a new random one (printed with the preview so it can be repeated)."""
+    return seed if seed is not None else random.SystemRandom().randrange(2**31)
+
+
+def stratified_sample(units: Sequence[str], times: Sequence[Optional[int]], fraction: float, seed: int) -> List[str]:
+    """
+    About fraction of units (at least one per stratum), in their original order.
+    times[i] is the YYYYMMDDHH of units[i]; its hour is the stratum, and each
+    stratum is sampled every 1/fraction units in time order from a random start.
+    """
+    if fraction >= 1.0:
+        return list(units)
+    rng = random.Random(seed)
+    strata: Dict[Optional[int], List[Tuple[int, str]]] = {}
+    for unit, t in zip(units, times):
+        strata.setdefault(None if t is None else t % 100, []).append((t or 0, unit))
+    chosen = set()
+    for key in sorted(strata, key=lambda k: -1 if k is None else k):
+        members = sorted(strata[key])
+        k = max(1, round(len(members) * fraction))
+        step = len(members) / k
+        start = rng.random() * step
+        chosen.update(members[int(start + j * step)][1] for j in range(k))
+    return [u for u in units if u in chosen]
+
+
+def ratio_intervals(df: pl.DataFrame, group: Sequence[str], unit: str, count: str = "n",
+                    fraction: float = 0.0, z: float = Z95) -> pl.DataFrame:
+    """
+    bias and rmse per group with approximate confidence intervals. Rows of df
+    hold bias/rmse over count samples; the rows of one unit (file or valid time)
+    form one cluster. bias and mse are ratio estimates over the clusters; their
+    variance is the between-cluster variance, times 1 - fraction (the sampled
+    fraction of the population). rmse bounds are the square roots of the mse
+    bounds. Bounds are null for groups with fewer than two units.
+    """
+    group = [g for g in group if g in df.columns]
+    per_unit = (df.filter(pl.col(count) > 0)
+                  .group_by([*group, unit])
+                  .agg([pl.sum(count).cast(pl.Float64).alias("_n"),
+                        (pl.col("bias") * pl.col(count)).sum().alias("_e"),
+                        (pl.col("rmse").pow(2) * pl.col(count)).sum().alias("_s")]))
+    totals = (per_unit.group_by(group)
+                      .agg([pl.len().alias("n_units"), pl.sum("_n").alias("n"),
+                            pl.sum("_e").alias("_E"), pl.sum("_s").alias("_S")])
+                      .with_columns([(pl.col("_E") / pl.col("n")).alias("bias"),
+                                     (pl.col("_S") / pl.col("n")).alias("_mse")]))
+    fpc = max(0.0, 1.0 - fraction)
+    spread = (per_unit.join(totals.select([*group, "bias", "_mse"]), on=group, how="left", nulls_equal=True)
+                      .group_by(group)
+                      .agg([((pl.col("_e") - pl.col("bias") * pl.col("_n")).pow(2)).sum().alias("_ve"),
+                            ((pl.col("_s") - pl.col("_mse") * pl.col("_n")).pow(2)).sum().alias("_vs")]))
+    out = totals.join(spread, on=group, how="left", nulls_equal=True)
+    m = pl.col("n_units").cast(pl.Float64)
+    scale = pl.when(pl.col("n_units") > 1).then(fpc * m / (m - 1) / pl.col("n").pow(2)).otherwise(None)
+    out = out.with_columns([(z * (pl.col("_ve") * scale).sqrt()).alias("_be"),
+                            (z * (pl.col("_vs") * scale).sqrt()).alias("_me")])
+    return (out.with_columns([
+                (pl.col("bias") - pl.col("_be")).alias("bias_ci_low"),
+                (pl.col("bias") + pl.col("_be")).alias("bias_ci_high"),
+                pl.col("_mse").sqrt().alias("rmse"),
+                (pl.col("_mse") - pl.col("_me")).clip(lower_bound=0.0).sqrt().alias("rmse_ci_low"),
+                (pl.col("_mse") + pl.col("_me")).sqrt().alias("rmse_ci_high"),
+                pl.col("n").cast(pl.Int64),
+            ])
+            .select([*group, "n_units", "n", "bias", "bias_ci_low", "bias_ci_high", "rmse", "rmse_ci_low", "rmse_ci_high"])
+            .sort(group, nulls_last=True))
+
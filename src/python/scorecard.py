@@ -11,6 +11,10 @@ from sklearn.preprocessing import minmax_scale
 import json
 import matplotlib.gridspec as gridspec
 
+from . import plot_cube
+from .plot_cache import PlotCache, style_salt
+from .sample import Z95
+
 def _load_var_labels() -> dict:
     """Load variable name labels from var_names.json next to this file."""
     try:
@@ -44,7 +48,8 @@ def _order_variables_for_monitor(title: str, vars_found: list[str]) -> list[str]
 
 def plot_scorecard(df: pl.DataFrame, outdir: str, title: str, exp_names: list[str],
                    display_names: list[str], start_date: str, end_date: str,
-                   fcint: int | None) -> None:
+                   fcint: int | None, cache: PlotCache | None = None,
+                   preview_fraction: float | None = None) -> None:
     if len(exp_names) != 2:
         print("Need exactly two experiments.")
         return
@@ -93,6 +98,12 @@ def plot_scorecard(df: pl.DataFrame, outdir: str, title: str, exp_names: list[st
                 return_dtype=pl.Float64
             ).alias("significance")
         )
+        if preview_fraction:
+            # Sampled valid times: 95 % interval of the mean difference with a finite population correction
+            half = (Z95 * pl.col("diff_std") / pl.col("n_samples").sqrt()
+                    * math.sqrt(max(0.0, 1.0 - preview_fraction)))
+            stats = stats.with_columns([(pl.col("rmse_diff") - half).alias("rmse_diff_ci_low"),
+                                        (pl.col("rmse_diff") + half).alias("rmse_diff_ci_high")])
         work_df = stats
     else:
         agg = (df.group_by(["obstypevar", "lead_time", "experiment"])
@@ -114,7 +125,9 @@ def plot_scorecard(df: pl.DataFrame, outdir: str, title: str, exp_names: list[st
         print("\n--- Z-Score and Significance Data ---")
         output_df = work_df.select([
             "obstypevar", "lead_time", "rmse_diff", "z_score", "significance", "n_samples"
-        ])
+        ] + [c for c in ("rmse_diff_ci_low", "rmse_diff_ci_high") if c in work_df.columns])
+        if preview_fraction:
+            print(f"PREVIEW: {preview_fraction:.0%} of forecast files")
         print(output_df)
         
         # --- CSV Writing ---
@@ -125,24 +138,38 @@ def plot_scorecard(df: pl.DataFrame, outdir: str, title: str, exp_names: list[st
         except Exception as e:
             print(f"Failed to write z-score data: {e}\n")
         
-        # --- SQLite Writing (Correct Location) ---
-        sqlite_path = os.path.join(outdir, "metrics.sqlite")
-        try:
-            output_df.to_pandas().to_sql(
-                "scorecard_zscores", 
-                f"sqlite:///{sqlite_path}", 
-                if_exists="replace", 
-                index=False
-            )
-            print(f"Scorecard data also saved to SQLite table 'scorecard_zscores' in {sqlite_path}")
-        except Exception as e:
-            print(f"Failed to write scorecard data to SQLite: {e}\n")
+        # --- SQLite Writing (Correct Location); previews are not stored ---
+        if not preview_fraction:
+            sqlite_path = os.path.join(outdir, "metrics.sqlite")
+            try:
+                output_df.to_pandas().to_sql(
+                    "scorecard_zscores", 
+                    f"sqlite:///{sqlite_path}", 
+                    if_exists="replace", 
+                    index=False
+                )
+                print(f"Scorecard data also saved to SQLite table 'scorecard_zscores' in {sqlite_path}")
+            except Exception as e:
+                print(f"Failed to write scorecard data to SQLite: {e}\n")
 
 
     if work_df.is_empty():
         print("No diff data.")
         return
 
+    out_path = os.path.join(outdir, f"{title}_scorecard.png")
+    digest = None
+    if cache is not None:
+        # Variable order and labels depend on the monitor env lists and var_names.json
+        digest = cache.digest(
+            work_df.select(["obstypevar", "lead_time", "rmse_diff", "significance"]),
+            title, display_names, start_date, end_date, fcint, preview_fraction,
+            _parse_env_list("SURFPAR_MONITOR"), _parse_env_list("TEMPPAR_MONITOR"), _load_var_labels(),
+        )
+        if cache.is_current(out_path, digest):
+            print(f"Unchanged plot: {out_path}")
+            return
+
     # --- Start of new plotting logic from scorecard2.py ---
     df_plot = work_df.to_pandas()
 
@@ -315,6 +342,8 @@ def plot_scorecard(df: pl.DataFrame, outdir: str, title: str, exp_names: list[st
         lines.append(f"{start_date} - {end_date}")
     if fcint:
         lines.append(f"00, {fcint} UTC")
+    if preview_fraction:
+        lines.append(f"PREVIEW: {preview_fraction:.0%} of forecast files")
 
     ax_title.text(
         0.0, 1.0, "\n".join(lines),
@@ -343,12 +372,13 @@ def plot_scorecard(df: pl.DataFrame, outdir: str, title: str, exp_names: list[st
     )
 
     os.makedirs(outdir, exist_ok=True)
-    out_path = os.path.join(outdir, f"{title}_scorecard.png")
     # Save with a consistent pixel size so on-screen font sizes appear
     # uniform across domains; avoid automatic "tight" shrinking which can
     # change the output pixel size per plot content.
     fig.savefig(out_path, dpi=170)
     plt.close(fig)
+    if cache is not None:
+        cache.record(out_path, digest)
     print(f"Saved plot: {out_path}")
     # --- End of new plotting logic ---
 
@@ -370,27 +400,26 @@ def _expand_metrics(paths: list[str]) -> list[str]:
             uniq.append(f)
     return uniq
 
-def main():
-    parser = argparse.ArgumentParser(description="Generate scorecard plots.")
-    parser.add_argument("--exp-a", required=True)
-    parser.add_argument("--exp-b", required=True)
-    parser.add_argument("--exp-a-name", help="Short name for experiment A for display.")
-    parser.add_argument("--exp-b-name", help="Short name for experiment B for display.")
-    parser.add_argument("--metrics", nargs="+", required=True,
-                        help="Metrics parquet files or directories (auto-glob *_metrics.parquet).")
-    parser.add_argument("--outdir", required=True, help="Directory to save plots.")
-    parser.add_argument("--title", required=True, help="Scorecard title.")
-    parser.add_argument("--monitor-temp-cycles", type=int, help="Filter vt_hour by multiples of this cycle.")
-    parser.add_argument("--fcint", type=int, help="Forecast interval in hours to display in title.")
-    args = parser.parse_args()
-
-    exp_names = [args.exp_a, args.exp_b]
-    display_names = [args.exp_a_name or args.exp_a, args.exp_b_name or args.exp_b]
-
-    metric_files = _expand_metrics(args.metrics)
+def _load_cube(path: str, monitor_temp_cycles: int | None) -> pl.DataFrame | None:
+    """Per-(obstypevar, lead_time, vt_hour, experiment) means from the vt_hour view of a plot cube."""
+    try:
+        cube = pl.read_parquet(path)
+    except Exception as e:
+        print(f"Failed reading {path}: {e}")
+        return None
+    if cube.is_empty() or not plot_cube.has_view(cube, "vt_hour"):
+        print("Plot cube has no vt_hour view; aborting.")
+        return None
+    if monitor_temp_cycles:
+        print(f"Filtering by vt_hour cycle: {monitor_temp_cycles}")
+        cube = plot_cube.filter_cube(cube, hours=range(0, 24, monitor_temp_cycles))
+    return plot_cube.aggregate_view(cube, "vt_hour", group=["experiment", "obstypevar", "lead_time"])
+
+def _load_metrics(paths: list[str], monitor_temp_cycles: int | None) -> pl.DataFrame | None:
+    metric_files = _expand_metrics(paths)
     if not metric_files:
         print("No metrics files found.")
-        return
+        return None
 
     dfs = []
     for m in metric_files:
@@ -417,19 +446,68 @@ def main():
 
     if not dfs:
         print("No valid metrics loaded; aborting.")
-        return
+        return None
 
-    all_df = pl.concat(dfs, how="vertical_relaxed")
+    all_df = pl.concat(dfs, how="diagonal_relaxed")
 
     # Filter by monitor temp cycles if provided
-    if args.monitor_temp_cycles and 'vt_hour' in all_df.columns:
-        print(f"Filtering by vt_hour cycle: {args.monitor_temp_cycles}")
-        all_df = all_df.filter((pl.col("vt_hour") % 100) % args.monitor_temp_cycles == 0)
+    if monitor_temp_cycles and 'vt_hour' in all_df.columns:
+        print(f"Filtering by vt_hour cycle: {monitor_temp_cycles}")
+        all_df = all_df.filter((pl.col("vt_hour") % 100) % monitor_temp_cycles == 0)
+    return all_df
+
+def _preview_fraction(df: pl.DataFrame) -> float | None:
+    """Sampled fraction of preview metrics (verify.py --sample); None for full metrics."""
+    if "sample_fraction" not in df.columns:
+        return None
+    return df["sample_fraction"].min()
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate scorecard plots.")
+    parser.add_argument("--exp-a", required=True)
+    parser.add_argument("--exp-b", required=True)
+    parser.add_argument("--exp-a-name", help="Short name for experiment A for display.")
+    parser.add_argument("--exp-b-name", help="Short name for experiment B for display.")
+    parser.add_argument("--metrics", nargs="+",
+                        help="Metrics parquet files or directories (auto-glob *_metrics.parquet). "
+                             "Preview metrics of verify.py --sample give a preview scorecard.")
+    parser.add_argument("--cube", help="Pre-aggregated plot cube (plot_cube.py); used instead of --metrics.")
+    parser.add_argument("--outdir", required=True, help="Directory to save plots.")
+    parser.add_argument("--title", required=True, help="Scorecard title.")
+    parser.add_argument("--monitor-temp-cycles", type=int, help="Filter vt_hour by multiples of this cycle.")
+    parser.add_argument("--fcint", type=int, help="Forecast interval in hours to display in title.")
+    parser.add_argument("--no-plot-cache", action="store_true",
+                        help="Always re-render; do not consult or update the plot cache index.")
+    args = parser.parse_args()
+    if not args.metrics and not args.cube:
+        parser.error("one of --metrics or --cube is required")
+
+    exp_names = [args.exp_a, args.exp_b]
+    display_names = [args.exp_a_name or args.exp_a, args.exp_b_name or args.exp_b]
+
+    if args.cube:
+        all_df = _load_cube(args.cube, args.monitor_temp_cycles)
+        if all_df is None:
+            return
+    else:
+        all_df = _load_metrics(args.metrics, args.monitor_temp_cycles)
+        if all_df is None:
+            return
 
     start_date = all_df["vt_hour"].min()
     end_date = all_df["vt_hour"].max()
 
-    plot_scorecard(all_df, args.outdir, args.title, exp_names, display_names, start_date, end_date, args.fcint)
+    title = args.title
+    preview_fraction = _preview_fraction(all_df)
+    if preview_fraction:
+        print(f"PREVIEW metrics ({preview_fraction:.0%} of forecast files)")
+        title = f"{args.title}_preview"
+
+    cache = PlotCache(args.outdir, f"scorecard_{title}", salt=style_salt(args),
+                      code_files=[__file__], enabled=not args.no_plot_cache)
+    plot_scorecard(all_df, args.outdir, title, exp_names, display_names, start_date, end_date, args.fcint, cache,
+                   preview_fraction=preview_fraction)
+    cache.close()
     
     # REMOVED the incorrect SQLite logic from here
 
@@ -0,0 +1,222 @@
+import argparse
+import itertools
+import json
+import os
+import tempfile
+from typing import Dict, List, Optional
+
+import matplotlib
+import matplotlib.colors
+import polars as pl
+
+from . import plot_cube
+from .joint_plotting import BRACKET_MIDPOINTS, parse_mapping
+from .plot_templates import var_label_unit
+
+# Domain -> variable directory prefix, var_names.json group and (plot type, cube view) pairs.
+# Plot types and directories match the PNG names so the webapp can pair them.
+DOMAINS = {
+    "surface": {"prefix": "", "group": "surface",
+                "plots": [("lead_time_series", "lead_time"), ("vt_hour_series", "vt_hour")]},
+    "temp": {"prefix": "temp_", "group": "upper_air",
+             "plots": [("profile", "pressure_level"), ("lead_time_series", "lead_time"),
+                       ("vt_hour_series", "vt_hour")]},
+    # obsver profiles use channel when present, else pressure_bracket (as joint_plotting does)
+    "obsver": {"prefix": "", "group": None,
+               "plots": [("profile", "channel"), ("profile", "pressure_bracket"), ("timeseries", "vt_hour")]},
+}
+X_LABELS = {
+    "lead_time": "Lead Time (h)", "vt_hour": "Valid Time", "pressure_level": "Pressure (hPa)",
+    "pressure_bracket": "Pressure (hPa)", "channel": "Channel",
+}
+PROFILE_VIEWS = {"pressure_level", "pressure_bracket", "channel"}
+
+
+def _round(v: Optional[float], ndigits: int = 6) -> Optional[float]:
+    if v is None or v != v:
+        return None
+    return round(float(v), ndigits)
+
+
+def _ordered_x(values: List, view: str) -> List:
+    """x order as drawn top-to-bottom (profiles) or left-to-right (series)."""
+    if view == "pressure_bracket":
+        return sorted(values, key=lambda b: BRACKET_MIDPOINTS.get(b, 0))
+    return sorted(values)
+
+
+def _payload(df: pl.DataFrame, view: str, experiments: List[str]) -> Optional[dict]:
+    """Aggregated bias/rmse per experiment and summed counts, aligned on one x array."""
+    agg = plot_cube.aggregate_view(df, view)
+    if agg.is_empty():
+        return None
+    x = _ordered_x(agg[view].unique().to_list(), view)
+    pos = {v: i for i, v in enumerate(x)}
+    counts = [0] * len(x)
+    series: Dict[str, dict] = {}
+    for exp, x_val, bias, rmse, n in agg.select(["experiment", view, "bias", "rmse", "n_sum"]).iter_rows():
+        i = pos[x_val]
+        counts[i] += int(n or 0)
+        s = series.setdefault(exp, {"rmse": [None] * len(x), "bias": [None] * len(x)})
+        s["rmse"][i] = _round(rmse)
+        s["bias"][i] = _round(bias)
+    return {
+        "x": [str(v) if view == "vt_hour" else v for v in x],
+        "counts": counts,
+        "series": {e: series[e] for e in experiments if e in series},
+    }
+
+
+def _title(domain: str, var: str, plot_type: str, start_date, end_date,
+           cycle_hours: List[int], hours: Optional[List[str]]) -> List[str]:
+    spec = DOMAINS[domain]
+    if spec["group"] is None:
+        kind = "Vertical Profiles" if plot_type == "profile" else "Time Series"
+        lines = [f"{var} - {kind}"]
+    else:
+        label, unit = var_label_unit(spec["group"], var)
+        lines = [f"{label} [{unit}]" if unit else label]
+    if start_date and end_date:
+        lines.append(f"{start_date} - {end_date}")
+    hour_line = ""
+    if cycle_hours:
+        hour_line = ", ".join(f"{h:02d}" for h in cycle_hours) + " UTC"
+    if hours:
+        hrs = ", ".join(hours)
+        hour_line = f"{hour_line} + {{{hrs}}}" if hour_line else f"{{{hrs}}}"
+    if hour_line:
+        lines.append(hour_line)
+    return lines
+
+
+def _write_if_changed(path: str, doc: dict) -> bool:
+    data = json.dumps(doc, separators=(",", ":"), default=str)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            if f.read() == data:
+                return False
+    except OSError:
+        pass
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".series_", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except Exception:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+    return True
+
+
+def export_series(cube: pl.DataFrame, outdir: str, domain: str,
+                  exp_colors: Dict[str, str], exp_names: Dict[str, str],
+                  start_date=None, end_date=None, cycle_hours: Optional[List[int]] = None,
+                  hours: Optional[List[str]] = None) -> int:
+    """
+    Write one JSON document per variable and plot type next to where the PNG
+    would go (<outdir>/<var dir>/<var dir>_<plot type>.json). Non lead-time plots
+    carry a per-lead-time variant of the same series under "leads".
+    """
+    spec = DOMAINS[domain]
+    experiments = sorted(cube["experiment"].unique().to_list())
+    exp_meta = [{"id": e, "name": exp_names.get(e, e), "color": exp_colors.get(e)} for e in experiments]
+    written = 0
+    for var in sorted(cube["obstypevar"].unique().to_list()):
+        var_df = cube.filter(pl.col("obstypevar") == var)
+        var_dir = f"{spec['prefix']}{var}"
+        done_types = set()
+        for plot_type, view in spec["plots"]:
+            if plot_type in done_types or not plot_cube.has_view(var_df, view):
+                continue
+            view_df = var_df.filter(pl.col("view") == view)
+            doc = _payload(view_df, view, experiments)
+            if doc is None:
+                continue
+            done_types.add(plot_type)
+            if view != "lead_time" and "lead_time" in view_df.columns:
+                leads = sorted(v for v in view_df["lead_time"].unique().to_list() if v is not None)
+                doc["leads"] = {}
+                for lt in leads:
+                    sub = _payload(view_df.filter(pl.col("lead_time") == lt), view, experiments)
+                    if sub is not None:
+                        doc["leads"][str(lt)] = sub
+            unit = var_label_unit(spec["group"], var)[1] if spec["group"] else None
+            doc.update({
+                "version": 1,
+                "domain": domain,
+                "variable": var,
+                "plot_type": plot_type,
+                "kind": "profile" if view in PROFILE_VIEWS else "series",
+                "title": _title(domain, var, plot_type, start_date, end_date, cycle_hours or [], hours),
+                "x_label": X_LABELS[view],
+                "value_label": unit if unit else "Value",
+                "experiments": exp_meta,
+            })
+            plot_dir = os.path.join(outdir, var_dir)
+            os.makedirs(plot_dir, exist_ok=True)
+            path = os.path.join(plot_dir, f"{var_dir}_{plot_type}.json")
+            if _write_if_changed(path, doc):
+                written += 1
+                print(f"Saved series: {path}")
+            else:
+                print(f"Unchanged series: {path}")
+    return written
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Export plot series as JSON for client-side charts in the webapp.")
+    parser.add_argument("--cube", required=True, help="Plot cube parquet (plot_cube.py).")
+    parser.add_argument("--outdir", required=True, help="Plots directory served by the webapp.")
+    parser.add_argument("--domain", required=True, choices=sorted(DOMAINS), help="Naming and plot types to export.")
+    parser.add_argument("--exp-color", action="append", help="Experiment color mapping EXP=COLOR (repeatable).")
+    parser.add_argument("--exp-name", action="append", help="Experiment name mapping LONG_NAME=SHORT_NAME (repeatable).")
+    parser.add_argument("--fcint", type=int, help="Forecast interval in hours (title only).")
+    parser.add_argument("--monitor-temp-cycles", type=int, help="Keep only lead times that are multiples of this cycle.")
+    parser.add_argument("--hours", nargs="+", help="Filter: list of valid-time hours (integers).")
+    parser.add_argument("--start-date", help="Override start date for title.")
+    parser.add_argument("--end-date", help="Override end date for title.")
+    args = parser.parse_args()
+
+    cube = pl.read_parquet(args.cube)
+    if cube.is_empty():
+        print("Empty plot cube; aborting.")
+        return
+
+    lead_times = None
+    if args.monitor_temp_cycles:
+        max_lead_time = cube["lead_time"].max()
+        if max_lead_time is not None:
+            lead_times = range(args.monitor_temp_cycles, max_lead_time + 1, args.monitor_temp_cycles)
+    cube = plot_cube.filter_cube(cube, lead_times=lead_times, hours=args.hours or None)
+    if cube.is_empty():
+        print("All data removed after filtering; aborting.")
+        return
+
+    start_date = args.start_date or cube["vt_hour"].min()
+    end_date = args.end_date or cube["vt_hour"].max()
+
+    exp_colors = parse_mapping(args.exp_color, "exp-color")
+    default_cycle = itertools.cycle(matplotlib.rcParams['axes.prop_cycle'].by_key()['color'])
+    for e in sorted(cube["experiment"].unique().to_list()):
+        if e not in exp_colors:
+            exp_colors[e] = matplotlib.colors.to_hex(next(default_cycle))
+
+    # Title hours as in the PNGs: forecast cycles from --fcint, else the data's cycle hours
+    if args.fcint is not None:
+        cycle_hours = list(range(0, 24, args.fcint))
+    elif "cycle_hour" in cube.columns:
+        cycle_hours = sorted(h for h in cube["cycle_hour"].unique().to_list() if h is not None)
+    else:
+        cycle_hours = []
+
+    written = export_series(cube, args.outdir, args.domain, exp_colors,
+                            parse_mapping(args.exp_name, "exp-name"),
+                            start_date, end_date, cycle_hours, args.hours)
+    print(f"Series export done ({written} file(s) updated).")
+
+
+if __name__ == "__main__":
+    main()
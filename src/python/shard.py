@@ -0,0 +1,118 @@
+"""
+Deterministic assignment of input files to the shards of a multi-node run.
+
+verify.py and build_common_keys.py take --shard i/N (1 <= i <= N) and process
+only the files of shard i. With --shard-by hash, a file belongs to the shard
+given by a hash of its path relative to the data root, so nodes that mount the
+archive at different places agree. With --shard-by time, the files are ordered
+by the last YYYYMMDDHH in their name and split into N contiguous ranges of equal
+size. Shards need no communication; merge.py combines their outputs.
+
+Every shard output records its i/N: Parquet files in their key-value metadata,
+engine output directories in a shard.txt marker. merge.py only merges a complete
+set, shards 1..N of one N, each once.
+"""
+import argparse
+import hashlib
+import os
+import re
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import polars as pl
+
+SHARD_BY = ["hash", "time"]
+_DATE = re.compile(r"20\d{8}")
+# Parquet metadata key and engine output marker holding "i/N"
+METADATA_KEY = "obsver_shard"
+MARKER = "shard.txt"
+
+
+def parse_shard(text: str) -> Tuple[int, int]:
+    """(i, N) of an "i/N" shard; raises argparse.ArgumentTypeError when it is malformed."""
+    index, sep, count = text.partition("/")
+    if not sep or not index.isdigit() or not count.isdigit() or not 1 <= int(index) <= int(count):
+        raise argparse.ArgumentTypeError(f"expected i/N with 1 <= i <= N, got {text!r}")
+    return int(index), int(count)
+
+
+def shard_of(relpath: str, count: int) -> int:
+    """0-based shard of a relative path (first 8 bytes of its SHA-1)."""
+    digest = hashlib.sha1(relpath.replace(os.sep, "/").encode()).digest()
+    return int.from_bytes(digest[:8], "big") % count
+
+
+def file_time(path: str) -> Optional[int]:
+    """The last YYYYMMDDHH in a file name (the cycle of OFCTABLE and vfld files); None without one."""
+    found = _DATE.findall(os.path.basename(path))
+    return int(found[-1]) if found else None
+
+
+def _time_key(relpath: str) -> Tuple[int, str]:
+    return (file_time(relpath) or 0, relpath)
+
+
+def shard_files(files: Sequence[str], root: str, shard: Optional[Tuple[int, int]], by: str = "hash") -> List[str]:
+    """The files (below root) of shard (i, N), in their original order; all files without a shard."""
+    if shard is None or shard[1] == 1:
+        return list(files)
+    index, count = shard
+    rel = {f: os.path.relpath(f, root) for f in files}
+    if by == "time":
+        ordered = sorted(files, key=lambda f: _time_key(rel[f]))
+        n = len(ordered)
+        selected = set(ordered[(index - 1) * n // count:index * n // count])
+    else:
+        selected = {f for f in files if shard_of(rel[f], count) == index - 1}
+    return [f for f in files if f in selected]
+
+
+def shard_metadata(shard: Optional[Tuple[int, int]]) -> Optional[Dict[str, str]]:
+    """Parquet metadata (write_parquet(metadata=...)) recording shard (i, N); None without a shard."""
+    return {METADATA_KEY: f"{shard[0]}/{shard[1]}"} if shard else None
+
+
+def write_marker(outdir: str, shard: Optional[Tuple[int, int]]) -> None:
+    """Record shard (i, N) in outdir; without a shard, remove the marker of an earlier shard run."""
+    path = os.path.join(outdir, MARKER)
+    if shard:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(f"{shard[0]}/{shard[1]}\n")
+    elif os.path.exists(path):
+        os.remove(path)
+
+
+def read_shard(path: str) -> Optional[Tuple[int, int]]:
+    """(i, N) recorded in a shard output (Parquet file or engine directory); None when there is none."""
+    try:
+        if os.path.isdir(path):
+            with open(os.path.join(path, MARKER), "r", encoding="utf-8") as f:
+                text = f.read().strip()
+        else:
+            text = pl.read_parquet_metadata(path).get(METADATA_KEY, "")
+        return parse_shard(text)
+    except (OSError, argparse.ArgumentTypeError):
+        return None
+
+
+def check_complete(paths: Sequence[str]) -> int:
+    """
+    N of a complete shard set: exactly shards 1..N of one N, each once. Raises
+    ValueError naming the outputs without i/N, the duplicates or the missing shards.
+    """
+    shards = [(p, read_shard(p)) for p in paths]
+    unlabelled = [p for p, s in shards if s is None]
+    if unlabelled:
+        raise ValueError(f"{unlabelled[0]} records no shard i/N; only outputs of --shard runs can be merged.")
+    counts = sorted({s[1] for _, s in shards})
+    if len(counts) > 1:
+        raise ValueError(f"Shards of different counts N ({', '.join(map(str, counts))}) cannot be merged.")
+    count = counts[0]
+    seen: Dict[int, str] = {}
+    for p, (index, _) in shards:
+        if index in seen:
+            raise ValueError(f"Shard {index}/{count} is given twice ({seen[index]}, {p}).")
+        seen[index] = p
+    missing = [f"{i}/{count}" for i in range(1, count + 1) if i not in seen]
+    if missing:
+        raise ValueError(f"Missing shards {', '.join(missing)}; the shard set is incomplete.")
+    return count
@@ -7,17 +7,68 @@ from typing import List, Tuple, Optional
 import hashlib
 import sqlite3   # added
 
-def process_file(task_args: Tuple[str, str, str, str, bool, bool, Optional[int], Optional[str], int]) -> pl.DataFrame:
+from .sample import parse_fraction, ratio_intervals, resolve_seed, stratified_sample
+from .shard import SHARD_BY, file_time, parse_shard, read_shard, shard_files, shard_metadata
+
+def file_fingerprint(file_path: str) -> str:
+    st = os.stat(file_path)
+    return f"{os.path.abspath(file_path)}:{st.st_size}:{st.st_mtime_ns}"
+
+def _cache_file(cache_dir: str, kind: str, *parts: str) -> str:
+    digest = hashlib.sha256("\0".join(parts).encode()).hexdigest()
+    return os.path.join(cache_dir, f"{kind}_{digest}.parquet")
+
+def _write_parquet_atomic(df: pl.DataFrame, path: str) -> None:
+    tmp = f"{path}.{os.getpid()}.tmp"
+    df.write_parquet(tmp)
+    os.replace(tmp, path)
+
+def result_cache_path(con, file_path: str, sql: str, exp_name: str, obstypevar: str, fcint: Optional[int],
+                      key_filter: Optional[str], round_dec: int, cache_dir: str) -> str:
+    """
+    Cache file of the metrics of one SQLite file (attached as db1), keyed by the file's
+    path, size and mtime and by the query. With a key filter, the key also covers the
+    filter keys that occur in the file (their count and hash sum over the file's keys,
+    which are cached as well), so keys added for other files do not invalidate it.
+    """
+    fingerprint = file_fingerprint(file_path)
+    parts = [fingerprint, sql, exp_name]
+    if key_filter:
+        keys_path = _cache_file(cache_dir, "keys", fingerprint, obstypevar, str(fcint), str(round_dec))
+        if not os.path.exists(keys_path):
+            keys = con.execute(f"""
+                SELECT DISTINCT {obs_key_sql(round_dec)} AS obs_key
+                FROM db1.{obstypevar}
+                {where_sql(fcint)}
+            """).pl()
+            _write_parquet_atomic(keys, keys_path)
+        n_keys, key_sum = con.execute(f"""
+            SELECT COUNT(*), COALESCE(SUM(CAST(hash(obs_key) AS HUGEINT)), 0)
+            FROM read_parquet('{keys_path}')
+            WHERE obs_key IN (SELECT obs_key FROM read_parquet('{key_filter}'))
+        """).fetchone()
+        parts += [str(n_keys), str(key_sum)]
+    return _cache_file(cache_dir, "metrics", *parts)
+
+def process_file(task_args: Tuple[str, str, str, str, bool, bool, Optional[int], Optional[str], int, Optional[str]]) -> pl.DataFrame:
     """
     Execute the verification SQL against a single SQLite file and return a Polars DataFrame.
+    With a cache directory, the result of an unchanged file is read from the cache.
     """
-    file_path, exp_name, obstypevar, parameter, by_lead, by_model, fcint, key_filter, round_dec = task_args
+    file_path, exp_name, obstypevar, parameter, by_lead, by_model, fcint, key_filter, round_dec, cache_dir = task_args
     try:
         con = duckdb.connect(database=":memory:", read_only=False)
         con.execute("INSTALL sqlite; LOAD sqlite;")
         con.execute(f"ATTACH '{file_path}' AS db1 (TYPE SQLITE);")
         sql = build_sql(by_lead=by_lead, by_model=by_model, obstypevar=obstypevar, fcint=fcint,
                         key_filter=key_filter, round_dec=round_dec, parameter=parameter)
+        cache_path = None
+        if cache_dir:
+            cache_path = result_cache_path(con, file_path, sql, exp_name, obstypevar, fcint, key_filter,
+                                           round_dec, cache_dir)
+            if os.path.exists(cache_path):
+                con.close()
+                return pl.read_parquet(cache_path)
         df = con.execute(sql).pl()
         df = df.with_columns([
             pl.lit(exp_name).alias("experiment"),
@@ -25,6 +76,8 @@ def process_file(task_args: Tuple[str, str, str, str, bool, bool, Optional[int],
             pl.lit(os.path.basename(file_path)).alias("source")
         ])
         con.close()
+        if cache_path:
+            _write_parquet_atomic(df, cache_path)
         return df
     except Exception as e:
         print(f"Error processing {file_path}: {e}")
@@ -78,30 +131,14 @@ def build_sql(by_lead: bool, by_model: bool, obstypevar: str, fcint: Optional[in
 
     select_str = ", ".join(select_cols)
 
-    # WHERE clause (single construction; removed earlier duplicate)
-    where_clauses = []
-    if fcint is not None and fcint > 0:
-        if 24 % fcint != 0:
-            raise ValueError(f"fcint ({fcint}) must divide 24 evenly.")
-        allowed_hours = ",".join(str(h) for h in range(0, 24, fcint))
-        where_clauses.append(f"(CAST(fcst_dttm AS BIGINT) % 100) IN ({allowed_hours})")
-
     key_join = ""
     if key_filter:
         select_str += f""",
-        CAST(hash(
-            CAST(fcst_dttm AS BIGINT),
-            CAST(valid_dttm AS BIGINT),
-            SID,
-            parameter,
-            level,
-            CAST(ROUND(lon * POW(10,{round_dec})) AS BIGINT),
-            CAST(ROUND(lat * POW(10,{round_dec})) AS BIGINT)
-        ) AS HUGEINT) AS obs_key
+        {obs_key_sql(round_dec)} AS obs_key
         """
         key_join = f"INNER JOIN read_parquet('{key_filter}') mk USING (obs_key)"
 
-    where_str = f"WHERE {' AND '.join(where_clauses)}" if where_clauses else ""
+    where_str = where_sql(fcint)
     group_cols_no_obskey = [c for c in group_by_cols if c != 'obs_key']
     group_list = ", ".join(group_cols_no_obskey)
 
@@ -122,6 +159,28 @@ def build_sql(by_lead: bool, by_model: bool, obstypevar: str, fcint: Optional[in
         GROUP BY {group_list}
     """
 
+def where_sql(fcint: Optional[int]) -> str:
+    """WHERE clause keeping the forecast cycles of fcint (empty without fcint)."""
+    where_clauses = []
+    if fcint is not None and fcint > 0:
+        if 24 % fcint != 0:
+            raise ValueError(f"fcint ({fcint}) must divide 24 evenly.")
+        allowed_hours = ",".join(str(h) for h in range(0, 24, fcint))
+        where_clauses.append(f"(CAST(fcst_dttm AS BIGINT) % 100) IN ({allowed_hours})")
+    return f"WHERE {' AND '.join(where_clauses)}" if where_clauses else ""
+
+def obs_key_sql(round_dec: int) -> str:
+    """Observation key expression, as written by build_common_keys.py."""
+    return f"""CAST(hash(
+            CAST(fcst_dttm AS BIGINT),
+            CAST(valid_dttm AS BIGINT),
+            SID,
+            parameter,
+            level,
+            CAST(ROUND(lon * POW(10,{round_dec})) AS BIGINT),
+            CAST(ROUND(lat * POW(10,{round_dec})) AS BIGINT)
+        ) AS HUGEINT)"""
+
 def find_input_files(root: str, obstypevar: str) -> List[str]:
     """
     Recursively find all SQLite files matching the expected naming pattern for an obstypevar.
@@ -163,12 +222,41 @@ def main() -> None:
     parser.add_argument("--round-dec", type=int, default=2, help="Rounding decimals for lat/lon (must match key file).")
     parser.add_argument("--strict-missing", action="store_true",
                         help="Fail if any input file is missing the required table.")
+    parser.add_argument("--cache-dir",
+                        help="Cache of per-file metrics: reruns query only new or changed files "
+                             "and do not rewrite an unchanged output file.")
+    parser.add_argument("--shard", type=parse_shard,
+                        help="i/N: process only the files of shard i of N (merge the outputs with merge.py).")
+    parser.add_argument("--shard-by", choices=SHARD_BY, default="hash",
+                        help="Assign files to shards by a hash of their path or by time range (default: hash).")
+    parser.add_argument("--sample", type=parse_fraction,
+                        help="Preview: verify only this fraction of the files, stratified by cycle hour and date, "
+                             "into <out stem>_preview.parquet (--out is not touched), with confidence intervals "
+                             "of bias and rmse.")
+    parser.add_argument("--seed", type=int,
+                        help="Random seed of --sample (default: a new one, printed). Use the same seed for "
+                             "experiments that are compared, so they sample the same cycles.")
     args = parser.parse_args()
+    if args.sample:
+        # A preview never replaces the metrics of a full run
+        args.out = os.path.splitext(args.out)[0] + "_preview.parquet"
+    if args.cache_dir:
+        os.makedirs(args.cache_dir, exist_ok=True)
 
     files = find_input_files(args.data_root, args.obstypevar)
+    if args.shard:
+        total = len(files)
+        files = shard_files(files, args.data_root, args.shard, args.shard_by)
+        print(f"[verify] Shard {args.shard[0]}/{args.shard[1]} (by {args.shard_by}): {len(files)} of {total} files")
+    if args.sample:
+        seed = resolve_seed(args.seed)
+        total = len(files)
+        files = stratified_sample(files, [file_time(f) for f in files], args.sample, seed)
+        print(f"[verify] PREVIEW: sampled {len(files)} of {total} files "
+              f"(fraction {args.sample:g}, seed {seed}, stratified by cycle hour)")
     if not files:
         print("No matching SQLite files found.")
-        pl.DataFrame().write_parquet(args.out)
+        pl.DataFrame().write_parquet(args.out, metadata=shard_metadata(args.shard))
         print(f"Verification metrics saved to {args.out}")
         return
 
@@ -189,13 +277,13 @@ def main() -> None:
             print(f"  ... ({len(missing)-8} more)")
         if args.strict_missing:
             print("Strict mode: aborting due to missing tables.")
-            pl.DataFrame().write_parquet(args.out)
+            pl.DataFrame().write_parquet(args.out, metadata=shard_metadata(args.shard))
             print(f"Verification metrics saved to {args.out}")
             return
 
     if not present:
         print("All files missing required table; nothing to process.")
-        pl.DataFrame().write_parquet(args.out)
+        pl.DataFrame().write_parquet(args.out, metadata=shard_metadata(args.shard))
         print(f"Verification metrics saved to {args.out}")
         return
 
@@ -203,7 +291,7 @@ def main() -> None:
           f"(skipped {len(missing)}).")
 
     pool_args = [(f, args.exp_name, args.obstypevar, args.parameter, args.by_lead, args.by_model,
-                  args.fcint, args.key_filter, args.round_dec) for f in present]
+                  args.fcint, args.key_filter, args.round_dec, args.cache_dir) for f in present]
 
     with Pool(args.jobs) as p:
         results = p.map(process_file, pool_args)
@@ -211,13 +299,38 @@ def main() -> None:
     non_empty = [df for df in results if not df.is_empty()]
     if not non_empty:
         print("All queries returned empty; writing empty metrics file.")
-        pl.DataFrame().write_parquet(args.out)
+        pl.DataFrame().write_parquet(args.out, metadata=shard_metadata(args.shard))
         print(f"Verification metrics saved to {args.out}")
         return
 
     final_df = pl.concat(non_empty, how="vertical_relaxed")
-    final_df.write_parquet(args.out)
-    print(f"Verification metrics saved to {args.out} (rows={final_df.height})")
+    if args.sample:
+        final_df = final_df.with_columns([pl.lit(True).alias("preview"),
+                                          pl.lit(args.sample).alias("sample_fraction")])
+    unchanged = False
+    if args.cache_dir and not args.sample and os.path.exists(args.out) and read_shard(args.out) == args.shard:
+        try:
+            unchanged = pl.read_parquet(args.out).equals(final_df)
+        except Exception:
+            unchanged = False
+    if unchanged:
+        # Not rewritten, so later steps stay up to date; the SQLite table below is still refreshed
+        print(f"Verification metrics in {args.out} are unchanged (rows={final_df.height})")
+    else:
+        final_df.write_parquet(args.out, metadata=shard_metadata(args.shard))
+        print(f"Verification metrics saved to {args.out} (rows={final_df.height})")
+    if args.sample:
+        # Approximate 95 % intervals: each sampled file is one cluster of observations
+        group = ["experiment", "obstypevar", "lead_time", "fcst_model"]
+        ci = ratio_intervals(final_df, group, unit="source", fraction=args.sample)
+        ci_path = os.path.splitext(args.out)[0] + "_ci.parquet"
+        ci.write_parquet(ci_path)
+        with pl.Config(tbl_rows=20, tbl_cols=-1, float_precision=3):
+            print(f"PREVIEW ({args.sample:.0%} of files) with approximate 95 % confidence intervals:")
+            print(ci)
+        print(f"Confidence intervals saved to {ci_path}")
+    if args.shard or args.sample:
+        return  # shard outputs are partial and previews are not results; neither goes to SQLite
     # --- NEW: Save to SQLite ---
     sqlite_path = os.path.join(os.path.dirname(args.out), "metrics.sqlite")
     table_name = f"{args.exp_name}_{args.obstypevar}"
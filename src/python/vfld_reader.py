@@ -0,0 +1,337 @@
+"""
+Columnar reader for vfld/vobs files.
+
+Parses the formats read by the C++ engine (read_data_file in
+src/cpp/FileUtils.cpp): version <= 3 with the fixed surface columns, versions
+4/5 with a variable list, and the temp-profile block. Every block is parsed in
+one pass over its bytes with NumPy, not line by line in Python. Variable handling
+follows the engine: station pressure comes from SPS or else PSS, the model
+height of vfld files from FI (or hgt), the last column wins when a name
+repeats, and variables a file lacks are -999.0. As in the files, values <= -98
+are missing.
+"""
+import argparse
+import datetime as dt
+import os
+import re
+from multiprocessing import Pool
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import polars as pl
+
+MISSING = -999.0
+
+# Output column -> file columns it is read from (the first one present wins)
+SURFACE_FIELDS: List[Tuple[str, Tuple[str, ...]]] = [
+    ("NN", ("NN",)), ("DD", ("DD",)), ("FF", ("FF",)), ("TT", ("TT",)), ("RH", ("RH",)), ("PS", ("PS",)),
+    ("SPS", ("SPS", "PSS")),
+    ("PE", ("PE",)), ("PE1", ("PE1",)), ("PE3", ("PE3",)), ("PE6", ("PE6",)), ("PE12", ("PE12",)),
+    ("PE24", ("PE24",)), ("QQ", ("QQ",)), ("VI", ("VI",)), ("TD", ("TD",)), ("TX", ("TX",)), ("TN", ("TN",)),
+    ("GG", ("GG",)), ("GX", ("GX",)), ("FX", ("FX",)), ("TTHA", ("TTHA",)), ("CH", ("CH",)), ("LC", ("LC",)),
+]
+# vfld files carry the model height as a variable instead of a fixed column
+VFLD_HEIGHT_FIELD = ("hgt", ("FI", "hgt"))
+TEMP_FIELDS: List[Tuple[str, Tuple[str, ...]]] = [
+    (name, (name,)) for name in ("PP", "TT", "FI", "TD", "RH", "QQ", "DD", "FF")
+]
+# Surface columns of version <= 3 files
+V3_SURFACE_COLUMNS = ["NN", "DD", "FF", "TT", "RH", "PS", "PE", "QQ", "VI", "TD", "TX", "TN", "GG", "GX", "FX"]
+
+META_SCHEMA = {"experiment": pl.Utf8, "base_time": pl.Int64, "lead_time": pl.Int32, "valid_time": pl.Int64}
+SURFACE_SCHEMA = {**META_SCHEMA, "station_id": pl.Int32, "lat": pl.Float64, "lon": pl.Float64, "hgt": pl.Float64,
+                  **{name: pl.Float64 for name, _ in SURFACE_FIELDS}}
+TEMP_SCHEMA = {**META_SCHEMA, "station_id": pl.Int32, **{name: pl.Float64 for name, _ in TEMP_FIELDS}}
+
+# Bytes bytes.split() separates on
+_SPACE = np.zeros(256, dtype=bool)
+_SPACE[[9, 10, 11, 12, 13, 32]] = True
+_INT = re.compile(rb"[ \t\r\v\f]*\+?(-?[0-9]+)")
+
+
+def parse_name(path: str) -> Optional[Tuple[str, int, Optional[int], int]]:
+    """
+    (kind, base_time, lead_time, valid_time) of a vfld<exp>YYYYMMDDHHLL or
+    vobsYYYYMMDDHH file name, as the engine's parse_filename reads it; None for
+    other names. lead_time is None for vobs files.
+    """
+    name = os.path.basename(path)
+    for kind, n in (("vfld", 12), ("vobs", 10)):
+        digits = name[-n:]
+        if name.startswith(kind) and len(name) >= 4 + n and digits.isdigit() and digits.isascii() \
+                and digits.startswith("20"):
+            if kind == "vobs":
+                return kind, int(digits), None, int(digits)
+            base_time, lead_time = int(digits[:10]), int(digits[10:])
+            valid = dt.datetime.strptime(digits[:10], "%Y%m%d%H") + dt.timedelta(hours=lead_time)
+            return kind, base_time, lead_time, int(valid.strftime("%Y%m%d%H"))
+    return None
+
+
+class _Lines:
+    """Line offsets of a file buffer (a last line without newline counts, as with getline)."""
+
+    def __init__(self, data: bytes):
+        self.data = data
+        newlines = np.flatnonzero(np.frombuffer(data, dtype=np.uint8) == 10)
+        self.starts = np.concatenate(([0], newlines + 1))
+        self.ends = np.concatenate((newlines, [len(data)]))
+        if len(data) == 0 or data.endswith(b"\n"):
+            self.starts, self.ends = self.starts[:-1], self.ends[:-1]
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def line(self, i: int) -> bytes:
+        return self.data[self.starts[i]:self.ends[i]]
+
+    def block(self, first: int, stop: int) -> bytes:
+        """Lines first .. stop - 1 with their separating newlines."""
+        if first >= stop:
+            return b""
+        return self.data[self.starts[first]:self.ends[stop - 1]]
+
+
+def _to_float(tokens: List[bytes]) -> Tuple[np.ndarray, np.ndarray]:
+    """Values of the tokens and a mask of tokens that are not numbers."""
+    try:
+        return np.array(tokens, dtype=bytes).astype(np.float64), np.zeros(len(tokens), dtype=bool)
+    except ValueError:
+        pass
+    values = np.empty(len(tokens))
+    bad = np.zeros(len(tokens), dtype=bool)
+    for i, t in enumerate(tokens):  # malformed files only
+        try:
+            values[i] = float(t)
+        except ValueError:
+            values[i], bad[i] = np.nan, True
+    return values, bad
+
+
+def _parse_rows(block: bytes, nrows: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Parse nrows newline separated rows of whitespace separated numbers at once.
+    Returns the values as a (nrows, longest row) array padded with NaN, and the
+    number of values per row: like the engine's tokenizer, a row ends at its
+    first token that is not a number.
+    """
+    if nrows == 0:
+        return np.empty((0, 0)), np.zeros(0, dtype=np.int64)
+    buf = np.frombuffer(block, dtype=np.uint8)
+    space = _SPACE[buf]
+    starts = np.flatnonzero(~space & np.concatenate(([True], space[:-1])))
+    row = np.cumsum(buf == 10)[starts]
+    values, bad = _to_float(block.split())
+    counts = np.bincount(row, minlength=nrows)
+    col = np.arange(len(values)) - np.concatenate(([0], np.cumsum(counts)[:-1]))[row]
+    n_values = counts.copy()
+    np.minimum.at(n_values, row[bad], col[bad])
+    keep = col < n_values[row]
+    out = np.full((nrows, int(n_values.max()) if len(n_values) else 0), np.nan)
+    out[row[keep], col[keep]] = values[keep]
+    return out, n_values
+
+
+def _first_int(line: bytes) -> int:
+    """Integer at the start of a line (the engine's parse_count)."""
+    match = _INT.match(line)
+    if not match:
+        raise ValueError(f"expected an integer, got {line.decode(errors='replace')!r}")
+    return int(match.group(1))
+
+
+def _column(values: np.ndarray, n_values: np.ndarray, columns: Sequence[str], names: Tuple[str, ...]) -> np.ndarray:
+    """
+    Values of the first of names present in columns (the last column of that
+    name), per row falling back to the next name where a row is too short, else MISSING.
+    """
+    out = np.full(len(n_values), MISSING)
+    todo = np.ones(len(n_values), dtype=bool)
+    for name in names:
+        if name not in columns:
+            continue
+        col = len(columns) - 1 - columns[::-1].index(name)
+        if col >= values.shape[1]:
+            continue
+        take = todo & (col < n_values)
+        out[take] = values[take, col]
+        todo &= ~take
+    return out
+
+
+def read_file(path: str, is_vfld: Optional[bool] = None) -> Tuple[Dict[str, np.ndarray], Dict[str, np.ndarray]]:
+    """
+    Read one vfld/vobs file into surface and temp columns (NumPy arrays keyed by
+    column name, see SURFACE_SCHEMA/TEMP_SCHEMA without the file columns). is_vfld
+    defaults to the file name prefix. Unreadable parts are dropped with a warning,
+    like the engine does.
+    """
+    if is_vfld is None:
+        is_vfld = os.path.basename(path).startswith("vfld")
+    with open(path, "rb") as f:
+        lines = _Lines(f.read())
+    surface: Dict[str, np.ndarray] = {}
+    temp: Dict[str, np.ndarray] = {}
+    fixed = 3 if is_vfld else 4  # id lat lon [hgt]
+    try:
+        if len(lines) == 0:
+            return _empty_columns(SURFACE_SCHEMA), _empty_columns(TEMP_SCHEMA)
+        header, n_header = _parse_rows(lines.line(0), 1)
+        num_stat, num_temp, version = (int(header[0, i]) if i < n_header[0] else 0 for i in range(3))
+        i = 1
+        if version <= 3:
+            i += 1
+            columns = V3_SURFACE_COLUMNS
+        elif version in (4, 5):
+            ninvar = _first_int(lines.line(i))
+            i += 1
+            columns = [(lines.line(k).split() or [b""])[0].decode() for k in range(i, min(i + ninvar, len(lines)))]
+            i += ninvar
+        else:
+            columns = []
+
+        # Station lines up to the first empty one
+        stop = min(i + max(num_stat, 0), len(lines))
+        empty = np.flatnonzero(lines.ends[i:stop] == lines.starts[i:stop])
+        n_stat = int(empty[0]) if len(empty) else stop - i
+        values, n_values = _parse_rows(lines.block(i, i + n_stat), n_stat)
+        values = np.pad(values, ((0, 0), (0, max(0, fixed - values.shape[1]))), constant_values=np.nan)
+        surface["station_id"] = np.where(n_values > 0, values[:, 0], -1).astype(np.int32)
+        surface["lat"] = np.where(n_values > 1, values[:, 1], MISSING)
+        surface["lon"] = np.where(n_values > 2, values[:, 2], MISSING)
+        surface["hgt"] = np.where(n_values > 3, values[:, 3], MISSING) if not is_vfld else np.full(n_stat, MISSING)
+        n_vars = np.maximum(n_values - fixed, 0)
+        var_values = values[:, fixed:]
+        if is_vfld:
+            surface["hgt"] = _column(var_values, n_vars, columns, VFLD_HEIGHT_FIELD[1])
+        for name, sources in SURFACE_FIELDS:
+            surface[name] = _column(var_values, n_vars, columns, sources)
+        i += n_stat + (1 if n_stat < num_stat and i + n_stat < len(lines) else 0)
+
+        if num_temp > 0:
+            temp = _read_temp(lines, i, num_temp)
+    except ValueError as e:
+        print(f"Warning: Exception caught while reading {path}: {e}. Skipping file.")
+    if not surface:
+        surface = _empty_columns(SURFACE_SCHEMA)
+    if not temp:
+        temp = _empty_columns(TEMP_SCHEMA)
+    return surface, temp
+
+
+def _read_temp(lines: _Lines, i: int, num_temp: int) -> Dict[str, np.ndarray]:
+    """Temp block from line i: level count, variable list, then per station a header and its level lines."""
+    if i >= len(lines) or lines.starts[i] == lines.ends[i]:
+        return {}
+    num_lev = _first_int(lines.line(i))
+    if i + 1 >= len(lines) or lines.starts[i + 1] == lines.ends[i + 1]:
+        return {}
+    ninvar = _first_int(lines.line(i + 1))
+    i += 2
+    columns = [(lines.line(k).split() or [b""])[0].decode() for k in range(i, min(i + ninvar, len(lines)))]
+    i += ninvar
+
+    # Every station takes one header line and num_lev level lines; stop at an empty header
+    stride = 1 + max(num_lev, 0)
+    headers = i + stride * np.arange(num_temp)
+    headers = headers[headers < len(lines)]
+    empty = np.flatnonzero(lines.ends[headers] == lines.starts[headers])
+    if len(empty):
+        headers = headers[:empty[0]]
+    if len(headers) == 0:
+        return {}
+    stop = min(headers[-1] + stride, len(lines))
+    values, n_values = _parse_rows(lines.block(i, stop), stop - i)
+    if values.shape[1] == 0:
+        return {}
+    station_of_header = np.where(n_values[headers - i] > 0, values[headers - i, 0], -1)
+    level_rows = (headers[:, None] + np.arange(1, stride)).ravel()
+    station_ids = np.repeat(station_of_header, stride - 1)
+    keep = level_rows < stop
+    level_rows, station_ids = level_rows[keep] - i, station_ids[keep]
+    keep = n_values[level_rows] > 0  # lines without values are skipped
+    level_rows, station_ids = level_rows[keep], station_ids[keep]
+
+    temp = {"station_id": station_ids.astype(np.int32)}
+    for name, sources in TEMP_FIELDS:
+        temp[name] = _column(values[level_rows], n_values[level_rows], columns, sources)
+    return temp
+
+
+def _empty_columns(schema: Dict[str, pl.DataType]) -> Dict[str, np.ndarray]:
+    return {name: np.empty(0, dtype=np.int32 if dtype == pl.Int32 else np.float64)
+            for name, dtype in schema.items() if name not in META_SCHEMA}
+
+
+def _frame(columns: Dict[str, np.ndarray], schema: Dict[str, pl.DataType], meta: Dict[str, object],
+           nulls: bool) -> pl.DataFrame:
+    n = len(columns["station_id"])
+    df = pl.DataFrame({**{k: pl.Series(k, [v] * n, dtype=META_SCHEMA[k]) for k, v in meta.items()}, **columns})
+    df = df.select([pl.col(k).cast(t) for k, t in schema.items()])
+    if nulls:
+        values = [k for k, t in schema.items() if t == pl.Float64 and k not in ("lat", "lon")]
+        df = df.with_columns([pl.when(pl.col(c) > -98.0).then(pl.col(c)).alias(c) for c in values])
+    return df
+
+
+def _read_columns(path: str) -> Tuple[Dict[str, object], Dict[str, np.ndarray], Dict[str, np.ndarray]]:
+    """File columns and the surface and temp columns of one file; NumPy only, so pool workers never touch polars."""
+    parsed = parse_name(path)
+    kind, base_time, lead_time, valid_time = parsed if parsed else (None, None, None, None)
+    surface, temp = read_file(path, kind == "vfld" if kind else None)
+    experiment = os.path.basename(os.path.dirname(os.path.abspath(path))) if kind == "vfld" else "observation"
+    meta = {"experiment": experiment, "base_time": base_time, "lead_time": lead_time, "valid_time": valid_time}
+    return meta, surface, temp
+
+
+def read_frames(path: str, nulls: bool = False) -> Tuple[pl.DataFrame, pl.DataFrame]:
+    """
+    Surface and temp frames of one file, with the file's experiment (the vfld
+    directory name, "observation" for vobs), base_time, lead_time and valid_time.
+    With nulls, missing values (<= -98) become null.
+    """
+    meta, surface, temp = _read_columns(path)
+    return _frame(surface, SURFACE_SCHEMA, meta, nulls), _frame(temp, TEMP_SCHEMA, meta, nulls)
+
+
+def read_files(paths: Sequence[str], jobs: int = 4, nulls: bool = False) -> Tuple[pl.DataFrame, pl.DataFrame]:
+    """Read many files on a process pool into one surface and one temp frame (in path order)."""
+    if jobs > 1 and len(paths) > 1:
+        with Pool(jobs) as pool:
+            results = pool.map(_read_columns, paths, chunksize=max(1, len(paths) // (4 * jobs)))
+    else:
+        results = [_read_columns(p) for p in paths]
+    if not results:
+        return pl.DataFrame(schema=SURFACE_SCHEMA), pl.DataFrame(schema=TEMP_SCHEMA)
+    surface = pl.concat([_frame(s, SURFACE_SCHEMA, meta, nulls) for meta, s, _ in results])
+    temp = pl.concat([_frame(t, TEMP_SCHEMA, meta, nulls) for meta, _, t in results])
+    return surface, temp
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Convert vfld/vobs files to Parquet (surface and temp tables).")
+    parser.add_argument("files", nargs="+", help="vfld/vobs files or directories (searched recursively).")
+    parser.add_argument("--out", required=True, help="Output Parquet file for the surface stations.")
+    parser.add_argument("--temp-out", help="Output Parquet file for the temp profiles.")
+    parser.add_argument("--jobs", type=int, default=4, help="Number of parallel jobs.")
+    parser.add_argument("--nulls", action="store_true", help="Write missing values (<= -98) as null.")
+    args = parser.parse_args()
+
+    paths: List[str] = []
+    for f in args.files:
+        if os.path.isdir(f):
+            for root, _, names in os.walk(f):
+                paths.extend(os.path.join(root, n) for n in names if parse_name(n))
+        else:
+            paths.append(f)
+    paths.sort()
+    surface, temp = read_files(paths, jobs=args.jobs, nulls=args.nulls)
+    surface.write_parquet(args.out)
+    print(f"Surface data of {len(paths)} files saved to {args.out} (rows={surface.height})")
+    if args.temp_out:
+        temp.write_parquet(args.temp_out)
+        print(f"Temp data saved to {args.temp_out} (rows={temp.height})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+"""
+Near-real-time watch mode: verifies new forecast cycles as they arrive.
+
+The vfld, vobs and OFCTABLE directories of an Env_exp_* configuration are polled.
+A file is settled once its size and mtime did not change between two polls and
+it is older than --settle seconds. A cycle (forecast base time) is complete when
+every experiment has it and each experiment has at least the lead times (monitor)
+or observation types (obsver) of its previous cycle at the same hour, or when a
+later cycle of every experiment has started.
+
+Each new complete cycle runs the pipeline of pipeline.py up to that cycle. Work
+is incremental: the monitor engine verifies only new valid times (--state-dir),
+verify.py and build_common_keys.py query only new OFCTABLE files (--cache-dir),
+and steps whose inputs are unchanged, such as scorecards of an unchanged cube,
+are skipped.
+"""
+import argparse
+import datetime as dt
+import os
+import re
+import sys
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+from . import pipeline
+from .vfld_reader import parse_name
+
+# (size, mtime_ns) of a file
+Stat = Tuple[int, int]
+_CYCLE = re.compile(r"20\d{8}")
+
+
+def scan(paths: Dict[str, str]) -> Dict[str, Stat]:
+    """(size, mtime_ns) of the files in the directories of paths, recursively for those mapped to "walk"."""
+    files: Dict[str, Stat] = {}
+    for path, mode in paths.items():
+        if not os.path.isdir(path):
+            continue
+        if mode == "walk":
+            listing = ((os.path.join(root, name) for name in names) for root, _, names in os.walk(path))
+            candidates = (p for group in listing for p in group)
+        else:
+            candidates = (entry.path for entry in os.scandir(path) if entry.is_file())
+        for p in candidates:
+            try:
+                st = os.stat(p)
+            except OSError:
+                continue
+            files[p] = (st.st_size, st.st_mtime_ns)
+    return files
+
+
+def complete_cycles(units: Dict[str, Dict[int, Set[str]]]) -> List[int]:
+    """
+    Complete cycles of units[experiment][cycle] (the lead times or observation
+    types an experiment has of a cycle), in ascending order.
+    """
+    if not units:
+        return []
+    cycles = sorted(set.intersection(*(set(c) for c in units.values())))
+    complete: List[int] = []
+    for i, cycle in enumerate(cycles):
+        if i + 1 < len(cycles):
+            complete.append(cycle)  # a later cycle of every experiment has started
+            continue
+        ok = True
+        for per_cycle in units.values():
+            earlier = [c for c in per_cycle if c < cycle and c % 100 == cycle % 100]
+            if earlier and not per_cycle[max(earlier)] <= per_cycle[cycle]:
+                ok = False
+        if ok:
+            complete.append(cycle)
+    return complete
+
+
+def monitor_units(files: Dict[str, Stat], vfld_dirs: Dict[str, str], fcint: int) -> Dict[str, Dict[int, Set[str]]]:
+    """Lead times of the vfld files per experiment and base time."""
+    units: Dict[str, Dict[int, Set[str]]] = {exp: {} for exp in vfld_dirs}
+    for exp, path in vfld_dirs.items():
+        prefix = os.path.join(path, "")
+        for p in files:
+            if not p.startswith(prefix):
+                continue
+            parsed = parse_name(p)
+            if parsed and parsed[0] == "vfld" and parsed[1] % 100 % max(fcint, 1) == 0:
+                units[exp].setdefault(parsed[1], set()).add(str(parsed[2]))
+    return units
+
+
+def obsver_units(files: Dict[str, Stat], roots: Dict[str, str], obsvars: List[str]) -> Dict[str, Dict[int, Set[str]]]:
+    """Observation types of the OFCTABLE files per experiment and cycle (the last YYYYMMDDHH of the name)."""
+    units: Dict[str, Dict[int, Set[str]]] = {exp: {} for exp in roots}
+    for exp, root in roots.items():
+        prefix = os.path.join(root, "")
+        for p in files:
+            name = os.path.basename(p)
+            if not p.startswith(prefix) or not name.endswith(".sqlite"):
+                continue
+            ov = next((ov for ov in obsvars if name.startswith(f"OFCTABLE_{ov}_")), None)
+            found = _CYCLE.findall(name)
+            if ov and found:
+                units[exp].setdefault(int(found[-1]), set()).add(ov)
+    return units
+
+
+class Project:
+    """Watched directories and cycle bookkeeping of one project."""
+
+    def __init__(self, name: str, dirs: Dict[str, str], observations: List[str], env: Dict[str, str]) -> None:
+        self.name = name
+        self.dirs = dirs            # experiment -> directory
+        self.observations = observations
+        self.env = env
+        self.done: Optional[int] = None  # newest cycle verified
+        self.inputs: Dict[str, Stat] = {}  # settled inputs of the last run
+
+    def paths(self) -> Dict[str, str]:
+        mode = "walk" if self.name == "obsver" else "list"
+        paths = {d: mode for d in self.dirs.values()}
+        paths.update({d: "list" for d in self.observations})
+        return paths
+
+    def units(self, files: Dict[str, Stat]) -> Dict[str, Dict[int, Set[str]]]:
+        if self.name == "monitor":
+            return monitor_units(files, self.dirs, int(pipeline.env_get(self.env, "FCINT_MONITOR", "12")))
+        return obsver_units(files, self.dirs, pipeline.env_get(self.env, "OBSVARS", "atms_tb").split())
+
+    def cycle_of(self, path: str) -> Optional[int]:
+        """Cycle of a forecast file; None for observations."""
+        if self.name == "monitor":
+            parsed = parse_name(path)
+            return parsed[1] if parsed and parsed[0] == "vfld" else None
+        found = _CYCLE.findall(os.path.basename(path))
+        return int(found[-1]) if found else None
+
+
+def _shift(cycle: int, hours: int) -> int:
+    t = dt.datetime.strptime(str(cycle), "%Y%m%d%H") + dt.timedelta(hours=hours)
+    return int(t.strftime("%Y%m%d%H"))
+
+
+class Watcher:
+    """Polls the projects' inputs and runs the pipeline for new complete cycles."""
+
+    def __init__(self, env: Dict[str, str], projects: List[str], args: argparse.Namespace) -> None:
+        self.env = env
+        self.args = args
+        self.projects: List[Project] = []
+        if "monitor" in projects:
+            exps = pipeline.env_get(env, "MONITOR_EXP_BASES", "meps2_preop_rednmc06mbr000 meps2_preop_rednmc04mbr000").split()
+            self.projects.append(Project(
+                "monitor", {exp: os.path.join("data", "monitor", "vfld", exp) for exp in exps},
+                [os.path.join("data", "monitor", "vobs", "vobs_meps")], env))
+        if "obsver" in projects:
+            exps = pipeline.env_get(env, "OBSVER_EXP_BASES", "meps2_preop_rednmc06 meps2_preop_rednmc06_t2h2").split()
+            self.projects.append(Project("obsver", {exp: os.path.join("data", "obsver", exp) for exp in exps},
+                                         [], env))
+        self.previous: Dict[str, Stat] = {}
+
+    def settled(self, files: Dict[str, Stat]) -> Dict[str, Stat]:
+        """Files unchanged since the previous poll and older than --settle seconds."""
+        limit = time.time_ns() - int(self.args.settle * 1e9)
+        return {p: s for p, s in files.items() if self.previous.get(p) == s and s[1] <= limit}
+
+    def project_env(self, project: Project, cycle: int) -> Dict[str, str]:
+        env = dict(self.env)
+        key = project.name.upper()
+        env[f"END_{key}"] = str(cycle)
+        if self.args.window_days:
+            env[f"START_{key}"] = str(_shift(cycle, -24 * self.args.window_days))
+        master = pipeline.env_get(env, "MASTER_OUTPUT", "out")
+        if project.name == "monitor" and not env.get("STATE_DIR"):
+            if pipeline.env_get(env, "STATION_STATS", "0") != "0":
+                print("STATION_STATS is set: the monitor engine cannot checkpoint valid times and "
+                      "verifies the whole window for every cycle.")
+            else:
+                env["STATE_DIR"] = os.path.join(master, "monitor", "state")
+        if project.name == "obsver" and not env.get("VERIFY_CACHE_DIR"):
+            env["VERIFY_CACHE_DIR"] = os.path.join(master, "obsver", "cache")
+        return env
+
+    def run(self, project: Project, cycle: int) -> bool:
+        env = self.project_env(project, cycle)
+        steps = (pipeline.monitor_steps if project.name == "monitor" else pipeline.obsver_steps)(env, self.args.cpus)
+        state_dir = self.args.state_dir or os.path.join(pipeline.env_get(env, "MASTER_OUTPUT", "out"), ".pipeline")
+        print(f"[{dt.datetime.now():%Y-%m-%d %H:%M:%S}] {project.name}: verifying up to {cycle}")
+        return pipeline.Pipeline(steps, env, state_dir, cpus=self.args.cpus, mem_mb=self.args.mem_mb).run()
+
+    def poll(self) -> None:
+        for project in self.projects:
+            files = scan(project.paths())
+            settled = self.settled(files) if not self.args.once else files
+            self.previous.update(files)
+            complete = complete_cycles(project.units(settled))
+            if not complete:
+                continue
+            newest = complete[-1]
+            # New or changed observations and files of complete cycles; later cycles wait until they are complete
+            inputs = {p: s for p, s in settled.items()
+                      if project.inputs.get(p) != s and (project.cycle_of(p) or 0) <= newest}
+            if project.done == newest and not inputs:
+                continue
+            if project.done is not None and newest < project.done:
+                newest = project.done
+            try:
+                ok = self.run(project, newest)
+            except Exception as e:
+                print(f"{project.name}: pipeline error: {type(e).__name__}: {e}")
+                ok = False
+            if ok:
+                project.done = newest
+                project.inputs.update(inputs)
+            else:
+                print(f"{project.name}: failed steps are retried at the next poll")
+
+    def loop(self) -> None:
+        while True:
+            self.poll()
+            if self.args.once:
+                return
+            time.sleep(self.args.interval)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Verify new forecast cycles as they arrive.")
+    parser.add_argument("env_file", help="Env_exp_* configuration file (scr/).")
+    parser.add_argument("--projects", nargs="+", choices=pipeline.PROJECTS,
+                        help="Projects to watch (default: those enabled by MONITOR=1/OBSVER=1 in the file).")
+    parser.add_argument("--interval", type=float, default=60.0, help="Seconds between polls.")
+    parser.add_argument("--settle", type=float, default=30.0,
+                        help="Seconds a file must be unchanged before its cycle counts as arrived.")
+    parser.add_argument("--window-days", type=int,
+                        help="Verify the trailing N days up to each new cycle (default: from START_* of the file).")
+    parser.add_argument("--cpus", type=int, default=os.cpu_count() or 1, help="CPU budget of concurrent steps.")
+    parser.add_argument("--mem-mb", type=int, default=pipeline.available_memory_mb(),
+                        help="Memory budget of concurrent steps in MB (default: available memory, 0=no limit).")
+    parser.add_argument("--state-dir", help="Pipeline state directory (default: MASTER_OUTPUT/.pipeline).")
+    parser.add_argument("--once", action="store_true",
+                        help="Verify up to the newest complete cycle once and exit, without waiting for files to settle.")
+    args = parser.parse_args()
+
+    env = pipeline.read_env_file(args.env_file)
+    projects = args.projects or [p for p in pipeline.PROJECTS if pipeline.env_get(env, p.upper(), "1") == "1"]
+    watcher = Watcher(env, projects, args)
+    if not watcher.projects:
+        print("Error: no project to watch.")
+        sys.exit(1)
+    print(f"Watching {', '.join(p.name for p in watcher.projects)} every {args.interval:g} s")
+    try:
+        watcher.loop()
+    except KeyboardInterrupt:
+        print("Stopped.")
+
+
+if __name__ == "__main__":
+    main()
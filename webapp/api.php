@@ -23,6 +23,19 @@ $data_root = rtrim($data_root, '/') . '/';
 
 $action = $_GET['action'] ?? 'get_projects';
 
+// Plot type from a file stem, e.g. ("temp_TT_profile", "temp_TT") => "profile"
+function clean_plot_type($stem, $var_name) {
+    $cleaned_plot_type = $stem;
+    if (strpos($cleaned_plot_type, $var_name . '_') === 0) {
+        $cleaned_plot_type = substr($cleaned_plot_type, strlen($var_name) + 1);
+    } else {
+        // Handle cases like temp_TT_profile where var_name is temp_TT
+        $cleaned_plot_type = str_replace($var_name, '', $cleaned_plot_type);
+        $cleaned_plot_type = ltrim($cleaned_plot_type, '_');
+    }
+    return str_replace('combined_', '', $cleaned_plot_type);
+}
+
 $response = [];
 
 // Load variable names mapping for display labels
@@ -57,6 +70,7 @@ if ($action === 'get_projects') {
         $subdirs = glob($plots_dir . '*', GLOB_ONLYDIR);
 
         $labels = [];
+        $series = [];
         foreach ($subdirs as $subdir) {
             $var_name = basename($subdir);
             if ($var_name === 'files') continue;
@@ -86,27 +100,28 @@ if ($action === 'get_projects') {
             $labels[$var_name] = $display;
 
             foreach (glob($subdir . '/*.png') as $file) {
-                $plot_type = basename($file, '.png');
-                
-                // More robust plot type cleaning
-                $cleaned_plot_type = $plot_type;
-                if (strpos($cleaned_plot_type, $var_name . '_') === 0) {
-                    $cleaned_plot_type = substr($cleaned_plot_type, strlen($var_name) + 1);
-                } else {
-                    // Handle cases like temp_TT_profile where var_name is temp_TT
-                    $cleaned_plot_type = str_replace($var_name, '', $cleaned_plot_type);
-                    $cleaned_plot_type = ltrim($cleaned_plot_type, '_');
-                }
-                $cleaned_plot_type = str_replace('combined_', '', $cleaned_plot_type);
-
+                $cleaned_plot_type = clean_plot_type(basename($file, '.png'), $var_name);
                 $response[$project][$var_name][$cleaned_plot_type] = 'image.php?path=' . str_replace($data_root, '', $file);
             }
+
+            // Exported series (series_export.py) for client-side charts
+            foreach (glob($subdir . '/*.json') as $file) {
+                $cleaned_plot_type = clean_plot_type(basename($file, '.json'), $var_name);
+                $series[$var_name][$cleaned_plot_type] = 'api.php?action=get_series&path=' . rawurlencode(str_replace($data_root, '', $file));
+            }
         }
 
         // Attach labels map for this project
         if (!empty($labels)) {
             $response[$project]['_var_labels'] = $labels;
         }
+        if (!empty($series)) {
+            $response[$project]['_series'] = $series;
+        }
+        // Plots not pre-rendered (e.g. per lead time) can be requested from render.php
+        if (getenv('VERIF_RENDER_URL')) {
+            $response[$project]['_render_service'] = true;
+        }
 
         // Find top-level plots (like scorecards)
         $top_level_plots = glob($plots_dir . '*.png');
@@ -160,6 +175,21 @@ if ($action === 'get_projects') {
         }
     }
 
+} elseif ($action === 'get_series') {
+    $series_path = $_GET['path'] ?? '';
+    // Only exported series JSON inside the data root
+    if ($series_path === '' || strpos($series_path, '..') !== false || substr($series_path, -5) !== '.json') {
+        $response = ['error' => 'Invalid series path.'];
+    } else {
+        $full_path = $data_root . $series_path;
+        if (!is_file($full_path)) {
+            $response = ['error' => 'Series not found: ' . htmlspecialchars($series_path)];
+        } else {
+            // Already compact JSON; pass through without re-encoding
+            readfile($full_path);
+            exit;
+        }
+    }
 } elseif ($action === 'get_scorecard_data') {
     $project = $_GET['project'] ?? null;
     if (!$project) {
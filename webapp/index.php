@@ -35,6 +35,12 @@
             </aside>
 
             <main class="content">
+                <div id="chart-controls">
+                    <label><input type="checkbox" id="interactive-toggle"> Interactive charts</label>
+                    <label id="lead-select-wrap" style="display: none;">Lead time
+                        <select id="lead-select"><option value="all">All</option></select>
+                    </label>
+                </div>
                 <div id="plot-container">
                     <img id="plot-display" class="plot-display" src="" alt="Select a project and plot to display.">
                 </div>
@@ -48,6 +54,7 @@
     </div>
 
     <script src="https://code.jquery.com/jquery-3.7.1.min.js"></script>
+    <script src="https://cdn.jsdelivr.net/npm/chart.js@4.4.1/dist/chart.umd.min.js"></script>
     <script src="js/main.js"></script>
 </body>
 </html>
@@ -71,6 +71,139 @@ $(document).ready(function() {
              : null;
     }
 
+    // --- Client-side charts from exported series (series_export.py) ---
+    let interactiveCharts = localStorage.getItem('interactiveCharts') === '1';
+    let activeLead = 'all';
+    let knownLeads = new Set();
+    let charts = [];
+    const seriesCache = new Map();
+
+    function seriesUrlFor(project, variable, plotType) {
+        return projectData[project]?._series?.[variable]?.[plotType] || null;
+    }
+
+    function hasPlot(project, variable, plotType) {
+        return Boolean(projectData[project]?.[variable]?.[plotType] || seriesUrlFor(project, variable, plotType));
+    }
+
+    function fetchSeries(url) {
+        // One request per series per page load; lead switching reuses the document
+        if (!seriesCache.has(url)) {
+            seriesCache.set(url, $.getJSON(url));
+        }
+        return seriesCache.get(url);
+    }
+
+    function destroyCharts() {
+        charts.forEach(c => c.destroy());
+        charts = [];
+        knownLeads = new Set();
+        $('#lead-select-wrap').hide();
+    }
+
+    function updateLeadOptions(leads) {
+        const before = knownLeads.size;
+        leads.forEach(lt => knownLeads.add(String(lt)));
+        if (knownLeads.size === 0) return;
+        if (knownLeads.size !== before) {
+            const select = $('#lead-select');
+            select.empty().append('<option value="all">All</option>');
+            [...knownLeads].sort((a, b) => Number(a) - Number(b)).forEach(lt => {
+                select.append(`<option value="${lt}">${lt} h</option>`);
+            });
+            select.val(knownLeads.has(activeLead) ? activeLead : 'all');
+        }
+        $('#lead-select-wrap').show();
+    }
+
+    function drawSeriesChart(canvas, doc) {
+        const byLead = activeLead !== 'all' && doc.leads && doc.leads[activeLead];
+        const data = byLead ? doc.leads[activeLead] : doc;
+        const profile = doc.kind === 'profile';
+        const axisKey = profile ? 'xAxisID' : 'yAxisID';
+        const datasets = [];
+        doc.experiments.forEach(exp => {
+            const s = data.series[exp.id];
+            if (!s) return;
+            [['rmse', 'RMSE', [6, 4], 'circle'], ['bias', 'Bias', [], 'rect']].forEach(([metric, label, dash, point]) => {
+                datasets.push({
+                    type: 'line', label: `${label} ${exp.name}`, data: s[metric],
+                    borderColor: exp.color, backgroundColor: exp.color, borderDash: dash,
+                    pointStyle: point, [axisKey]: 'value', order: 1
+                });
+            });
+        });
+        datasets.push({
+            type: 'bar', label: 'Count', data: data.counts,
+            backgroundColor: 'rgba(128, 128, 128, 0.15)', [axisKey]: 'count', order: 2
+        });
+        const title = byLead ? [...doc.title, `Lead time ${activeLead} h`] : doc.title;
+        const scales = {
+            value: { axis: profile ? 'x' : 'y', position: profile ? 'bottom' : 'left',
+                     title: { display: true, text: doc.value_label } },
+            count: { axis: profile ? 'x' : 'y', position: profile ? 'top' : 'right',
+                     title: { display: true, text: 'Count' }, grid: { drawOnChartArea: false } },
+            [profile ? 'y' : 'x']: { title: { display: true, text: doc.x_label } }
+        };
+        charts.push(new Chart(canvas, {
+            type: 'bar',
+            data: { labels: data.x, datasets },
+            options: {
+                indexAxis: profile ? 'y' : 'x',
+                animation: false,
+                interaction: { mode: 'index', intersect: false },
+                plugins: { title: { display: true, text: title }, legend: { position: 'right' } },
+                scales
+            }
+        }));
+    }
+
+    // Append the chart (interactive mode or no PNG) or the PNG for one plot; false if neither exists
+    function appendPlot(container, project, variable, plotType) {
+        const imagePath = projectData[project]?.[variable]?.[plotType];
+        const seriesUrl = seriesUrlFor(project, variable, plotType);
+        if (seriesUrl && window.Chart && (interactiveCharts || !imagePath)) {
+            const wrap = $('<div>').addClass('chart-wrap');
+            const canvas = $('<canvas>');
+            wrap.append(canvas);
+            container.append(wrap);
+            fetchSeries(seriesUrl)
+                .done(doc => {
+                    // Skip responses for a selection that has been replaced meanwhile
+                    if (!document.body.contains(canvas[0])) return;
+                    updateLeadOptions(Object.keys(doc.leads || {}));
+                    drawSeriesChart(canvas[0], doc);
+                })
+                .fail(() => wrap.html('<p>Series could not be loaded.</p>'));
+            return true;
+        }
+        if (imagePath) {
+            container.append($('<img>').addClass('plot-display').attr('src', leadImagePath(project, variable, plotType) || imagePath));
+            return true;
+        }
+        return false;
+    }
+
+    // Per-lead-time PNGs: pre-rendered "<plot>_lt_<N>" if present, else rendered on demand by render.php
+    function leadImagePath(project, variable, plotType) {
+        if (plotType === 'lead_time_series') return null;
+        const plots = projectData[project]?.[variable] || {};
+        const prefix = `${plotType}_lt_`;
+        const leads = Object.keys(plots).filter(k => k.startsWith(prefix)).map(k => k.slice(prefix.length));
+        const seriesUrl = seriesUrlFor(project, variable, plotType);
+        if (seriesUrl && projectData[project]?._render_service) {
+            fetchSeries(seriesUrl).done(doc => updateLeadOptions(Object.keys(doc.leads || {})));
+        }
+        updateLeadOptions(leads);
+        if (activeLead === 'all') return null;
+        if (plots[prefix + activeLead]) return plots[prefix + activeLead];
+        if (projectData[project]?._render_service) {
+            const q = $.param({ project, variable, plot: plotType, lead_time: activeLead });
+            return `render.php?${q}`;
+        }
+        return null;
+    }
+
     // --- 1. Fetch ALL Project Data on page load ---
     $.getJSON('api.php?action=get_projects', function(data) {
         if (data.error) {
@@ -126,7 +259,7 @@ $(document).ready(function() {
                         variable !== 'Scorecards' &&
                         !variable.startsWith('_') &&
                         allVars[variable] &&
-                        allVars[variable][plotType] &&
+                        hasPlot(project, variable, plotType) &&
                         (wantsVertical === null || isVerticalVar(variable) === wantsVertical)
                     ) {
                         relevantVars.push(variable);
@@ -179,7 +312,7 @@ $(document).ready(function() {
                 if (!plotType) continue;
                 const wantsVertical = categoryWantsVertical(project, cat);
                 const vars = Object.keys(projectData[project] || {})
-                    .filter(v => v !== 'Scorecards' && !v.startsWith('_') && projectData[project][v]?.[plotType]
+                    .filter(v => v !== 'Scorecards' && !v.startsWith('_') && hasPlot(project, v, plotType)
                         && (wantsVertical === null || isVerticalVar(v) === wantsVertical))
                     .sort();
                 if (vars.length) return { category: cat, variable: vars[0] };
@@ -243,6 +376,7 @@ $(document).ready(function() {
         updateActiveLinks('#variable-nav', 'variable', 'variable');
 
         const plotContainer = $('#plot-container');
+        destroyCharts();
         plotContainer.empty();
 
         if (activeSelections.variable) {
@@ -276,13 +410,9 @@ $(document).ready(function() {
                 }
             } else {
                 const plotType = categoryMap[activeSelections.project]?.[activeSelections.category];
-                const imagePath = projectData[activeSelections.project]?.[activeSelections.variable]?.[plotType];
                 $('#scorecard-table-container').hide();
                 $('#scorecard-title').hide();
-                if (imagePath) {
-                    const img = $('<img>').addClass('plot-display').attr('src', imagePath).show();
-                    plotContainer.append(img);
-                } else {
+                if (!appendPlot(plotContainer, activeSelections.project, activeSelections.variable, plotType)) {
                     plotContainer.html('<p>Plot not found for this selection.</p>');
                 }
             }
@@ -329,7 +459,13 @@ $(document).ready(function() {
         // Toggle on: show all variables in this category
         // Remember current variable to restore after hiding all
         previousVariable = activeSelections.variable;
+        renderAllVariables();
+    });
+
+    function renderAllVariables() {
+        const { project, category } = activeSelections;
         const plotContainer = $('#plot-container');
+        destroyCharts();
         plotContainer.empty().css('text-align', 'left');
         let plotsFound = 0;
 
@@ -369,11 +505,9 @@ $(document).ready(function() {
                 }
             } else {
                 const plotType = categoryMap[project]?.[category];
-                const imagePath = projectData[project]?.[variable]?.[plotType];
-                if (imagePath) {
-                    const plotTitle = $('<h3>').text(variable);
-                    const img = $('<img>').attr('src', imagePath).addClass('plot-display');
-                    plotContainer.append(plotTitle).append(img);
+                if (hasPlot(project, variable, plotType)) {
+                    plotContainer.append($('<h3>').text(variable));
+                    appendPlot(plotContainer, project, variable, plotType);
                     plotsFound++;
                 }
             }
@@ -388,6 +522,26 @@ $(document).ready(function() {
         if (plotsFound === 0) {
             plotContainer.html('<p>No plots found for this group.</p>').css('text-align', 'center');
         }
+    }
+
+    function refreshPlots() {
+        if (showAllVariables) {
+            renderAllVariables();
+        } else {
+            renderUI();
+        }
+    }
+
+    $('#interactive-toggle').prop('checked', interactiveCharts);
+    $(document).on('change', '#interactive-toggle', function() {
+        interactiveCharts = $(this).is(':checked');
+        localStorage.setItem('interactiveCharts', interactiveCharts ? '1' : '0');
+        refreshPlots();
+    });
+
+    $(document).on('change', '#lead-select', function() {
+        activeLead = $(this).val();
+        refreshPlots();
     });
 
     $(document).on('click', '.plot-display', function() {
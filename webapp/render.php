@@ -0,0 +1,44 @@
+<?php
+// webapp/render.php
+// Forwards on-demand plot requests to the render service (src/python/render_service.py).
+// Its base URL is configured via the environment variable 'VERIF_RENDER_URL', e.g. http://127.0.0.1:8765
+
+$service = getenv('VERIF_RENDER_URL');
+if (!$service) {
+    header("HTTP/1.1 404 Not Found");
+    echo "Render service not configured.";
+    exit;
+}
+
+$query = [];
+foreach (['project', 'variable', 'plot', 'lead_time'] as $key) {
+    if (isset($_GET[$key]) && is_string($_GET[$key]) && $_GET[$key] !== '') {
+        $query[] = $key . '=' . rawurlencode($_GET[$key]);
+    }
+}
+// Experiments may be given as exp=A or exp[]=A&exp[]=B
+$exps = $_GET['exp'] ?? [];
+foreach ((array)$exps as $exp) {
+    $query[] = 'exp=' . rawurlencode($exp);
+}
+
+$url = rtrim($service, '/') . '/render?' . implode('&', $query);
+$context = stream_context_create(['http' => ['timeout' => 120, 'ignore_errors' => true]]);
+$body = @file_get_contents($url, false, $context);
+if ($body === false) {
+    header("HTTP/1.1 502 Bad Gateway");
+    echo "Render service unavailable.";
+    exit;
+}
+
+// Pass through the service's status line and content type
+$status = $http_response_header[0] ?? 'HTTP/1.1 200 OK';
+header($status);
+foreach ($http_response_header as $line) {
+    if (stripos($line, 'Content-Type:') === 0) {
+        header($line);
+    }
+}
+header('Cache-Control: max-age=300');
+echo $body;
+?>